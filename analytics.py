@@ -0,0 +1,263 @@
+# analytics.py
+"""
+Totales mensuales de facturación, materializados en SQLite.
+
+Cada factura guardada suma sus importes a una fila por (mes, dimensión,
+clave), con dimensiones:
+  - total:        clave "" (total del mes)
+  - emisor:       CUIT del emisor
+  - receptor:     CUIT/DNI del receptor
+  - tipo_factura: "Factura A" | "Factura B" | "Factura C"
+
+Las consultas del dashboard leen esas filas, así que no dependen del tamaño
+del archivo. `record_invoice` es idempotente por `invoice_key`.
+
+`rebuild` arma los agregados en tablas de staging (el dashboard sigue
+leyendo las actuales) y las reemplaza en una transacción corta al final. El
+lock del store se toma solo para volcar cada chunk; las facturas que se
+registran mientras tanto se suman también al staging. Desde la app se
+corre en un thread de fondo (`start_rebuild`).
+
+Uso por consola:
+    python analytics.py rebuild            # recalcula todo desde data/
+    python analytics.py resumen [AAAA-MM]
+"""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from archive import DATA_DIR, iter_invoices
+from utils import connect_sqlite, invoice_key
+
+ANALYTICS_DB_PATH = os.environ.get("ANALYTICS_DB_PATH", "data/analytics.db")
+
+DIMENSIONS = ("total", "emisor", "receptor", "tipo_factura")
+
+# Facturas acumuladas en memoria antes de volcarlas durante un rebuild
+REBUILD_CHUNK = 5000
+
+_UPSERT_SQL = """
+    INSERT INTO {table} (month, dimension, key, count, total_neto, total_iva, total)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (month, dimension, key) DO UPDATE SET
+        count      = count + excluded.count,
+        total_neto = total_neto + excluded.total_neto,
+        total_iva  = total_iva + excluded.total_iva,
+        total      = total + excluded.total
+"""
+
+
+_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS {totals} (
+        month      TEXT NOT NULL,
+        dimension  TEXT NOT NULL,
+        key        TEXT NOT NULL,
+        count      INTEGER NOT NULL,
+        total_neto REAL NOT NULL,
+        total_iva  REAL NOT NULL,
+        total      REAL NOT NULL,
+        PRIMARY KEY (month, dimension, key)
+    );
+    CREATE TABLE IF NOT EXISTS {counted} (invoice_key TEXT PRIMARY KEY);
+"""
+
+LIVE_TABLES = {"totals": "monthly_totals", "counted": "counted"}
+STAGING_TABLES = {"totals": "monthly_totals_rebuild", "counted": "counted_rebuild"}
+
+
+def invoice_month(payload: Dict[str, Any]) -> str:
+    """Mes (AAAA-MM) de la factura: fecha de creación, o fecha de inicio si no hay."""
+    created = str((payload.get("meta") or {}).get("created_at") or "")
+    if len(created) >= 7:
+        return created[:7]
+    inicio = str((payload.get("datos_facturacion") or {}).get("fecha_inicio") or "")
+    parts = inicio.split("/")  # dd/mm/aaaa
+    if len(parts) == 3:
+        return f"{parts[2]}-{parts[1]}"
+    return "sin-fecha"
+
+
+def invoice_facts(payload: Dict[str, Any]) -> List[Tuple[str, str, str, int, float, float, float]]:
+    """Filas (mes, dimensión, clave, 1, neto, iva, total) que aporta una factura, en pesos."""
+    tot = payload.get("totales") or {}
+    # facturas en moneda extranjera: se suma el equivalente en ARS
+    # (las facturas anteriores a multi-moneda no tienen *_ars y son en pesos)
+    neto = float(tot.get("total_neto_ars", tot.get("total_neto")) or 0.0)
+    iva = float(tot.get("total_iva_21_ars", tot.get("total_iva_21")) or 0.0)
+    total = float(tot.get("total_ars", tot.get("total")) or 0.0)
+    month = invoice_month(payload)
+    keys = {
+        "total": "",
+        "emisor": str((payload.get("emisor") or {}).get("cuit") or ""),
+        "receptor": str((payload.get("receptor") or {}).get("cuit_dni") or ""),
+        "tipo_factura": str(tot.get("tipo_factura") or (payload.get("datos_facturacion") or {}).get("tipo_factura") or ""),
+    }
+    return [(month, dim, keys[dim], 1, neto, iva, total) for dim in DIMENSIONS]
+
+
+class AnalyticsStore:
+    def __init__(self, path: str = ANALYTICS_DB_PATH):
+        self._conn = connect_sqlite(path)
+        self._lock = threading.Lock()
+        # staging activo mientras corre un rebuild (record_invoice también suma ahí)
+        self._staging = False
+        self._rebuild_lock = threading.Lock()
+        self._rebuild_status: Dict[str, Any] = {"estado": "inactivo"}
+        with self._conn:
+            self._conn.executescript(_SCHEMA_SQL.format(**LIVE_TABLES))
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_monthly_dim ON monthly_totals (dimension, month)")
+
+    def _record(self, tables: Dict[str, str], key: str, facts: List[Tuple]) -> bool:
+        cur = self._conn.execute(f"INSERT OR IGNORE INTO {tables['counted']} VALUES (?)", (key,))
+        if cur.rowcount == 0:
+            return False
+        self._conn.executemany(_UPSERT_SQL.format(table=tables["totals"]), facts)
+        return True
+
+    def record_invoice(self, payload: Dict[str, Any]) -> bool:
+        """Suma la factura a los agregados. Devuelve False si ya estaba contada."""
+        key, facts = invoice_key(payload), invoice_facts(payload)
+        with self._lock, self._conn:
+            if self._staging:
+                self._record(STAGING_TABLES, key, facts)
+            return self._record(LIVE_TABLES, key, facts)
+
+    def rebuild(self, invoices: Optional[Iterable[Tuple[str, Dict[str, Any]]]] = None, chunk: int = REBUILD_CHUNK) -> int:
+        """
+        Recalcula todos los agregados recorriendo el archivo en streaming.
+        La memoria queda acotada por un chunk de facturas. Lanza RuntimeError
+        si ya hay otro rebuild en curso en este proceso.
+        """
+        if not self._rebuild_lock.acquire(blocking=False):
+            raise RuntimeError("Ya hay una reconstrucción en curso.")
+        try:
+            return self._rebuild(iter_invoices(DATA_DIR) if invoices is None else invoices, chunk)
+        finally:
+            self._rebuild_lock.release()
+
+    def _rebuild(self, invoices: Iterable[Tuple[str, Dict[str, Any]]], chunk: int) -> int:
+        with self._lock, self._conn:
+            self._conn.execute(f"DROP TABLE IF EXISTS {STAGING_TABLES['totals']}")
+            self._conn.execute(f"DROP TABLE IF EXISTS {STAGING_TABLES['counted']}")
+            self._conn.executescript(_SCHEMA_SQL.format(**STAGING_TABLES))
+            self._staging = True
+
+        total = 0
+        try:
+            pending: List[Tuple[str, List[Tuple]]] = []
+            for _, payload in invoices:
+                pending.append((invoice_key(payload), invoice_facts(payload)))
+                if len(pending) >= chunk:
+                    total += self._flush_rebuild(pending)
+                    pending = []
+            total += self._flush_rebuild(pending)
+            self._swap_staging()
+        finally:
+            with self._lock:
+                self._staging = False
+        return total
+
+    def _flush_rebuild(self, pending: List[Tuple[str, List[Tuple]]]) -> int:
+        """Vuelca un chunk al staging. El lock se toma solo durante el volcado."""
+        acc: Dict[Tuple[str, str, str], List[float]] = {}
+        n = 0
+        with self._lock, self._conn:
+            for key, facts in pending:
+                # una factura repetida en el archivo (o ya registrada durante el rebuild) se cuenta una sola vez
+                cur = self._conn.execute(f"INSERT OR IGNORE INTO {STAGING_TABLES['counted']} VALUES (?)", (key,))
+                if cur.rowcount == 0:
+                    continue
+                for month, dim, k, count, neto, iva, tot in facts:
+                    row = acc.setdefault((month, dim, k), [0, 0.0, 0.0, 0.0])
+                    row[0] += count
+                    row[1] += neto
+                    row[2] += iva
+                    row[3] += tot
+                n += 1
+            self._conn.executemany(
+                _UPSERT_SQL.format(table=STAGING_TABLES["totals"]), [(*k, *v) for k, v in acc.items()]
+            )
+        return n
+
+    def _swap_staging(self) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for name in ("totals", "counted"):
+                    self._conn.execute(f"DROP TABLE {LIVE_TABLES[name]}")
+                    self._conn.execute(f"ALTER TABLE {STAGING_TABLES[name]} RENAME TO {LIVE_TABLES[name]}")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_monthly_dim ON monthly_totals (dimension, month)")
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def start_rebuild(self) -> bool:
+        """Corre `rebuild` en un thread de fondo. Devuelve False si ya había uno en curso."""
+        if self._rebuild_lock.locked():
+            return False
+
+        def run() -> None:
+            self._rebuild_status = {"estado": "en_curso"}
+            try:
+                n = self.rebuild()
+            except Exception as e:
+                self._rebuild_status = {"estado": "error", "error": str(e)}
+            else:
+                self._rebuild_status = {"estado": "terminado", "facturas": n}
+
+        self._rebuild_status = {"estado": "en_curso"}
+        threading.Thread(target=run, name="analytics-rebuild", daemon=True).start()
+        return True
+
+    def rebuild_status(self) -> Dict[str, Any]:
+        """Estado del último rebuild lanzado con `start_rebuild`."""
+        return dict(self._rebuild_status)
+
+    def monthly(
+        self, dimension: str = "total", month_from: Optional[str] = None, month_to: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        sql = "SELECT month, key, count, total_neto, total_iva, total FROM monthly_totals WHERE dimension = ?"
+        params: list = [dimension]
+        if month_from:
+            sql += " AND month >= ?"
+            params.append(month_from)
+        if month_to:
+            sql += " AND month <= ?"
+            params.append(month_to)
+        sql += " ORDER BY month DESC, total DESC"
+        with self._lock:
+            cur = self._conn.execute(sql, params)
+            cols = [c[0] for c in cur.description]
+            return [dict(zip(cols, row)) for row in cur.fetchall()]
+
+    def months(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT month FROM monthly_totals WHERE dimension = 'total' ORDER BY month DESC"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+
+def main(argv: List[str]) -> int:
+    cmd = argv[1] if len(argv) > 1 else ""
+    store = AnalyticsStore()
+    if cmd == "rebuild":
+        print(f"{store.rebuild()} facturas procesadas")
+        return 0
+    if cmd == "resumen":
+        month = argv[2] if len(argv) > 2 else None
+        for dim in DIMENSIONS:
+            for row in store.monthly(dim, month, month):
+                print(json.dumps({"dimension": dim, **row}, ensure_ascii=False))
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,157 +1,115 @@
 # app.py
 from __future__ import annotations
 
-from datetime import date, datetime
+import json
+import logging
+import os
+from datetime import date
 from uuid import uuid4
-import requests
 import streamlit as st
 
+from calc import build_totales, compute_item_amounts, compute_totals, is_factura_con_iva
+from catalogs import (
+    CONDICION_IVA,
+    CONDICION_VENTA,
+    MONEDA,
+    MONEDA_NOMBRES,
+    SELECT_PLACEHOLDER,
+    SERVICIO_PRODUCTO,
+    TIPO_FACTURA,
+    UNIDAD_MEDIDA,
+)
+from analytics import AnalyticsStore
+from audit import audit, get_audit_logger
+from draft_store import DRAFT_SECTIONS, DraftStore
+from export import export_archive
+from fx import BASE_CURRENCY, FxClient, FxError, fx_from_url, get_rate
+from model import Item
+from padron import PadronClient, PadronError, padron_from_url
+from reconciliation import ReconciliationIndex
+from recurring import TemplateStore, run_due, template_from_payload
 from utils import (
     build_payload,
     sanitize_digits,
     is_digits_only,
     validate_required,
     validate_items,
+    validate_cuit_dni,
     save_json,
-    parse_decimal_optional,  # acepta coma o punto
+    date_to_str,
+    invoice_key,
 )
+from webhook import event_progress_pct, send_to_webhook
 
-WEBHOOK_URL = "https://n8n.optimizar-ia.com/webhook/06cf93de-06f0-42ac-b859-9424155fa9b7"
-
-IVA_RATE = 0.21
-
-# Listado de opciones de Tipo de Factura según AFIP
-TIPO_FACTURA_OPTIONS = ["Factura A", "Factura B", "Factura C"]
-
-# Listado de opciones de Condición frente al IVA según AFIP
-IVA_OPTIONS = [
-    "IVA Responsable Inscripto",
-    "IVA Sujeto Exento",
-    "Consumidor Final",
-    "Responsable Monotributo",
-    "Sujeto No Categorizado",
-    "Proveedor del Exterior",
-    "Cliente del Exterior",
-    "IVA Liberado – Ley N° 19.640",
-    "Monotributista Social",
-    "IVA No Alcanzado",
-    "Monotributo Trabajador Independiente Promovido",
-]
-
-# Listado de opciones de Condición de Venta según AFIP
-COND_VENTA_OPTIONS = [
-    "Contado",
-    "Cuenta Corriente",
-    "Tarjeta de Débito",
-    "Tarjeta de Crédito",
-    "Cheque",
-    "Ticket / Tiquet",
-    "Otros medios de pago electrónico",
-    "Transferencia Bancaria",
-    "Otra",
-]
-
-# Listado de opciones de Servicio/Producto según AFIP
-SERVICIO_PRODUCTO_OPTIONS = ["Producto", "Servicio", "Producto/Servicio"]
-
-# Listado de Unidades de Medida según AFIP
-UNIDADES_MEDIDA = [
-    "Sin descripción",
-    "Kilogramo",
-    "Metros",
-    "Metro cuadrado",
-    "Metro cubico",
-    "Litros",
-    "1000 kilowatt hora",
-    "Unidad",
-    "Par",
-    "Docena",
-    "Quilate",
-    "Millar",
-    "Mega-u. int. act. antib",
-    "Unidad int. act. inmung",
-    "Gramo",
-    "Milimetro",
-    "Milimetro cubico",
-    "Kilometro",
-    "Hectolitro",
-    "Mega u. int. act. inmung.",
-    "Centímetro",
-    "Kilogramo activo",
-    "Gramo activo",
-    "Gramo base",
-    "Uiacthor",
-    "Juego o paquete mazo de naipes",
-    "Muiacthor",
-    "Centimetro cubico",
-    "Uiactant",
-    "Tonelada",
-    "Decametro cubico",
-    "Hectometro cubico",
-    "Kilometro cubico",
-    "Microgramo",
-    "Nanogramo",
-    "Picogramo",
-    "Muiactant",
-    "Uiactig",
-    "Miligramo",
-    "Mililitro",
-    "Curie",
-    "Milicurie",
-    "Microcurie",
-    "U. inter. act. hor.",
-    "Mega u. inter. act. hor.",
-    "Kilogramo base",
-    "Gruesa",
-    "Muiactig",
-    "Kg. bruto",
-    "Pack",
-    "Horma",
-    "Otras unidades",
-]
+EXPORT_DIR = os.environ.get("EXPORT_DIR", "exports")
 
+log = logging.getLogger(__name__)
 
 # -----------------------------
-# JSON SAFE
+# STATE
 # -----------------------------
-def _date_to_str(d: date) -> str:
-    return d.strftime("%d/%m/%Y")
+@st.cache_resource
+def get_draft_store() -> DraftStore:
+    # Un store por proceso, compartido por todas las sesiones
+    return DraftStore()
+
+
+@st.cache_resource
+def get_reconciliation_index() -> ReconciliationIndex:
+    return ReconciliationIndex()
+
+
+@st.cache_resource
+def get_analytics_store() -> AnalyticsStore:
+    return AnalyticsStore()
+
 
+@st.cache_resource
+def get_template_store() -> TemplateStore:
+    return TemplateStore()
 
-def make_json_safe(obj):
+
+def resume_draft():
     """
-    Convierte recursivamente objetos no serializables (date/datetime) a string.
+    Asocia la sesión a un borrador (`?draft=<id>` en la URL).
+    Si el borrador existe en el store, se restaura su estado: así una sesión
+    puede continuar en cualquier réplica.
     """
-    if isinstance(obj, (date, datetime)):
-        return _date_to_str(obj.date() if isinstance(obj, datetime) else obj)
-    if isinstance(obj, dict):
-        return {k: make_json_safe(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [make_json_safe(v) for v in obj]
-    if isinstance(obj, tuple):
-        return [make_json_safe(v) for v in obj]
-    return obj
+    if "draft_id" in st.session_state:
+        return
+
+    draft_id = st.query_params.get("draft")
+    if draft_id:
+        saved = get_draft_store().load(draft_id)
+        if saved:
+            for k, v in saved.items():
+                st.session_state[k] = v
+    else:
+        draft_id = uuid4().hex
 
+    st.session_state["draft_id"] = draft_id
+    st.query_params["draft"] = draft_id
+
+
+def persist_draft():
+    # factura ya enviada: no se vuelve a guardar como borrador mientras se muestra la confirmación
+    if st.session_state.get("draft_sent"):
+        if st.session_state["step"] == "confirmed":
+            return
+        del st.session_state["draft_sent"]
+    get_draft_store().save(
+        st.session_state["draft_id"],
+        {k: st.session_state[k] for k in DRAFT_SECTIONS if k in st.session_state},
+    )
 
-# -----------------------------
-# STATE
-# -----------------------------
-def _new_item() -> dict:
-    return {
-        "uid": str(uuid4()),
-        "codigo": "",
-        "descripcion": "",
-        "cantidad": 1.0,
-        "unidad_medida": "Unidad",
-        "precio_modo": "con_iva",  # "con_iva" | "sin_iva"
-        "precio_unitario": 0.0,
-        "descuento_bonificacion": "",
-    }
+
+def _new_item() -> Item:
+    return Item()
 
 
 def init_state():
     if "step" not in st.session_state:
-        st.session_state["step"] = "edit"  # edit | review | confirmed
+        st.session_state["step"] = "edit"  # edit | review | confirmed | analytics | export
 
     if "facturacion" not in st.session_state:
         today = date.today()
@@ -161,6 +119,7 @@ def init_state():
             "fecha_inicio": today,
             "fecha_fin": today,
             "fecha_vencimiento": today,
+            "moneda": "ARS",
         }
     else:
         # asegurar llaves (migración)
@@ -168,6 +127,7 @@ def init_state():
         st.session_state["facturacion"].setdefault("fecha_inicio", today)
         st.session_state["facturacion"].setdefault("fecha_fin", today)
         st.session_state["facturacion"].setdefault("fecha_vencimiento", today)
+        st.session_state["facturacion"].setdefault("moneda", "ARS")
 
     if "emisor" not in st.session_state:
         st.session_state["emisor"] = {
@@ -191,21 +151,16 @@ def init_state():
     if "items" not in st.session_state:
         st.session_state["items"] = [_new_item()]
     else:
-        # migración: asegurar uid en items ya existentes
+        # migración: items como dict (borradores, sesiones viejas) -> Item
         fixed = []
         for it in st.session_state["items"]:
-            if not isinstance(it, dict):
-                continue
-            if not it.get("uid"):
-                it["uid"] = str(uuid4())
-            it.setdefault("precio_modo", "con_iva")
-            it.setdefault("precio_unitario", 0.0)
-            it.setdefault("cantidad", 1.0)
-            it.setdefault("unidad_medida", "Unidad")
-            it.setdefault("descuento_bonificacion", "")
-            it.setdefault("codigo", "")
-            it.setdefault("descripcion", "")
-            fixed.append(it)
+            if isinstance(it, Item):
+                fixed.append(it)
+            elif isinstance(it, dict):
+                fixed.append(Item.from_dict(it))
+            elif hasattr(it, "to_dict"):
+                # Item de una versión anterior del módulo (recarga en desarrollo)
+                fixed.append(Item.from_dict(it.to_dict()))
         if not fixed:
             fixed = [_new_item()]
         st.session_state["items"] = fixed
@@ -213,6 +168,7 @@ def init_state():
     st.session_state.setdefault("last_payload", None)
     st.session_state.setdefault("last_saved_path", None)
     st.session_state.setdefault("last_webhook_result", None)
+    st.session_state.setdefault("last_export", None)
 
 
 # -----------------------------
@@ -235,97 +191,70 @@ def set_digits_field(key_path: str):
     st.session_state[obj_name] = obj
 
 
-def is_factura_con_iva(tipo_factura: str | None) -> bool:
-    return tipo_factura in ("Factura A", "Factura B")
+@st.cache_resource
+def get_fx_client() -> FxClient | None:
+    # una sola cache de cotizaciones por proceso
+    return fx_from_url()
 
 
-# -----------------------------
-# CALC
-# -----------------------------
-def _parse_discount_to_float(d_raw: str) -> float:
-    s = str(d_raw or "").strip()
-    if s == "":
-        return 0.0
-    return float(parse_decimal_optional(s))
+@st.cache_resource
+def get_padron_client() -> PadronClient | None:
+    # un cliente (y su cache) por proceso, compartido por todas las sesiones
+    return padron_from_url()
 
 
-def compute_item_amounts(item: dict, tipo_factura: str | None) -> tuple[dict, str | None]:
+def seed_widget(key: str, value) -> None:
     """
-    Factura A/B:
-      - si precio_modo=con_iva => precio_unitario es final (con IVA).
-      - si precio_modo=sin_iva => precio_unitario es neto, se suma IVA 21%.
-    Descuento: MONTO (no %) y se resta del subtotal_total.
+    Valor inicial de un widget que también se completa desde un callback
+    (padrón): se carga solo por session_state, sin `value=`/`index=`, para
+    que Streamlit no avise de un valor definido por las dos vías.
     """
-    try:
-        qty = float(item.get("cantidad", 0) or 0.0)
-        price_input = float(item.get("precio_unitario", 0) or 0.0)
-        discount = _parse_discount_to_float(item.get("descuento_bonificacion", ""))
-
-        if qty < 0:
-            return {}, "Cantidad inválida."
-        if price_input < 0:
-            return {}, "Precio inválido."
-
-        if is_factura_con_iva(tipo_factura):
-            modo = item.get("precio_modo", "con_iva")
-            if modo == "sin_iva":
-                unit_net = price_input
-                unit_gross = unit_net * (1.0 + IVA_RATE)
-            else:
-                unit_gross = price_input
-                unit_net = unit_gross / (1.0 + IVA_RATE)
-
-            unit_iva = unit_gross - unit_net
-
-            subtotal_gross = qty * unit_gross - discount
-            subtotal_net = subtotal_gross / (1.0 + IVA_RATE)
-            subtotal_iva = subtotal_gross - subtotal_net
-
-            return {
-                "unit_net": unit_net,
-                "unit_iva": unit_iva,
-                "unit_gross": unit_gross,
-                "subtotal_net": subtotal_net,
-                "subtotal_iva": subtotal_iva,
-                "subtotal_gross": subtotal_gross,
-            }, None
-
-        # Factura C: sin desglose
-        unit_gross = price_input
-        subtotal_gross = qty * unit_gross - discount
-        return {
-            "unit_net": unit_gross,
-            "unit_iva": 0.0,
-            "unit_gross": unit_gross,
-            "subtotal_net": subtotal_gross,
-            "subtotal_iva": 0.0,
-            "subtotal_gross": subtotal_gross,
-        }, None
-
-    except Exception:
-        return {}, "No se pudo calcular (revisá cantidad / precio / descuento)."
+    if key not in st.session_state:
+        st.session_state[key] = value
 
 
-def compute_totals(items_list: list[dict], tipo_factura: str | None) -> tuple[list[dict], dict, list[str]]:
-    per_item_amounts: list[dict] = []
-    calc_errors: list[str] = []
-    total_net = 0.0
-    total_iva = 0.0
-    total_gross = 0.0
+def seed_select(key: str, catalog, label) -> None:
+    seed_widget(key, catalog.select_options[catalog.select_index(label)])
 
-    for i, it in enumerate(items_list, start=1):
-        amounts, err = compute_item_amounts(it, tipo_factura)
-        per_item_amounts.append(amounts)
-        if err:
-            calc_errors.append(f"Item {i}: {err}")
-            continue
 
-        total_net += float(amounts.get("subtotal_net", 0.0) or 0.0)
-        total_iva += float(amounts.get("subtotal_iva", 0.0) or 0.0)
-        total_gross += float(amounts.get("subtotal_gross", 0.0) or 0.0)
-
-    totals = {"total_net": total_net, "total_iva": total_iva, "total_gross": total_gross}
-    return per_item_amounts, totals, calc_errors
+def fill_from_padron(obj_name: str, field: str, rs_key: str, iva_key: str):
+    """Callback: completa razón social y condición IVA con los datos del padrón."""
+    obj = st.session_state[obj_name]
+    msg_key = f"padron_msg_{obj_name}"
+    try:
+        record = get_padron_client().lookup(obj.get(field, ""))
+    except PadronError as e:
+        st.session_state[msg_key] = str(e)
+        return
+    if not record:
+        st.session_state[msg_key] = "El CUIT no figura en el padrón."
+        return
+
+    if record["razon_social"]:
+        obj["razon_social"] = st.session_state[rs_key] = record["razon_social"]
+    if record["condicion_iva"]:
+        obj["condicion_iva"] = record["condicion_iva"]
+        st.session_state[iva_key] = CONDICION_IVA.select_options[CONDICION_IVA.select_index(record["condicion_iva"])]
+    st.session_state[msg_key] = f"Datos completados desde el padrón: {record['razon_social'] or '-'}"
+
+
+def render_cuit_check(obj_name: str, field: str, rs_key: str, iva_key: str, allow_dni: bool):
+    value = st.session_state[obj_name].get(field, "")
+    if not value or not is_digits_only(value):
+        return
+    ok, msg = validate_cuit_dni(value, allow_dni=allow_dni)
+    if not ok:
+        st.warning(msg)
+        return
+    if len(value) == 11 and get_padron_client() is not None:
+        st.button(
+            "Buscar en padrón",
+            key=f"{obj_name}_padron",
+            on_click=fill_from_padron,
+            args=(obj_name, field, rs_key, iva_key),
+        )
+        if st.session_state.get(f"padron_msg_{obj_name}"):
+            st.caption(st.session_state[f"padron_msg_{obj_name}"])
 
 
 # -----------------------------
@@ -335,13 +264,11 @@ def render_tipo_factura():
     st.markdown("### Tipo de Factura")
     st.session_state["facturacion"]["tipo_factura"] = st.selectbox(
         "Tipo de Factura *",
-        options=["(Seleccionar)"] + TIPO_FACTURA_OPTIONS,
-        index=0
-        if not st.session_state["facturacion"]["tipo_factura"]
-        else (TIPO_FACTURA_OPTIONS.index(st.session_state["facturacion"]["tipo_factura"]) + 1),
+        options=TIPO_FACTURA.select_options,
+        index=TIPO_FACTURA.select_index(st.session_state["facturacion"]["tipo_factura"]),
         key="tipo_factura",
     )
-    if st.session_state["facturacion"]["tipo_factura"] == "(Seleccionar)":
+    if st.session_state["facturacion"]["tipo_factura"] == SELECT_PLACEHOLDER:
         st.session_state["facturacion"]["tipo_factura"] = None
 
 
@@ -349,9 +276,8 @@ def render_emisor():
     st.markdown("### Emisor")
     col1, col2 = st.columns(2)
     with col1:
-        st.session_state["emisor"]["razon_social"] = st.text_input(
-            "Nombre/razón social *", value=st.session_state["emisor"]["razon_social"], key="em_rs"
-        )
+        seed_widget("em_rs", st.session_state["emisor"]["razon_social"])
+        st.session_state["emisor"]["razon_social"] = st.text_input("Nombre/razón social *", key="em_rs")
     with col2:
         st.session_state["emisor"]["cuit"] = st.text_input(
             "CUIT * (Solo colocar números sin guiones)",
@@ -363,20 +289,19 @@ def render_emisor():
         )
         if st.session_state["emisor"]["cuit"] and not is_digits_only(st.session_state["emisor"]["cuit"]):
             st.warning("El CUIT solo puede contener números. Se limpiaron caracteres inválidos.")
+        render_cuit_check("emisor", "cuit", rs_key="em_rs", iva_key="em_iva", allow_dni=False)
 
     st.session_state["emisor"]["domicilio"] = st.text_input(
         "Domicilio (Opcional)", value=st.session_state["emisor"]["domicilio"], key="em_dom"
     )
 
+    seed_select("em_iva", CONDICION_IVA, st.session_state["emisor"]["condicion_iva"])
     st.session_state["emisor"]["condicion_iva"] = st.selectbox(
         "Condición frente al IVA *",
-        options=["(Seleccionar)"] + IVA_OPTIONS,
-        index=0
-        if not st.session_state["emisor"]["condicion_iva"]
-        else (IVA_OPTIONS.index(st.session_state["emisor"]["condicion_iva"]) + 1),
+        options=CONDICION_IVA.select_options,
         key="em_iva",
     )
-    if st.session_state["emisor"]["condicion_iva"] == "(Seleccionar)":
+    if st.session_state["emisor"]["condicion_iva"] == SELECT_PLACEHOLDER:
         st.session_state["emisor"]["condicion_iva"] = None
 
     st.divider()
@@ -405,11 +330,8 @@ def render_receptor():
     st.markdown("### Receptor")
     col1, col2 = st.columns(2)
     with col1:
-        st.session_state["receptor"]["razon_social"] = st.text_input(
-            "Nombre/razón social *",
-            value=st.session_state["receptor"]["razon_social"],
-            key="rec_rs",
-        )
+        seed_widget("rec_rs", st.session_state["receptor"]["razon_social"])
+        st.session_state["receptor"]["razon_social"] = st.text_input("Nombre/razón social *", key="rec_rs")
     with col2:
         st.session_state["receptor"]["cuit_dni"] = st.text_input(
             "CUIT/DNI * (Solo colocar números sin guiones)",
@@ -421,31 +343,28 @@ def render_receptor():
         )
         if st.session_state["receptor"]["cuit_dni"] and not is_digits_only(st.session_state["receptor"]["cuit_dni"]):
             st.warning("El CUIT/DNI solo puede contener números. Se limpiaron caracteres inválidos.")
+        render_cuit_check("receptor", "cuit_dni", rs_key="rec_rs", iva_key="rec_iva", allow_dni=True)
 
     st.session_state["receptor"]["domicilio"] = st.text_input(
         "Domicilio (Opcional)", value=st.session_state["receptor"]["domicilio"], key="rec_dom"
     )
 
+    seed_select("rec_iva", CONDICION_IVA, st.session_state["receptor"]["condicion_iva"])
     st.session_state["receptor"]["condicion_iva"] = st.selectbox(
         "Condición frente al IVA *",
-        options=["(Seleccionar)"] + IVA_OPTIONS,
-        index=0
-        if not st.session_state["receptor"]["condicion_iva"]
-        else (IVA_OPTIONS.index(st.session_state["receptor"]["condicion_iva"]) + 1),
+        options=CONDICION_IVA.select_options,
         key="rec_iva",
     )
-    if st.session_state["receptor"]["condicion_iva"] == "(Seleccionar)":
+    if st.session_state["receptor"]["condicion_iva"] == SELECT_PLACEHOLDER:
         st.session_state["receptor"]["condicion_iva"] = None
 
     st.session_state["receptor"]["condicion_venta"] = st.selectbox(
         "Condición de venta *",
-        options=["(Seleccionar)"] + COND_VENTA_OPTIONS,
-        index=0
-        if not st.session_state["receptor"]["condicion_venta"]
-        else (COND_VENTA_OPTIONS.index(st.session_state["receptor"]["condicion_venta"]) + 1),
+        options=CONDICION_VENTA.select_options,
+        index=CONDICION_VENTA.select_index(st.session_state["receptor"]["condicion_venta"]),
         key="rec_cv",
     )
-    if st.session_state["receptor"]["condicion_venta"] == "(Seleccionar)":
+    if st.session_state["receptor"]["condicion_venta"] == SELECT_PLACEHOLDER:
         st.session_state["receptor"]["condicion_venta"] = None
 
 
@@ -453,13 +372,11 @@ def render_facturacion():
     st.markdown("### Datos de Facturación")
     st.session_state["facturacion"]["servicio_producto"] = st.selectbox(
         "Servicio/Producto *",
-        options=["(Seleccionar)"] + SERVICIO_PRODUCTO_OPTIONS,
-        index=0
-        if not st.session_state["facturacion"]["servicio_producto"]
-        else (SERVICIO_PRODUCTO_OPTIONS.index(st.session_state["facturacion"]["servicio_producto"]) + 1),
+        options=SERVICIO_PRODUCTO.select_options,
+        index=SERVICIO_PRODUCTO.select_index(st.session_state["facturacion"]["servicio_producto"]),
         key="sp",
     )
-    if st.session_state["facturacion"]["servicio_producto"] == "(Seleccionar)":
+    if st.session_state["facturacion"]["servicio_producto"] == SELECT_PLACEHOLDER:
         st.session_state["facturacion"]["servicio_producto"] = None
 
     st.markdown("#### Fechas")
@@ -486,6 +403,24 @@ def render_facturacion():
             key="fecha_vencimiento",
         )
 
+    st.markdown("#### Moneda")
+    m1, m2 = st.columns(2)
+    with m1:
+        st.session_state["facturacion"]["moneda"] = st.selectbox(
+            "Moneda *",
+            options=MONEDA.labels,
+            index=MONEDA.index(st.session_state["facturacion"]["moneda"], 0),
+            format_func=lambda m: f"{m} - {MONEDA_NOMBRES[m]}",
+            key="moneda",
+        )
+    with m2:
+        moneda = st.session_state["facturacion"]["moneda"]
+        if moneda != BASE_CURRENCY:
+            try:
+                st.metric(f"Cotización {moneda}", fmt_money(get_rate(moneda, get_fx_client())))
+            except FxError as e:
+                st.warning(str(e))
+
 
 def render_items():
     st.markdown("### Items a facturar")
@@ -501,33 +436,31 @@ def render_items():
 
     # Render por item (con keys basadas en uid para que no se pierda estado)
     for it in list(items_list):
-        uid = it["uid"]
+        uid = it.uid
 
         with st.container(border=True):
             st.markdown("**Item**")
 
             c1, c2, c3 = st.columns([1, 2, 1])
             with c1:
-                it["codigo"] = st.text_input("Código (Opcional)", value=it.get("codigo", ""), key=f"{uid}_cod")
+                it.codigo = st.text_input("Código (Opcional)", value=it.codigo, key=f"{uid}_cod")
             with c2:
-                it["descripcion"] = st.text_input("Descripción *", value=it.get("descripcion", ""), key=f"{uid}_desc")
+                it.descripcion = st.text_input("Descripción *", value=it.descripcion, key=f"{uid}_desc")
             with c3:
-                it["cantidad"] = st.number_input(
+                it.cantidad = st.number_input(
                     "Cantidad *",
                     min_value=0.0,
-                    value=float(it.get("cantidad", 1.0) or 1.0),
+                    value=float(it.cantidad or 1.0),
                     step=1.0,
                     key=f"{uid}_qty",
                 )
 
             c4, c5, c6 = st.columns([2, 1, 1])
             with c4:
-                it["unidad_medida"] = st.selectbox(
+                it.unidad_medida = st.selectbox(
                     "Unidad de medida *",
-                    options=UNIDADES_MEDIDA,
-                    index=UNIDADES_MEDIDA.index(it.get("unidad_medida", "Unidad"))
-                    if it.get("unidad_medida", "Unidad") in UNIDADES_MEDIDA
-                    else 0,
+                    options=UNIDAD_MEDIDA.labels,
+                    index=UNIDAD_MEDIDA.index(it.unidad_medida, 0),
                     key=f"{uid}_um",
                 )
 
@@ -536,56 +469,56 @@ def render_items():
                     modo_label = st.selectbox(
                         "Modo de precio *",
                         options=["Precio unitario final (con IVA)", "Precio unitario sin IVA"],
-                        index=0 if it.get("precio_modo", "con_iva") == "con_iva" else 1,
+                        index=0 if it.precio_modo == "con_iva" else 1,
                         key=f"{uid}_modo",
                     )
-                    it["precio_modo"] = "con_iva" if modo_label.startswith("Precio unitario final") else "sin_iva"
+                    it.precio_modo = "con_iva" if modo_label.startswith("Precio unitario final") else "sin_iva"
                 with c6:
-                    it["precio_unitario"] = st.number_input(
+                    it.precio_unitario = st.number_input(
                         "Precio Unitario *",
                         min_value=0.0,
-                        value=float(it.get("precio_unitario", 0.0) or 0.0),
+                        value=float(it.precio_unitario or 0.0),
                         step=1.0,
                         key=f"{uid}_pu",
                     )
             else:
                 with c5:
-                    it["precio_modo"] = "con_iva"
-                    it["precio_unitario"] = st.number_input(
+                    it.precio_modo = "con_iva"
+                    it.precio_unitario = st.number_input(
                         "Precio Unitario *",
                         min_value=0.0,
-                        value=float(it.get("precio_unitario", 0.0) or 0.0),
+                        value=float(it.precio_unitario or 0.0),
                         step=1.0,
                         key=f"{uid}_pu",
                     )
                 with c6:
                     st.write("")
 
-            it["descuento_bonificacion"] = st.text_input(
+            it.descuento_bonificacion = st.text_input(
                 "Descuento/Bonificación (Opcional)",
-                value=str(it.get("descuento_bonificacion", "") or ""),
+                value=it.descuento_bonificacion,
                 help="Podés usar coma o punto (ej: 10,5). Se interpreta como MONTO (no porcentaje).",
                 key=f"{uid}_descbon",
             )
 
             # Subtotal del item calculado con los valores ya leídos
             am, err = compute_item_amounts(it, tipo_factura)
-            if err or not am:
+            if err or am is None:
                 st.warning("Subtotal: no disponible (revisá cantidad/precio/descuento)")
             else:
                 if con_iva:
                     st.caption(
-                        f"Subtotal Neto: {fmt_money(float(am.get('subtotal_net', 0.0)))}  |  "
-                        f"IVA 21%: {fmt_money(float(am.get('subtotal_iva', 0.0)))}  |  "
-                        f"Subtotal Total: {fmt_money(float(am.get('subtotal_gross', 0.0)))}"
+                        f"Subtotal Neto: {fmt_money(am.subtotal_net)}  |  "
+                        f"IVA 21%: {fmt_money(am.subtotal_iva)}  |  "
+                        f"Subtotal Total: {fmt_money(am.subtotal_gross)}"
                     )
                 else:
-                    st.caption(f"Subtotal: {fmt_money(float(am.get('subtotal_gross', 0.0)))}")
+                    st.caption(f"Subtotal: {fmt_money(am.subtotal_gross)}")
 
             col_del, _ = st.columns([1, 5])
             with col_del:
                 if len(items_list) > 1 and st.button("Eliminar item", key=f"{uid}_del"):
-                    st.session_state["items"] = [x for x in st.session_state["items"] if x["uid"] != uid]
+                    st.session_state["items"] = [x for x in st.session_state["items"] if x.uid != uid]
                     st.rerun()
 
     if st.button("Agregar item"):
@@ -621,8 +554,14 @@ def render_items():
 # -----------------------------
 # VALIDATION + PAYLOAD
 # -----------------------------
-def validate_all() -> list[str]:
+def validate_all() -> tuple[list[str], float | None]:
+    """
+    Errores del formulario y cotización de la moneda elegida (None si no se
+    pudo obtener). La cotización se consulta una sola vez acá y es la que
+    queda fija en el payload.
+    """
     errors: list[str] = []
+    cotizacion = None
 
     if not st.session_state["facturacion"]["tipo_factura"]:
         errors.append("Tipo de Factura: es obligatorio seleccionar una opción.")
@@ -638,8 +577,9 @@ def validate_all() -> list[str]:
     if not ok:
         errors.append("Emisor - Nombre/razón social: " + msg)
 
-    if not is_digits_only(st.session_state["emisor"]["cuit"]):
-        errors.append("Emisor - CUIT: Debe contener solo números y no puede estar vacío.")
+    ok, msg = validate_cuit_dni(st.session_state["emisor"]["cuit"])
+    if not ok:
+        errors.append("Emisor - CUIT: " + msg)
 
     if not st.session_state["emisor"]["condicion_iva"]:
         errors.append("Emisor - Condición frente al IVA: es obligatoria.")
@@ -653,8 +593,9 @@ def validate_all() -> list[str]:
     if not ok:
         errors.append("Receptor - Nombre/razón social: " + msg)
 
-    if not is_digits_only(st.session_state["receptor"]["cuit_dni"]):
-        errors.append("Receptor - CUIT/DNI: Debe contener solo números y no puede estar vacío.")
+    ok, msg = validate_cuit_dni(st.session_state["receptor"]["cuit_dni"], allow_dni=True)
+    if not ok:
+        errors.append("Receptor - CUIT/DNI: " + msg)
 
     if not st.session_state["receptor"]["condicion_iva"]:
         errors.append("Receptor - Condición frente al IVA: es obligatoria.")
@@ -665,27 +606,23 @@ def validate_all() -> list[str]:
     if not st.session_state["facturacion"]["servicio_producto"]:
         errors.append("Datos de Facturación - Servicio/Producto: es obligatorio.")
 
-    # Validación base de items (tu utils.py)
-    errors.extend(validate_items(st.session_state["items"]))
+    try:
+        cotizacion = get_rate(st.session_state["facturacion"]["moneda"], get_fx_client())
+    except FxError as e:
+        errors.append(f"Datos de Facturación - Moneda: {e}")
 
-    # Validar descuentos numéricos (coma/punto)
-    for i, it in enumerate(st.session_state["items"], start=1):
-        d_raw = str(it.get("descuento_bonificacion", "") or "").strip()
-        if d_raw != "":
-            try:
-                _ = parse_decimal_optional(d_raw)
-            except ValueError:
-                errors.append(f"Item {i}: 'Descuento/Bonificación' no es un número válido.")
+    # Validación de items (incluye descuentos con coma/punto)
+    errors.extend(validate_items(st.session_state["items"]))
 
-    return errors
+    return errors, cotizacion
 
 
-def build_payload_from_session() -> dict:
+def build_payload_from_session(cotizacion: float) -> dict:
     # Copia “sanitizada” de facturacion con fechas como string
     fact = dict(st.session_state["facturacion"])
-    fact["fecha_inicio"] = _date_to_str(fact["fecha_inicio"])
-    fact["fecha_fin"] = _date_to_str(fact["fecha_fin"])
-    fact["fecha_vencimiento"] = _date_to_str(fact["fecha_vencimiento"])
+    fact["fecha_inicio"] = date_to_str(fact["fecha_inicio"])
+    fact["fecha_fin"] = date_to_str(fact["fecha_fin"])
+    fact["fecha_vencimiento"] = date_to_str(fact["fecha_vencimiento"])
 
     payload = build_payload(
         {
@@ -696,24 +633,182 @@ def build_payload_from_session() -> dict:
         }
     )
 
-    tipo_factura = st.session_state["facturacion"]["tipo_factura"]
-    per_item_amounts, totals, _ = compute_totals(st.session_state["items"], tipo_factura)
-
-    payload["totales"] = {
-        "moneda": "ARS",
-        "tipo_factura": tipo_factura,
-        "total_neto": totals["total_net"],
-        "total_iva_21": totals["total_iva"],
-        "total": totals["total_gross"],
-        "items_calculados": per_item_amounts,
-        "nota": "Factura A/B: total = neto + IVA 21%. Factura C: sin desglose de IVA.",
-    }
-
-    # Por las dudas: convertir cualquier date/datetime que haya quedado
-    payload = make_json_safe(payload)
+    # la cotización (la obtenida al validar) queda fija en el payload desde la revisión
+    payload["totales"] = build_totales(
+        st.session_state["items"],
+        st.session_state["facturacion"]["tipo_factura"],
+        moneda=fact["moneda"],
+        cotizacion=cotizacion,
+    )
     return payload
 
 
+# -----------------------------
+# REVIEW HELPERS
+# -----------------------------
+ITEMS_PAGE_SIZE = 50
+
+
+def cached_payload_value(payload: dict, name: str, build):
+    """
+    Devuelve `build(payload)` cacheado en la sesión. El payload confirmado no
+    cambia, así que la clave es su invoice_key: un rerun por cualquier otro
+    botón reutiliza lo ya calculado.
+    """
+    key = invoice_key(payload)
+    cache = st.session_state.get("_payload_cache")
+    if not cache or cache.get("_key") != key:
+        cache = {"_key": key}
+        st.session_state["_payload_cache"] = cache
+    if name not in cache:
+        cache[name] = build(payload)
+    return cache[name]
+
+
+def review_rows(payload: dict) -> list[dict]:
+    tipo_factura = (payload.get("datos_facturacion", {}) or {}).get("tipo_factura", None)
+    con_iva = is_factura_con_iva(tipo_factura)
+
+    rows = []
+    items = payload.get("items", [])
+    calc_items = (payload.get("totales", {}) or {}).get("items_calculados", [])
+
+    for i, it in enumerate(items, start=1):
+        am = calc_items[i - 1] if i - 1 < len(calc_items) else {}
+        row = {
+            "N°": i,
+            "Código": it.get("codigo", ""),
+            "Descripción": it.get("descripcion", ""),
+            "Cantidad": it.get("cantidad", ""),
+            "Unidad": it.get("unidad_medida", ""),
+            "Modo Precio": ("Con IVA" if it.get("precio_modo") == "con_iva" else "Sin IVA") if con_iva else "-",
+            "Precio Ingresado": it.get("precio_unitario", ""),
+            "Descuento": it.get("descuento_bonificacion", ""),
+        }
+        if con_iva:
+            row.update(
+                {
+                    "Unit Neto": am.get("unit_net", None),
+                    "Unit IVA": am.get("unit_iva", None),
+                    "Unit Total": am.get("unit_gross", None),
+                    "Sub Neto": am.get("subtotal_net", None),
+                    "Sub IVA": am.get("subtotal_iva", None),
+                    "Sub Total": am.get("subtotal_gross", None),
+                }
+            )
+        else:
+            row.update({"Subtotal": am.get("subtotal_gross", None)})
+        rows.append(row)
+    return rows
+
+
+def confirmed_rows(payload: dict) -> list[dict]:
+    tot = payload.get("totales", {}) or {}
+    con_iva = is_factura_con_iva(tot.get("tipo_factura", None))
+    calc_items = tot.get("items_calculados", []) or []
+    return [
+        {
+            "Código": it.get("codigo", ""),
+            "Descripción": it.get("descripcion", ""),
+            "Cantidad": it.get("cantidad", ""),
+            "Unidad": it.get("unidad_medida", ""),
+            "Modo Precio": ("Con IVA" if it.get("precio_modo") == "con_iva" else "Sin IVA") if con_iva else "-",
+            "Precio Ingresado": it.get("precio_unitario", ""),
+            "Descuento": it.get("descuento_bonificacion", ""),
+            "Subtotal": (calc_items[i].get("subtotal_gross") if i < len(calc_items) else None),
+        }
+        for i, it in enumerate(payload.get("items", []))
+    ]
+
+
+def page_slice(total: int, key: str) -> tuple[int, int]:
+    """Selector de página; devuelve el rango [inicio, fin) a mostrar."""
+    if total <= ITEMS_PAGE_SIZE:
+        return 0, total
+    pages = (total + ITEMS_PAGE_SIZE - 1) // ITEMS_PAGE_SIZE
+    page = st.number_input(f"Página (de {pages})", min_value=1, max_value=pages, value=1, step=1, key=key)
+    start = (int(page) - 1) * ITEMS_PAGE_SIZE
+    end = min(start + ITEMS_PAGE_SIZE, total)
+    st.caption(f"Items {start + 1}–{end} de {total}")
+    return start, end
+
+
+def render_paginated_rows(rows: list[dict], key: str):
+    start, end = page_slice(len(rows), key)
+    st.dataframe(rows[start:end], use_container_width=True, hide_index=True)
+
+
+def render_totals(tot: dict, con_iva: bool):
+    moneda = tot.get("moneda") or BASE_CURRENCY
+    if con_iva:
+        st.metric(f"TOTAL Neto ({moneda})", fmt_money(float(tot.get("total_neto", 0.0) or 0.0)))
+        st.metric(f"IVA 21% ({moneda})", fmt_money(float(tot.get("total_iva_21", 0.0) or 0.0)))
+    st.metric(f"TOTAL ({moneda})", fmt_money(float(tot.get("total", 0.0) or 0.0)))
+    if moneda != BASE_CURRENCY:
+        st.caption(
+            f"Cotización: {fmt_money(float(tot.get('cotizacion') or 0.0))} ARS por {moneda} · "
+            f"Equivalente: {fmt_money(float(tot.get('total_ars') or 0.0))} ARS"
+        )
+
+
+def audit_actor() -> str:
+    """Usuario que opera la sesión, si un proxy de autenticación lo informa."""
+    headers = getattr(getattr(st, "context", None), "headers", None) or {}
+    for name in ("X-Forwarded-Email", "X-Forwarded-User", "X-Auth-Request-Email", "X-Remote-User"):
+        if headers.get(name):
+            return headers[name]
+    return "anonimo"
+
+
+def audit_submission(payload: dict, path: str):
+    tot = payload.get("totales") or {}
+    audit(
+        "envio",
+        actor=audit_actor(),
+        draft_id=st.session_state.get("draft_id"),
+        invoice_key=invoice_key(payload),
+        archivo=path,
+        emisor_cuit=payload["emisor"].get("cuit"),
+        receptor_cuit_dni=payload["receptor"].get("cuit_dni"),
+        tipo_factura=tot.get("tipo_factura"),
+        moneda=tot.get("moneda"),
+        total=tot.get("total"),
+        items=len(payload.get("items") or []),
+    )
+
+
+def webhook_event_text(event: dict) -> str:
+    """Línea a mostrar por cada evento de progreso del workflow."""
+    text = event.get("message") or event.get("step") or event.get("status") or json.dumps(event, ensure_ascii=False)
+    pct = event_progress_pct(event)
+    if pct is not None:
+        text = f"{text} ({pct:.0f}%)"
+    return f"- {text}"
+
+
+def render_payload_json(payload: dict, key: str):
+    """
+    JSON técnico bajo demanda: nada se envía al navegador hasta activarlo,
+    y los items se muestran de a una página.
+    """
+    if not st.toggle("Mostrar JSON", value=False, key=key):
+        return
+
+    tot = dict(payload.get("totales") or {})
+    calc_items = tot.pop("items_calculados", None) or []
+    st.json({k: v for k, v in payload.items() if k not in ("items", "totales")}, expanded=False)
+    st.json({"totales": tot}, expanded=False)
+
+    items = payload.get("items") or []
+    start, end = page_slice(len(items), key=f"{key}_page")
+    st.json({"items": items[start:end], "items_calculados": calc_items[start:end]}, expanded=False)
+
+    data = cached_payload_value(
+        payload, "json_bytes", lambda p: json.dumps(p, ensure_ascii=False, indent=2).encode("utf-8")
+    )
+    st.download_button("Descargar JSON completo", data=data, file_name="factura.json", mime="application/json", key=f"{key}_dl")
+
+
 # -----------------------------
 # PAGES
 # -----------------------------
@@ -736,14 +831,14 @@ def page_edit():
 
     st.divider()
     if st.button("Finalizar"):
-        errs = validate_all()
+        errs, cotizacion = validate_all()
         if errs:
             st.error("Hay errores en el formulario:")
             for e in errs:
                 st.write(f"- {e}")
             return
 
-        payload = build_payload_from_session()
+        payload = build_payload_from_session(cotizacion)
         st.session_state["last_payload"] = payload
         st.session_state["step"] = "review"
         st.rerun()
@@ -764,53 +859,17 @@ def page_review():
     con_iva = is_factura_con_iva(tipo_factura)
 
     st.markdown("#### Resumen de items")
-    rows = []
-    items = payload.get("items", [])
-    calc_items = (payload.get("totales", {}) or {}).get("items_calculados", [])
-
-    for i, it in enumerate(items, start=1):
-        am = calc_items[i - 1] if i - 1 < len(calc_items) else {}
-        row = {
-            "N°": i,
-            "Código": it.get("codigo", ""),
-            "Descripción": it.get("descripcion", ""),
-            "Cantidad": it.get("cantidad", ""),
-            "Unidad": it.get("unidad_medida", ""),
-            "Modo Precio": ("Con IVA" if it.get("precio_modo") == "con_iva" else "Sin IVA") if con_iva else "-",
-            "Precio Ingresado": it.get("precio_unitario", ""),
-            "Descuento": it.get("descuento_bonificacion", ""),
-        }
-        if con_iva:
-            row.update(
-                {
-                    "Unit Neto": am.get("unit_net", None),
-                    "Unit IVA": am.get("unit_iva", None),
-                    "Unit Total": am.get("unit_gross", None),
-                    "Sub Neto": am.get("subtotal_net", None),
-                    "Sub IVA": am.get("subtotal_iva", None),
-                    "Sub Total": am.get("subtotal_gross", None),
-                }
-            )
-        else:
-            row.update({"Subtotal": am.get("subtotal_gross", None)})
-        rows.append(row)
-
-    st.dataframe(rows, use_container_width=True, hide_index=True)
+    render_paginated_rows(cached_payload_value(payload, "rows_review", review_rows), key="rev_page")
 
     st.divider()
     tot = payload.get("totales", {}) or {}
     st.markdown("#### Totales")
     st.write(f"Tipo de factura: **{tot.get('tipo_factura', '-') }**")
-    if con_iva:
-        st.metric("TOTAL Neto", fmt_money(float(tot.get("total_neto", 0.0) or 0.0)))
-        st.metric("IVA 21%", fmt_money(float(tot.get("total_iva_21", 0.0) or 0.0)))
-        st.metric("TOTAL", fmt_money(float(tot.get("total", 0.0) or 0.0)))
-    else:
-        st.metric("TOTAL", fmt_money(float(tot.get("total", 0.0) or 0.0)))
+    render_totals(tot, con_iva)
 
     st.divider()
     st.markdown("#### Resumen completo (JSON)")
-    st.json(payload)
+    render_payload_json(payload, key="rev_json")
 
     st.divider()
     col1, col2 = st.columns(2)
@@ -824,18 +883,41 @@ def page_review():
             st.rerun()
 
 
-def send_to_webhook(payload: dict) -> dict:
-    payload = make_json_safe(payload)  # seguridad extra
+def close_draft():
+    """Borra el borrador de la factura enviada; si se sigue editando, continúa en uno nuevo."""
+    get_draft_store().delete(st.session_state["draft_id"])
+    st.session_state["draft_id"] = uuid4().hex
+    st.query_params["draft"] = st.session_state["draft_id"]
+    st.session_state["draft_sent"] = True
+
+
+def best_effort(what: str, fn, *args) -> None:
+    """Registro auxiliar (índice, estadísticas, auditoría): si falla se loguea, pero no frena el envío."""
     try:
-        r = requests.post(WEBHOOK_URL, json=payload, timeout=300)
-        content_type = (r.headers.get("content-type") or "").lower()
-        if "application/json" in content_type:
-            body = r.json()
-        else:
-            body = {"raw_text": r.text}
-        return {"ok": r.ok, "status_code": r.status_code, "response": body}
-    except requests.RequestException as e:
-        return {"ok": False, "status_code": None, "response": {"error": str(e)}}
+        fn(*args)
+    except Exception:
+        log.warning("No se pudo %s", what, exc_info=True)
+
+
+def render_due_check():
+    """Simula la corrida de hoy (sin guardar ni enviar) y muestra las plantillas que se rechazarían."""
+    if not st.button("Revisar plantillas de hoy"):
+        return
+    store = get_template_store()
+    with st.spinner("Generando plantillas (simulación)..."):
+        # mismos clientes (y caches) de cotizaciones y padrón que el resto de la app
+        summary = run_due(
+            date.today(), store=store, dry_run=True, fx=get_fx_client(), padron=get_padron_client()
+        )
+    st.write(f"Plantillas a emitir hoy: {summary['plantillas']} - generadas: {summary['generadas']}")
+    if summary["rechazadas"]:
+        nombres = {t["template_id"]: t["nombre"] for t in store.list()}
+        st.error("Plantillas rechazadas:")
+        st.dataframe(
+            [{"plantilla": nombres.get(r["template_id"], r["template_id"]), **r} for r in summary["rechazadas"]],
+            use_container_width=True,
+            hide_index=True,
+        )
 
 
 def page_confirmed():
@@ -854,38 +936,16 @@ def page_confirmed():
     con_iva = is_factura_con_iva(tipo_factura)
 
     st.markdown("#### Items (Resumen)")
-    calc_items = tot.get("items_calculados", []) or []
-    st.dataframe(
-        [
-            {
-                "Código": it.get("codigo", ""),
-                "Descripción": it.get("descripcion", ""),
-                "Cantidad": it.get("cantidad", ""),
-                "Unidad": it.get("unidad_medida", ""),
-                "Modo Precio": ("Con IVA" if it.get("precio_modo") == "con_iva" else "Sin IVA") if con_iva else "-",
-                "Precio Ingresado": it.get("precio_unitario", ""),
-                "Descuento": it.get("descuento_bonificacion", ""),
-                "Subtotal": (calc_items[i].get("subtotal_gross") if i < len(calc_items) else None),
-            }
-            for i, it in enumerate(payload.get("items", []))
-        ],
-        use_container_width=True,
-        hide_index=True,
-    )
+    render_paginated_rows(cached_payload_value(payload, "rows_confirmed", confirmed_rows), key="conf_page")
 
     st.divider()
     st.markdown("#### Totales")
     st.write(f"Tipo de factura: **{tipo_factura or '-'}**")
-    if con_iva:
-        st.metric("TOTAL Neto", fmt_money(float(tot.get("total_neto", 0.0) or 0.0)))
-        st.metric("IVA 21%", fmt_money(float(tot.get("total_iva_21", 0.0) or 0.0)))
-        st.metric("TOTAL", fmt_money(float(tot.get("total", 0.0) or 0.0)))
-    else:
-        st.metric("TOTAL", fmt_money(float(tot.get("total", 0.0) or 0.0)))
+    render_totals(tot, con_iva)
 
     st.divider()
     st.markdown("#### Datos confirmados (JSON)")
-    st.json(payload)
+    render_payload_json(payload, key="conf_json")
 
     st.divider()
     col1, col2 = st.columns(2)
@@ -896,13 +956,44 @@ def page_confirmed():
 
     with col2:
         if st.button("Enviar Datos"):
-            safe_payload = make_json_safe(payload)
-            path = save_json(safe_payload, folder="data")  # <- ahora no rompe con date
-            st.session_state["last_saved_path"] = str(path)
+            with st.status("Enviando factura al workflow...", expanded=True) as status:
+                # el payload ya es JSON puro: fechas como string e items/importes como dict
+                safe_payload = payload
+                path = save_json(safe_payload, folder="data")
+                st.session_state["last_saved_path"] = str(path)
+                best_effort(
+                    "registrar la factura en el índice",
+                    lambda: get_reconciliation_index().record_saved(safe_payload, str(path)),
+                )
+                best_effort("sumar la factura a las estadísticas", lambda: get_analytics_store().record_invoice(safe_payload))
+                best_effort("auditar el envío", audit_submission, safe_payload, str(path))
+                st.write("Respaldo local guardado. Enviando a n8n (AFIP/ARCA)...")
+
+                # los eventos de progreso del workflow se muestran a medida que llegan
+                result = send_to_webhook(safe_payload, on_event=lambda ev: st.write(webhook_event_text(ev)))
+                st.session_state["last_webhook_result"] = result
+                best_effort(
+                    "registrar la respuesta en el índice",
+                    lambda: get_reconciliation_index().record_result(safe_payload, result),
+                )
 
-            result = send_to_webhook(safe_payload)
-            st.session_state["last_webhook_result"] = result
-            st.rerun()
+                if result["ok"]:
+                    best_effort("borrar el borrador", close_draft)
+                    status.update(label="Factura procesada.", state="complete", expanded=False)
+                else:
+                    status.update(label="El workflow devolvió un error.", state="error", expanded=True)
+            # sin st.rerun(): el bloque de estado queda visible con el progreso
+
+    with st.expander("Guardar como factura recurrente"):
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            nombre = st.text_input("Nombre de la plantilla", value=payload["receptor"].get("razon_social", ""), key="tpl_nombre")
+        with col2:
+            dia = st.number_input("Día del mes", min_value=1, max_value=31, value=date.today().day, step=1, key="tpl_dia")
+        if st.button("Guardar plantilla"):
+            get_template_store().save(template_from_payload(payload, nombre.strip() or "Sin nombre", int(dia)))
+            st.success(f"Plantilla guardada: se emitirá el día {int(dia)} de cada mes.")
+        render_due_check()
 
     if st.session_state["last_saved_path"]:
         st.success(f"JSON guardado en: {st.session_state['last_saved_path']}")
@@ -914,7 +1005,131 @@ def page_confirmed():
         else:
             st.error("Respuesta del workflow (error):")
         st.write(f"Status code: {res['status_code']}")
-        st.json(res["response"])
+        body = res["response"]
+        if isinstance(body, dict) and body.get("body_path"):
+            st.info(f"Respuesta de {body.get('bytes', 0):,} bytes guardada en: {body['body_path']}")
+        else:
+            st.json(body)
+
+
+def page_analytics():
+    st.title("Estadísticas de facturación")
+    st.write("Totales mensuales de las facturas guardadas.")
+    st.divider()
+
+    store = get_analytics_store()
+    months = store.months()
+    if not months:
+        st.info("Todavía no hay facturas registradas.")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        labels = {
+            "total": "Total del mes",
+            "emisor": "Por emisor",
+            "receptor": "Por receptor",
+            "tipo_factura": "Por tipo de factura",
+        }
+        dimension = st.selectbox("Agrupar", options=list(labels), format_func=labels.get, key="an_dim")
+    with col2:
+        month = st.selectbox("Mes", options=["(Todos)"] + months, key="an_month")
+    month = None if month == "(Todos)" else month
+
+    rows = store.monthly(dimension, month, month)
+    if month:
+        c1, c2, c3 = st.columns(3)
+        totals = store.monthly("total", month, month)
+        tot = totals[0] if totals else {"count": 0, "total": 0.0, "total_iva": 0.0}
+        with c1:
+            st.metric("Facturas", tot["count"])
+        with c2:
+            st.metric("TOTAL facturado (ARS)", fmt_money(float(tot["total"])))
+        with c3:
+            st.metric("IVA 21%", fmt_money(float(tot["total_iva"])))
+
+    st.dataframe(
+        [
+            {
+                "Mes": r["month"],
+                "Clave": r["key"] or "-",
+                "Facturas": r["count"],
+                "Neto": r["total_neto"],
+                "IVA": r["total_iva"],
+                "Total": r["total"],
+            }
+            for r in rows
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    with st.expander("Registro de auditoría"):
+        st.caption("Cola de escritura del registro de auditoría en este proceso.")
+        st.json(get_audit_logger().metrics())
+
+    st.divider()
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Volver"):
+            st.session_state["step"] = "edit"
+            st.rerun()
+    with col2:
+        # corre en un thread de fondo: el dashboard sigue leyendo los agregados actuales hasta el reemplazo
+        if st.button("Reconstruir desde el archivo"):
+            if not store.start_rebuild():
+                st.info("Ya hay una reconstrucción en curso.")
+        status = store.rebuild_status()
+        if status["estado"] == "en_curso":
+            st.info("Reconstruyendo estadísticas desde el archivo... (recargá la página para ver el avance)")
+        elif status["estado"] == "terminado":
+            st.success(f"Estadísticas reconstruidas ({status['facturas']} facturas).")
+        elif status["estado"] == "error":
+            st.error(f"No se pudo reconstruir: {status['error']}")
+
+
+def page_export():
+    st.title("Exportar facturas")
+    st.write("Genera tablas de facturas e items para contabilidad.")
+    st.divider()
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        desde = st.date_input("Desde", value=None, format="DD/MM/YYYY", key="exp_desde")
+    with col2:
+        hasta = st.date_input("Hasta", value=None, format="DD/MM/YYYY", key="exp_hasta")
+    with col3:
+        cuit = st.text_input("CUIT emisor/receptor (Opcional)", key="exp_cuit")
+
+    formatos = st.multiselect("Formatos", options=["csv", "parquet"], default=["csv"], key="exp_fmt")
+    incremental = st.checkbox("Solo facturas nuevas desde la última exportación incremental", key="exp_inc")
+
+    if st.button("Generar exportación"):
+        try:
+            with st.spinner("Exportando..."):
+                summary = export_archive(
+                    EXPORT_DIR,
+                    formats=formatos or ["csv"],
+                    desde=desde.isoformat() if desde else None,
+                    hasta=hasta.isoformat() if hasta else None,
+                    cuit=sanitize_digits(cuit) or None,
+                    incremental=incremental,
+                )
+        except RuntimeError as e:
+            st.error(str(e))
+        else:
+            st.session_state["last_export"] = summary
+
+    summary = st.session_state.get("last_export")
+    if summary:
+        st.success(f"Exportadas {summary['facturas']} facturas y {summary['items']} items.")
+        for path in summary["archivos"]:
+            with open(path, "rb") as f:
+                st.download_button(f"Descargar {os.path.basename(path)}", data=f, file_name=os.path.basename(path), key=path)
+
+    st.divider()
+    if st.button("Volver"):
+        st.session_state["step"] = "edit"
+        st.rerun()
 
 
 # -----------------------------
@@ -922,18 +1137,34 @@ def page_confirmed():
 # -----------------------------
 def main():
     st.set_page_config(page_title="Facturación Automatizada", layout="wide")
+    resume_draft()
     init_state()
 
-    step = st.session_state["step"]
-    if step == "edit":
-        page_edit()
-    elif step == "review":
-        page_review()
-    elif step == "confirmed":
-        page_confirmed()
-    else:
-        st.session_state["step"] = "edit"
-        st.rerun()
+    with st.sidebar:
+        if st.button("Estadísticas"):
+            st.session_state["step"] = "analytics"
+        if st.button("Exportar"):
+            st.session_state["step"] = "export"
+
+    # finally: st.rerun() corta el script con una excepción, pero el
+    # borrador se guarda igual
+    try:
+        step = st.session_state["step"]
+        if step == "edit":
+            page_edit()
+        elif step == "review":
+            page_review()
+        elif step == "confirmed":
+            page_confirmed()
+        elif step == "analytics":
+            page_analytics()
+        elif step == "export":
+            page_export()
+        else:
+            st.session_state["step"] = "edit"
+            st.rerun()
+    finally:
+        persist_draft()
 
 
 if __name__ == "__main__":
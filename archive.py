@@ -0,0 +1,194 @@
+# archive.py
+"""
+Lectura en streaming del archivo de facturas guardadas por `save_json`.
+
+Las facturas pueden estar sueltas en `data/` o compactadas en bundles
+mensuales (`data/archive/invoices_AAAAMM.zip`, ver compaction.py). Para
+quien lee es transparente: se recorren de a una (nunca se cargan todas en
+memoria), en orden de nombre de archivo, que es el orden cronológico de
+guardado.
+"""
+from __future__ import annotations
+
+import heapq
+import json
+import os
+import zipfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DATA_DIR = os.environ.get("DATA_DIR", "data")
+
+ARCHIVE_SUBDIR = "archive"
+
+INVOICE_PREFIX = "invoice_"
+BUNDLE_PREFIX = "invoices_"
+
+
+def is_invoice_name(name: str) -> bool:
+    return name.startswith(INVOICE_PREFIX) and name.endswith(".json")
+
+
+def invoice_month_key(name: str) -> Optional[str]:
+    """AAAAMM a partir del nombre `invoice_AAAAMMDD_...json` (None si no tiene fecha)."""
+    stamp = name[len(INVOICE_PREFIX) : len(INVOICE_PREFIX) + 6]
+    return stamp if len(stamp) == 6 and stamp.isdigit() else None
+
+
+def archive_dir(folder: str = DATA_DIR) -> str:
+    return os.path.join(folder, ARCHIVE_SUBDIR)
+
+
+def bundle_path(folder: str, month_key: str) -> str:
+    return os.path.join(archive_dir(folder), f"{BUNDLE_PREFIX}{month_key}.zip")
+
+
+def list_bundles(folder: str = DATA_DIR) -> List[str]:
+    try:
+        with os.scandir(archive_dir(folder)) as it:
+            return sorted(
+                e.path for e in it if e.is_file() and e.name.startswith(BUNDLE_PREFIX) and e.name.endswith(".zip")
+            )
+    except FileNotFoundError:
+        return []
+
+
+def iter_invoice_names(folder: str = DATA_DIR, after: Optional[str] = None) -> Iterator[str]:
+    """Nombres de las facturas sueltas en `folder`, ordenados. `after` saltea los <= a ese nombre."""
+    try:
+        with os.scandir(folder) as it:
+            names = sorted(e.name for e in it if e.is_file() and is_invoice_name(e.name))
+    except FileNotFoundError:
+        return
+    for name in names:
+        if after is None or name > after:
+            yield name
+
+
+# Veces que se vuelve a tomar la foto del archivo si una compactación cambió los bundles
+SNAPSHOT_RETRIES = 5
+
+
+def _bundles_state(folder: str) -> List[Tuple[str, int, int, int]]:
+    state = []
+    for path in list_bundles(folder):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        state.append((path, st.st_ino, st.st_size, st.st_mtime_ns))
+    return state
+
+
+def _open_bundles(paths: List[str]) -> List[zipfile.ZipFile]:
+    zips = []
+    for path in paths:
+        try:
+            zips.append(zipfile.ZipFile(path))
+        except (OSError, zipfile.BadZipFile):
+            continue
+    return zips
+
+
+def _snapshot(folder: str, after: Optional[str]) -> Tuple[List[zipfile.ZipFile], List[str]]:
+    """
+    Bundles abiertos y nombres de las sueltas, consistentes entre sí.
+
+    Los bundles se abren antes de listar las sueltas y, si una compactación
+    los reemplazó mientras tanto, se vuelve a empezar: así una factura que
+    pasó de suelta a bundle en el medio no queda afuera de los dos.
+    """
+    for _ in range(SNAPSHOT_RETRIES):
+        before = _bundles_state(folder)
+        zips = _open_bundles([path for path, *_ in before])
+        names = list(iter_invoice_names(folder, after=after))
+        if _bundles_state(folder) == before:
+            break
+        for zf in zips:
+            zf.close()
+    return zips, names
+
+
+def _read_compacted(folder: str, name: str) -> Optional[bytes]:
+    """Bytes de una factura desde el bundle publicado actualmente (None si no está)."""
+    month_key = invoice_month_key(name)
+    paths = [bundle_path(folder, month_key)] if month_key else list_bundles(folder)
+    for path in paths:
+        try:
+            with zipfile.ZipFile(path) as zf:
+                return zf.read(name)
+        except (OSError, KeyError, zipfile.BadZipFile):
+            continue
+    return None
+
+
+def _iter_loose(folder: str, names: List[str]) -> Iterator[Tuple[str, bytes]]:
+    for name in names:
+        try:
+            with open(os.path.join(folder, name), "rb") as f:
+                yield name, f.read()
+        except FileNotFoundError:
+            # compactada después de la foto: ya está en el bundle publicado
+            data = _read_compacted(folder, name)
+            if data is not None:
+                yield name, data
+        except OSError:
+            continue
+
+
+def _iter_bundle(zf: zipfile.ZipFile, after: Optional[str]) -> Iterator[Tuple[str, bytes]]:
+    for name in sorted(n for n in zf.namelist() if is_invoice_name(n)):
+        if after is not None and name <= after:
+            continue
+        try:
+            yield name, zf.read(name)
+        except (OSError, zipfile.BadZipFile):
+            continue
+
+
+def iter_invoice_bytes(folder: str = DATA_DIR, after: Optional[str] = None) -> Iterator[Tuple[str, bytes]]:
+    """
+    Como `iter_invoices` pero sin parsear: `(nombre, json_bytes)`. Para
+    procesos que reparten el parseo entre workers (ver reverify.py).
+    """
+    zips, names = _snapshot(folder, after)
+    try:
+        sources = [_iter_loose(folder, names)] + [_iter_bundle(zf, after) for zf in zips]
+        last = None
+        for name, data in heapq.merge(*sources, key=lambda entry: entry[0]):
+            # durante una compactación la misma factura puede estar suelta y en el bundle
+            if name == last:
+                continue
+            last = name
+            yield name, data
+    finally:
+        for zf in zips:
+            zf.close()
+
+
+def iter_invoices(folder: str = DATA_DIR, after: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Genera `(nombre, payload)` para cada factura guardada, sueltas y
+    compactadas, en orden de nombre. Saltea archivos ilegibles.
+    """
+    for name, data in iter_invoice_bytes(folder, after):
+        try:
+            yield name, json.loads(data)
+        except ValueError:
+            continue
+
+
+def read_invoice(name: str, folder: str = DATA_DIR) -> Optional[Dict[str, Any]]:
+    """Lee una factura por nombre, esté suelta o compactada."""
+    try:
+        with open(os.path.join(folder, name), "rb") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        pass
+    month_key = invoice_month_key(name)
+    if not month_key:
+        return None
+    try:
+        with zipfile.ZipFile(bundle_path(folder, month_key)) as zf:
+            return json.loads(zf.read(name))
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
@@ -0,0 +1,223 @@
+# audit.py
+"""
+Registro de auditoría: quién envió qué factura, cuándo, y cómo respondió
+cada intento contra el webhook (status y latencia).
+
+Escritura diferida: `log()` solo encola el registro (no toca disco en el
+request); un thread de fondo los escribe en lotes a JSONL, append-only:
+
+  data/audit/audit_<host>_<pid>.jsonl                   archivo actual
+  data/audit/audit_<host>_<pid>_AAAAmmdd_HHMMSS_ffffff.jsonl   rotados
+
+Cada proceso escribe su propio archivo (varias réplicas pueden compartir
+`data/`). Al superar AUDIT_MAX_BYTES el archivo se rota; los rotados no se
+borran nunca.
+
+La cola es acotada: si se llena, `log()` espera hasta AUDIT_BLOCK_S y recién
+ahí descarta el registro. Las esperas, descartes y la profundidad máxima
+quedan en `metrics()`. Al salir del proceso (atexit) se vuelca todo lo
+pendiente.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+AUDIT_DIR = os.environ.get("AUDIT_DIR", "data/audit")
+AUDIT_MAX_BYTES = int(os.environ.get("AUDIT_MAX_BYTES", str(10 * 1024 * 1024)))
+AUDIT_QUEUE_SIZE = int(os.environ.get("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BLOCK_S = float(os.environ.get("AUDIT_BLOCK_S", "0.5"))
+AUDIT_FLUSH_INTERVAL_S = float(os.environ.get("AUDIT_FLUSH_INTERVAL_S", "1.0"))
+
+# Registros por escritura
+AUDIT_BATCH_SIZE = 500
+
+_STOP = object()
+
+
+class AuditLogger:
+    def __init__(
+        self,
+        folder: str = AUDIT_DIR,
+        max_bytes: int = AUDIT_MAX_BYTES,
+        queue_size: int = AUDIT_QUEUE_SIZE,
+        block_s: float = AUDIT_BLOCK_S,
+        flush_interval_s: float = AUDIT_FLUSH_INTERVAL_S,
+    ):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.block_s = block_s
+        self.flush_interval_s = flush_interval_s
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self._base = f"audit_{socket.gethostname()}_{os.getpid()}"
+        self._file = None
+        self._size = 0
+
+        self._lock = threading.Lock()
+        self._written_cond = threading.Condition(self._lock)
+        self._metrics = {
+            "encolados": 0,
+            "escritos": 0,
+            "descartados": 0,
+            "esperas": 0,  # log() encontró la cola llena y tuvo que esperar
+            "max_profundidad": 0,
+            "lotes": 0,
+            "errores_escritura": 0,
+            "rotaciones": 0,
+        }
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # -----------------------------
+    # PRODUCTOR
+    # -----------------------------
+    def log(self, event: str, **fields: Any) -> bool:
+        """Encola un registro. Devuelve False si se descartó (logger cerrado o cola llena)."""
+        record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "event": event, **fields}
+        if self._closed:
+            return self._drop()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._metrics["esperas"] += 1
+            try:
+                self._queue.put(record, timeout=self.block_s)
+            except queue.Full:
+                return self._drop()
+        with self._lock:
+            self._metrics["encolados"] += 1
+            depth = self._queue.qsize()
+            if depth > self._metrics["max_profundidad"]:
+                self._metrics["max_profundidad"] = depth
+        return True
+
+    def _drop(self) -> bool:
+        with self._lock:
+            self._metrics["descartados"] += 1
+        return False
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Espera a que lo encolado hasta ahora esté escrito. Devuelve False si venció `timeout`."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            target = self._metrics["encolados"]
+            while self._metrics["escritos"] + self._metrics["errores_escritura"] < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._thread.is_alive():
+                    return False
+                self._written_cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Vuelca lo pendiente y detiene el writer. Idempotente."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._metrics)
+        out["profundidad"] = self._queue.qsize()
+        out["capacidad"] = self._queue.maxsize
+        return out
+
+    # -----------------------------
+    # WRITER
+    # -----------------------------
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            try:
+                first = self._queue.get(timeout=self.flush_interval_s)
+            except queue.Empty:
+                continue
+            batch: List[Dict[str, Any]] = []
+            for item in self._drain(first):
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+            if batch:
+                self._write(batch)
+        if self._file is not None:
+            self._file.close()
+
+    def _drain(self, first: Any) -> List[Any]:
+        items = [first]
+        while len(items) < AUDIT_BATCH_SIZE:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        data = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in batch)
+        ok = True
+        try:
+            if self._file is None:
+                self._open()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data.encode("utf-8"))
+        except OSError:
+            ok = False
+        if ok and self._size >= self.max_bytes:
+            try:
+                self._rotate()
+            except OSError:
+                # se reintenta en el próximo lote
+                self._file = None
+        with self._lock:
+            self._metrics["escritos" if ok else "errores_escritura"] += len(batch)
+            self._metrics["lotes"] += 1
+            self._written_cond.notify_all()
+
+    def _current_path(self) -> str:
+        return os.path.join(self.folder, self._base + ".jsonl")
+
+    def _open(self) -> None:
+        os.makedirs(self.folder, exist_ok=True)
+        self._file = open(self._current_path(), "a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        self._file = None
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        os.replace(self._current_path(), os.path.join(self.folder, f"{self._base}_{stamp}.jsonl"))
+        with self._lock:
+            self._metrics["rotaciones"] += 1
+
+
+_logger: Optional[AuditLogger] = None
+_logger_lock = threading.Lock()
+
+
+def get_audit_logger() -> AuditLogger:
+    """Logger compartido por todo el proceso (sesiones, dispatcher, corridas masivas)."""
+    global _logger
+    if _logger is None:
+        with _logger_lock:
+            if _logger is None:
+                _logger = AuditLogger()
+    return _logger
+
+
+def audit(event: str, **fields: Any) -> bool:
+    return get_audit_logger().log(event, **fields)
@@ -0,0 +1,136 @@
+# batching.py
+"""
+Agrupa facturas en lotes para enviarlas a n8n con un solo request por lote.
+
+Un lote se envía cuando junta `max_items` facturas, cuando supera
+`max_bytes`, o cuando pasaron `max_wait_s` segundos desde que entró su
+primera factura (así un lote chico no queda esperando indefinidamente).
+"""
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from utils import invoice_key
+from webhook import encode_payload, post_batch
+
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "50"))
+BATCH_MAX_BYTES = int(os.environ.get("BATCH_MAX_BYTES", str(2 * 1024 * 1024)))
+BATCH_MAX_WAIT_S = float(os.environ.get("BATCH_MAX_WAIT_S", "2.0"))
+
+
+def _error_result(message: str) -> Dict[str, Any]:
+    return {"ok": False, "status_code": None, "response": {"error": message}}
+
+
+class WebhookBatcher:
+    """
+    Uso:
+        with WebhookBatcher() as batcher:
+            futures = [batcher.add(p) for p in payloads]
+        results = [f.result() for f in futures]
+
+    Cada `add` devuelve un Future que se resuelve con el resultado de esa
+    factura (misma forma que `send_to_webhook`).
+    """
+
+    def __init__(
+        self,
+        max_items: int = BATCH_MAX_ITEMS,
+        max_bytes: int = BATCH_MAX_BYTES,
+        max_wait_s: float = BATCH_MAX_WAIT_S,
+        max_in_flight: int = 2,
+        post: Callable[..., Dict[str, Dict[str, Any]]] = post_batch,
+        timeout: Optional[float] = None,
+    ):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.max_wait_s = max_wait_s
+        self.timeout = timeout
+        self._post = post
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight)
+        self._lock = threading.Lock()
+        self._entries: List[Tuple[str, bytes]] = []
+        self._futures: List[Future] = []
+        self._ids: Set[str] = set()
+        self._size = 0
+        self._timer: Optional[threading.Timer] = None
+        self._closed = False
+
+    def add(self, payload: Dict[str, Any]) -> Future:
+        data = encode_payload(payload)
+        inv_id = invoice_key(payload)
+        fut: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("El batcher ya fue cerrado.")
+            if inv_id in self._ids:
+                # la respuesta del lote es por id: dos copias no se pueden distinguir (y se facturaría dos veces)
+                fut.set_result(_error_result("Factura duplicada en el lote: no se envió esta copia."))
+                return fut
+            # si la factura no entra en el lote actual, se despacha el lote primero
+            if self._entries and self._size + len(data) > self.max_bytes:
+                self._flush_locked()
+            self._entries.append((inv_id, data))
+            self._ids.add(inv_id)
+            self._futures.append(fut)
+            self._size += len(data)
+
+            if len(self._entries) >= self.max_items or self._size >= self.max_bytes:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.max_wait_s, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return fut
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._entries:
+            return
+        entries, futures = self._entries, self._futures
+        self._entries, self._futures, self._size = [], [], 0
+        self._ids = set()
+        self._pool.submit(self._send, entries, futures)
+
+    def _send(self, entries: Sequence[Tuple[str, bytes]], futures: Sequence[Future]) -> None:
+        results: Dict[str, Dict[str, Any]] = {}
+        failure: Optional[BaseException] = None
+        try:
+            results = self._post(entries, timeout=self.timeout) or {}
+        except Exception as e:
+            results = {inv_id: _error_result(str(e)) for inv_id, _ in entries}
+        except BaseException as e:
+            failure = e
+            raise
+        finally:
+            # todos los futures se resuelven siempre: quien espera un resultado nunca queda colgado
+            missing = _error_result("La respuesta del lote no incluye esta factura.")
+            for (inv_id, _), fut in zip(entries, futures):
+                if fut.done():
+                    continue
+                if failure is not None:
+                    fut.set_exception(failure)
+                else:
+                    fut.set_result(results.get(inv_id, missing))
+
+    def close(self) -> None:
+        """Envía lo pendiente y espera a que terminen todos los lotes."""
+        with self._lock:
+            self._closed = True
+            self._flush_locked()
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self) -> "WebhookBatcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,101 @@
+# bench_startup.py
+"""
+Benchmark de arranque en frío y primer render de la app.
+
+Cada medición corre en un proceso nuevo (arranque en frío real):
+  - cold start: tiempo de `import app` (módulos + catálogos).
+  - first render: primera ejecución completa del script vía AppTest.
+
+Sale con código 1 si alguna mediana supera su presupuesto o si `requests`
+se importa al arrancar (debe cargarse recién al enviar).
+
+Uso:
+    python bench_startup.py [--runs 5] [--cold-budget 3.0] [--render-budget 2.0]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+
+_COLD_SNIPPET = """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+print(json.dumps({"seconds": time.perf_counter() - t0, "requests_loaded": "requests" in sys.modules}))
+"""
+
+_RENDER_SNIPPET = """
+import json, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=60)
+t0 = time.perf_counter()
+at.run()
+print(json.dumps({"seconds": time.perf_counter() - t0, "exceptions": [str(e.value) for e in at.exception]}))
+"""
+
+
+def _run_snippet(snippet: str, env: dict) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", snippet],
+        cwd=HERE,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure(snippet: str, runs: int, env: dict) -> list[dict]:
+    return [_run_snippet(snippet, env) for _ in range(runs)]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--cold-budget", type=float, default=float(os.environ.get("COLD_START_BUDGET_S", "3.0")))
+    parser.add_argument("--render-budget", type=float, default=float(os.environ.get("FIRST_RENDER_BUDGET_S", "2.0")))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # el benchmark no debe ensuciar el store real de borradores
+        env = dict(os.environ, DRAFT_STORE_PATH=str(Path(tmp) / "drafts.db"))
+
+        cold = measure(_COLD_SNIPPET, args.runs, env)
+        render = measure(_RENDER_SNIPPET, args.runs, env)
+
+    cold_s = statistics.median(r["seconds"] for r in cold)
+    render_s = statistics.median(r["seconds"] for r in render)
+    errors = [e for r in render for e in r["exceptions"]]
+
+    print(f"cold start   : {cold_s * 1000:8.1f} ms (budget {args.cold_budget * 1000:.0f} ms)")
+    print(f"first render : {render_s * 1000:8.1f} ms (budget {args.render_budget * 1000:.0f} ms)")
+    requests_loaded = any(r["requests_loaded"] for r in cold)
+    print(f"requests importado al arrancar: {requests_loaded}")
+
+    failed = False
+    if requests_loaded:
+        print("FAIL: `import app` carga requests (el import debe ser diferido)")
+        failed = True
+    if errors:
+        print(f"FAIL: el render lanzó excepciones: {errors[0]}")
+        failed = True
+    if cold_s > args.cold_budget:
+        print("FAIL: cold start fuera de presupuesto")
+        failed = True
+    if render_s > args.render_budget:
+        print("FAIL: first render fuera de presupuesto")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# cache.py
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class TTLCache:
+    """
+    Cache LRU con vencimiento, thread-safe. Pensado para compartirse entre
+    sesiones (una instancia por proceso).
+
+    `get` devuelve `(encontrado, valor)` para poder cachear también `None`
+    (por ejemplo, "este CUIT no existe").
+
+    `get_or_load` además agrupa las cargas concurrentes de una misma clave:
+    si varias sesiones piden a la vez algo que no está, una sola llama al
+    proveedor y las demás esperan ese resultado.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[Hashable, Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl: float | None = None) -> Any:
+        """
+        Valor cacheado de `key`, o el resultado de `loader()` (que se cachea).
+        Si `loader` falla, la excepción llega a todos los que esperaban y no
+        se cachea nada.
+        """
+        hit, value = self.get(key)
+        if hit:
+            return value
+
+        with self._lock:
+            pending = self._loading.get(key)
+            owner = pending is None
+            if owner:
+                # otra carga pudo terminar entre el get y este lock
+                entry = self._data.get(key)
+                if entry is not None and entry[0] >= time.monotonic():
+                    return entry[1]
+                pending = self._loading[key] = Future()
+                self.loads += 1
+        if not owner:
+            return pending.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            pending.set_exception(e)
+            raise
+        self.set(key, value, ttl)
+        with self._lock:
+            del self._loading[key]
+        pending.set_result(value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
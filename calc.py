@@ -0,0 +1,103 @@
+# calc.py
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from model import Amounts, Item, amounts_to_dicts
+
+IVA_RATE = 0.21
+
+
+def is_factura_con_iva(tipo_factura: str | None) -> bool:
+    return tipo_factura in ("Factura A", "Factura B")
+
+
+def compute_item_amounts(item: Item, tipo_factura: str | None) -> tuple[Amounts | None, str | None]:
+    """
+    Factura A/B:
+      - si precio_modo=con_iva => precio_unitario es final (con IVA).
+      - si precio_modo=sin_iva => precio_unitario es neto, se suma IVA 21%.
+    Descuento: MONTO (no %) y se resta del subtotal_total.
+    """
+    try:
+        qty = float(item.cantidad or 0.0)
+        price_input = float(item.precio_unitario or 0.0)
+        discount = item.descuento()
+
+        if qty < 0:
+            return None, "Cantidad inválida."
+        if price_input < 0:
+            return None, "Precio inválido."
+
+        if is_factura_con_iva(tipo_factura):
+            if item.precio_modo == "sin_iva":
+                unit_net = price_input
+                unit_gross = unit_net * (1.0 + IVA_RATE)
+            else:
+                unit_gross = price_input
+                unit_net = unit_gross / (1.0 + IVA_RATE)
+
+            subtotal_gross = qty * unit_gross - discount
+            subtotal_net = subtotal_gross / (1.0 + IVA_RATE)
+            return Amounts(
+                unit_net,
+                unit_gross - unit_net,
+                unit_gross,
+                subtotal_net,
+                subtotal_gross - subtotal_net,
+                subtotal_gross,
+            ), None
+
+        # Factura C: sin desglose
+        subtotal_gross = qty * price_input - discount
+        return Amounts(price_input, 0.0, price_input, subtotal_gross, 0.0, subtotal_gross), None
+
+    except Exception:
+        return None, "No se pudo calcular (revisá cantidad / precio / descuento)."
+
+
+def compute_totals(
+    items_list: list[Item], tipo_factura: str | None
+) -> tuple[list[Amounts | None], dict, list[str]]:
+    per_item_amounts: list[Amounts | None] = []
+    calc_errors: list[str] = []
+    total_net = 0.0
+    total_iva = 0.0
+    total_gross = 0.0
+
+    for i, it in enumerate(items_list, start=1):
+        amounts, err = compute_item_amounts(it, tipo_factura)
+        per_item_amounts.append(amounts)
+        if err:
+            calc_errors.append(f"Item {i}: {err}")
+            continue
+
+        total_net += amounts.subtotal_net
+        total_iva += amounts.subtotal_iva
+        total_gross += amounts.subtotal_gross
+
+    totals = {"total_net": total_net, "total_iva": total_iva, "total_gross": total_gross}
+    return per_item_amounts, totals, calc_errors
+
+
+def build_totales(
+    items_list: list[Item], tipo_factura: str | None, moneda: str = "ARS", cotizacion: float = 1.0
+) -> Dict[str, Any]:
+    """
+    Bloque `totales` del payload. Los importes van en `moneda`; los `*_ars`
+    son su equivalente en pesos a `cotizacion` (pesos por unidad de moneda).
+    """
+    per_item_amounts, totals, _ = compute_totals(items_list, tipo_factura)
+    return {
+        "moneda": moneda,
+        "cotizacion": cotizacion,
+        "tipo_factura": tipo_factura,
+        "total_neto": totals["total_net"],
+        "total_iva_21": totals["total_iva"],
+        "total": totals["total_gross"],
+        "total_neto_ars": round(totals["total_net"] * cotizacion, 2),
+        "total_iva_21_ars": round(totals["total_iva"] * cotizacion, 2),
+        "total_ars": round(totals["total_gross"] * cotizacion, 2),
+        "items_calculados": amounts_to_dicts(per_item_amounts),
+        "nota": "Factura A/B: total = neto + IVA 21%. Factura C: sin desglose de IVA.",
+    }
@@ -0,0 +1,198 @@
+# catalogs.py
+"""
+Catálogos de opciones de la UI y sus códigos AFIP.
+
+Se construyen una sola vez por proceso (el módulo queda cacheado en
+sys.modules aunque Streamlit re-ejecute app.py en cada rerun), junto con
+sus índices label <-> posición <-> código AFIP para no recorrer listas en
+cada render ni al armar el payload.
+"""
+from __future__ import annotations
+
+from typing import Iterable, Iterator, Optional, Tuple, Union
+
+Code = Union[int, str]
+
+SELECT_PLACEHOLDER = "(Seleccionar)"
+
+
+class Catalog:
+    """
+    Lista inmutable de labels con búsqueda O(1) label <-> índice y,
+    si se indican, label <-> código AFIP.
+    """
+
+    __slots__ = ("labels", "codes", "select_options", "_index", "_by_code")
+
+    def __init__(self, labels: Iterable[str], codes: Optional[Iterable[Code]] = None):
+        self.labels: Tuple[str, ...] = tuple(labels)
+        self.codes: Tuple[Code, ...] = tuple(codes) if codes is not None else ()
+        if self.codes and len(self.codes) != len(self.labels):
+            raise ValueError("labels y codes deben tener el mismo largo")
+        # opciones para selectbox con placeholder en la posición 0
+        self.select_options: Tuple[str, ...] = (SELECT_PLACEHOLDER,) + self.labels
+        self._index = {label: i for i, label in enumerate(self.labels)}
+        self._by_code = {code: label for label, code in zip(self.labels, self.codes)}
+
+    def index(self, label: Optional[str], default: Optional[int] = None) -> Optional[int]:
+        return self._index.get(label, default)
+
+    def select_index(self, label: Optional[str]) -> int:
+        """Índice dentro de `select_options` (0 = placeholder / sin valor)."""
+        i = self._index.get(label)
+        return 0 if i is None else i + 1
+
+    def label(self, index: int) -> str:
+        return self.labels[index]
+
+    def code(self, label: Optional[str]) -> Optional[Code]:
+        """Código AFIP del label (None si no existe o el catálogo no tiene códigos)."""
+        i = self._index.get(label)
+        if i is None or not self.codes:
+            return None
+        return self.codes[i]
+
+    def label_for_code(self, code: Code) -> Optional[str]:
+        return self._by_code.get(code)
+
+    def __contains__(self, label: object) -> bool:
+        return label in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.labels)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+
+# Listado de opciones de Tipo de Factura según AFIP
+TIPO_FACTURA_OPTIONS = ["Factura A", "Factura B", "Factura C"]
+
+# Listado de opciones de Condición frente al IVA según AFIP
+IVA_OPTIONS = [
+    "IVA Responsable Inscripto",
+    "IVA Sujeto Exento",
+    "Consumidor Final",
+    "Responsable Monotributo",
+    "Sujeto No Categorizado",
+    "Proveedor del Exterior",
+    "Cliente del Exterior",
+    "IVA Liberado – Ley N° 19.640",
+    "Monotributista Social",
+    "IVA No Alcanzado",
+    "Monotributo Trabajador Independiente Promovido",
+]
+
+# Listado de opciones de Condición de Venta según AFIP
+COND_VENTA_OPTIONS = [
+    "Contado",
+    "Cuenta Corriente",
+    "Tarjeta de Débito",
+    "Tarjeta de Crédito",
+    "Cheque",
+    "Ticket / Tiquet",
+    "Otros medios de pago electrónico",
+    "Transferencia Bancaria",
+    "Otra",
+]
+
+# Listado de opciones de Servicio/Producto según AFIP
+SERVICIO_PRODUCTO_OPTIONS = ["Producto", "Servicio", "Producto/Servicio"]
+
+# Monedas habilitadas para facturar (ISO 4217)
+MONEDA_OPTIONS = ["ARS", "USD", "EUR"]
+MONEDA_NOMBRES = {"ARS": "Pesos argentinos", "USD": "Dólares estadounidenses", "EUR": "Euros"}
+
+# Listado de Unidades de Medida según AFIP
+UNIDADES_MEDIDA = [
+    "Sin descripción",
+    "Kilogramo",
+    "Metros",
+    "Metro cuadrado",
+    "Metro cubico",
+    "Litros",
+    "1000 kilowatt hora",
+    "Unidad",
+    "Par",
+    "Docena",
+    "Quilate",
+    "Millar",
+    "Mega-u. int. act. antib",
+    "Unidad int. act. inmung",
+    "Gramo",
+    "Milimetro",
+    "Milimetro cubico",
+    "Kilometro",
+    "Hectolitro",
+    "Mega u. int. act. inmung.",
+    "Centímetro",
+    "Kilogramo activo",
+    "Gramo activo",
+    "Gramo base",
+    "Uiacthor",
+    "Juego o paquete mazo de naipes",
+    "Muiacthor",
+    "Centimetro cubico",
+    "Uiactant",
+    "Tonelada",
+    "Decametro cubico",
+    "Hectometro cubico",
+    "Kilometro cubico",
+    "Microgramo",
+    "Nanogramo",
+    "Picogramo",
+    "Muiactant",
+    "Uiactig",
+    "Miligramo",
+    "Mililitro",
+    "Curie",
+    "Milicurie",
+    "Microcurie",
+    "U. inter. act. hor.",
+    "Mega u. inter. act. hor.",
+    "Kilogramo base",
+    "Gruesa",
+    "Muiactig",
+    "Kg. bruto",
+    "Pack",
+    "Horma",
+    "Otras unidades",
+]
+
+
+# -----------------------------
+# CÓDIGOS AFIP (mismo orden que los listados)
+# -----------------------------
+# CbteTipo (FEParamGetTiposCbte)
+TIPO_FACTURA_CODES = [1, 6, 11]
+
+# Condición IVA del receptor (FEParamGetCondicionIvaReceptor)
+IVA_CODES = [1, 4, 5, 6, 7, 8, 9, 10, 13, 15, 16]
+
+# Forma de pago de Comprobantes en Línea
+COND_VENTA_CODES = [1, 96, 69, 68, 97, 91, 90, 21, 99]
+
+# Concepto (FEParamGetTiposConcepto)
+SERVICIO_PRODUCTO_CODES = [1, 2, 3]
+
+# Monedas (FEParamGetTiposMonedas)
+MONEDA_CODES = ["PES", "DOL", "060"]
+
+# Unidades de medida (FEParamGetUnidadesMedida / MTXCA)
+UNIDADES_MEDIDA_CODES = [
+    *range(0, 38),
+    41,
+    *range(47, 56),
+    61,
+    62,
+    63,
+    98,
+]
+
+
+TIPO_FACTURA = Catalog(TIPO_FACTURA_OPTIONS, TIPO_FACTURA_CODES)
+CONDICION_IVA = Catalog(IVA_OPTIONS, IVA_CODES)
+CONDICION_VENTA = Catalog(COND_VENTA_OPTIONS, COND_VENTA_CODES)
+SERVICIO_PRODUCTO = Catalog(SERVICIO_PRODUCTO_OPTIONS, SERVICIO_PRODUCTO_CODES)
+UNIDAD_MEDIDA = Catalog(UNIDADES_MEDIDA, UNIDADES_MEDIDA_CODES)
+MONEDA = Catalog(MONEDA_OPTIONS, MONEDA_CODES)
@@ -0,0 +1,168 @@
+# compaction.py
+"""
+Compactación de `data/`: junta las facturas viejas en bundles mensuales
+comprimidos y borra los originales.
+
+  data/archive/invoices_AAAAMM.zip            facturas del mes (bytes originales)
+  data/archive/invoices_AAAAMM.manifest.json  nombre -> sha256, tamaño
+
+El zip permite leer una factura puntual sin descomprimir el resto (ver
+`archive.read_invoice`). Un original solo se borra después de releerlo
+desde el bundle ya publicado y comprobar que el sha256 coincide.
+
+Puede correr con la app en marcha: solo toca archivos más viejos que
+`--dias`, `save_json` escribe de forma atómica con nombres nuevos, y los
+bundles se arman en un archivo temporal que reemplaza al anterior de una vez.
+
+Uso por consola:
+    python compaction.py [--dias 30] [--dry-run]
+"""
+from __future__ import annotations
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import sys
+import time
+import zipfile
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from archive import DATA_DIR, archive_dir, bundle_path, invoice_month_key, iter_invoice_names
+
+RETENTION_DAYS = int(os.environ.get("RETENTION_DAYS", "30"))
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def manifest_path(bundle: str) -> str:
+    return bundle[: -len(".zip")] + ".manifest.json"
+
+
+def _load_manifest(bundle: str) -> Dict[str, Dict[str, object]]:
+    try:
+        with open(manifest_path(bundle), encoding="utf-8") as f:
+            return json.load(f).get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def _month_of(folder: str, name: str) -> str:
+    month_key = invoice_month_key(name)
+    if month_key:
+        return month_key
+    return time.strftime("%Y%m", time.localtime(os.path.getmtime(os.path.join(folder, name))))
+
+
+def compact_month(folder: str, month_key: str, names: List[str]) -> int:
+    """
+    Agrega `names` al bundle del mes y borra los originales verificados.
+    Devuelve cuántos originales se borraron.
+    """
+    bundle = bundle_path(folder, month_key)
+    manifest = _load_manifest(bundle)
+    tmp = bundle + ".tmp"
+    added: Dict[str, str] = {}
+
+    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as out:
+        # 1) contenido actual del bundle (la fuente de verdad es el zip, no el manifest)
+        if os.path.exists(bundle):
+            with zipfile.ZipFile(bundle) as old:
+                for info in old.infolist():
+                    data = old.read(info)
+                    out.writestr(info, data, compress_type=zipfile.ZIP_DEFLATED, compresslevel=9)
+                    entry = manifest.get(info.filename)
+                    if not entry or entry.get("size") != len(data):
+                        manifest[info.filename] = {"sha256": _sha256(data), "size": len(data)}
+
+        # 2) facturas nuevas (si ya estaban de una corrida interrumpida, no se duplican)
+        for name in names:
+            try:
+                with open(os.path.join(folder, name), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            digest = _sha256(data)
+            if name not in manifest:
+                out.writestr(name, data)
+                manifest[name] = {"sha256": digest, "size": len(data)}
+            added[name] = digest
+
+    # 3) verificación del bundle nuevo antes de publicarlo
+    with zipfile.ZipFile(tmp) as check:
+        if check.testzip() is not None:
+            os.remove(tmp)
+            raise RuntimeError(f"Bundle corrupto: {tmp}")
+
+    os.replace(tmp, bundle)
+    mtmp = manifest_path(bundle) + ".tmp"
+    with open(mtmp, "w", encoding="utf-8") as f:
+        json.dump({"month": month_key, "bundle": os.path.basename(bundle), "files": manifest}, f, indent=1)
+    os.replace(mtmp, manifest_path(bundle))
+
+    # 4) borrar originales solo si el bundle publicado tiene exactamente los mismos bytes
+    removed = 0
+    with zipfile.ZipFile(bundle) as published:
+        for name, digest in added.items():
+            try:
+                if _sha256(published.read(name)) != digest:
+                    continue
+            except KeyError:
+                continue
+            try:
+                os.remove(os.path.join(folder, name))
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+def compact(folder: str = DATA_DIR, days: int = RETENTION_DAYS, dry_run: bool = False) -> Dict[str, int]:
+    """Compacta las facturas sueltas con más de `days` días. Devuelve originales borrados por mes."""
+    os.makedirs(archive_dir(folder), exist_ok=True)
+    cutoff = time.time() - days * 86400
+
+    with open(os.path.join(archive_dir(folder), ".compaction.lock"), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise RuntimeError("Ya hay una compactación en curso.")
+
+        by_month: Dict[str, List[str]] = defaultdict(list)
+        for name in iter_invoice_names(folder):
+            try:
+                if os.path.getmtime(os.path.join(folder, name)) >= cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            by_month[_month_of(folder, name)].append(name)
+
+        result: Dict[str, int] = {}
+        for month_key in sorted(by_month):
+            names = by_month[month_key]
+            result[month_key] = len(names) if dry_run else compact_month(folder, month_key, names)
+        return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compacta facturas viejas en bundles mensuales.")
+    parser.add_argument("--dias", type=int, default=RETENTION_DAYS)
+    parser.add_argument("--data", default=DATA_DIR)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    result = compact(args.data, args.dias, args.dry_run)
+    verb = "a compactar" if args.dry_run else "compactadas"
+    for month_key, n in result.items():
+        print(f"{month_key}: {n} facturas {verb}")
+    if not result:
+        print("Nada para compactar.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+# dispatcher.py
+"""
+Envío concurrente de muchas facturas a n8n.
+
+`WebhookDispatcher` reparte los envíos en un pool acotado de threads, limita
+el ritmo con un token bucket y corta con un circuit breaker cuando n8n
+empieza a fallar o a responder lento: mientras el circuito está abierto los
+envíos fallan al instante en vez de quedar colgados esperando el timeout.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from webhook import send_to_webhook
+
+DISPATCH_CONCURRENCY = int(os.environ.get("DISPATCH_CONCURRENCY", "4"))
+DISPATCH_RATE_PER_S = float(os.environ.get("DISPATCH_RATE_PER_S", "2.0"))
+DISPATCH_TIMEOUT_S = float(os.environ.get("DISPATCH_TIMEOUT_S", "120"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class TokenBucket:
+    """Token bucket thread-safe: `rate` tokens por segundo, ráfagas de hasta `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate debe ser > 0")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Bloquea hasta obtener un token."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker sobre una ventana de las últimas `window` llamadas.
+
+    Se abre cuando, con al menos `min_calls` en la ventana, la proporción de
+    fallas supera `failure_ratio`. Cuenta como falla un error de red, un 5xx
+    o una respuesta más lenta que `slow_call_s` (un 4xx es un problema de la
+    factura, no de n8n). Abierto, rechaza todo durante `open_s` segundos;
+    después deja pasar una sola llamada de prueba (half-open) y según su
+    resultado vuelve a cerrar o a abrir.
+    """
+
+    def __init__(
+        self,
+        failure_ratio: float = 0.5,
+        slow_call_s: float = 60.0,
+        window: int = 20,
+        min_calls: int = 5,
+        open_s: float = 30.0,
+    ):
+        self.failure_ratio = failure_ratio
+        self.slow_call_s = slow_call_s
+        self.min_calls = min_calls
+        self.open_s = open_s
+        self.state = CLOSED
+        self._outcomes: deque = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_s:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def is_failure(self, result: Dict[str, Any], latency_s: float) -> bool:
+        status = result.get("status_code")
+        return status is None or status >= 500 or latency_s > self.slow_call_s
+
+    def record(self, result: Dict[str, Any], latency_s: float) -> None:
+        failed = self.is_failure(result, latency_s)
+        with self._lock:
+            if self.state == OPEN:
+                # llamada que salió antes de abrirse el circuito: ya no cuenta
+                return
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                if failed:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                return
+
+            self._outcomes.append(failed)
+            if len(self._outcomes) >= self.min_calls:
+                ratio = sum(self._outcomes) / len(self._outcomes)
+                if ratio > self.failure_ratio:
+                    self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+
+def _circuit_open_result() -> Dict[str, Any]:
+    return {
+        "ok": False,
+        "status_code": None,
+        "circuit_open": True,
+        "response": {"error": "n8n no disponible (circuito abierto); no se envió la factura."},
+    }
+
+
+class WebhookDispatcher:
+    """
+    Envía muchos payloads con `send` (por defecto `send_to_webhook`).
+
+    El pool tiene `max_concurrency` threads fijos, así que nunca hay más
+    envíos en vuelo que eso, y cada envío usa `timeout` en vez de los 300s
+    del envío interactivo.
+    """
+
+    def __init__(
+        self,
+        send: Callable[..., Dict[str, Any]] = send_to_webhook,
+        max_concurrency: int = DISPATCH_CONCURRENCY,
+        rate_per_s: float = DISPATCH_RATE_PER_S,
+        burst: Optional[float] = None,
+        timeout: float = DISPATCH_TIMEOUT_S,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.send = send
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate_per_s, burst)
+        self.breaker = breaker or CircuitBreaker(slow_call_s=timeout / 2)
+
+    def _send_one(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.breaker.allow():
+            return _circuit_open_result()
+        self.bucket.acquire()
+
+        t0 = time.monotonic()
+        try:
+            result = self.send(payload, timeout=self.timeout)
+        except Exception as e:
+            # una excepción cuenta como falla: si era la prueba half-open, el breaker la tiene que ver
+            result = {"ok": False, "status_code": None, "response": {"error": str(e)}}
+        self.breaker.record(result, time.monotonic() - t0)
+        return result
+
+    def dispatch(
+        self,
+        payloads: Iterable[Dict[str, Any]],
+        on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Envía todos los payloads y devuelve los resultados en el mismo orden.
+        `on_result(i, result)` se llama a medida que termina cada envío.
+        """
+        payloads = list(payloads)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(payloads)
+
+        def run(i: int) -> None:
+            try:
+                results[i] = self._send_one(payloads[i])
+            except Exception as e:  # un envío roto no debe frenar al resto
+                results[i] = {"ok": False, "status_code": None, "response": {"error": str(e)}}
+            if on_result:
+                on_result(i, results[i])
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            list(pool.map(run, range(len(payloads))))
+
+        return results  # type: ignore[return-value]
@@ -0,0 +1,201 @@
+# draft_store.py
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Optional, Tuple
+
+from utils import connect_sqlite
+
+# Ruta del store compartido. Con varias réplicas debe apuntar a un volumen común.
+DRAFT_STORE_PATH = os.environ.get("DRAFT_STORE_PATH", "data/drafts.db")
+
+# Tiempo (segundos) que se acumulan cambios antes de escribirlos.
+DRAFT_DEBOUNCE_S = float(os.environ.get("DRAFT_DEBOUNCE_S", "1.0"))
+
+# Secciones recordadas por réplica para no reescribir las que no cambiaron
+DRAFT_CACHE_SIZE = int(os.environ.get("DRAFT_CACHE_SIZE", "10000"))
+
+# Secciones del estado de sesión que forman un borrador
+DRAFT_SECTIONS = ("emisor", "receptor", "facturacion", "items", "step")
+
+# Campos que nunca se persisten en el borrador
+_SECRET_FIELDS = {"emisor": ("clave_fiscal",)}
+
+
+def _encode(obj: Any) -> Any:
+    if hasattr(obj, "to_dict"):
+        # model.Item: se guarda como dict y init_state lo vuelve a convertir
+        return obj.to_dict()
+    if isinstance(obj, datetime):
+        return {"__datetime__": obj.isoformat()}
+    if isinstance(obj, date):
+        return {"__date__": obj.isoformat()}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    if "__datetime__" in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if "__date__" in obj and len(obj) == 1:
+        return date.fromisoformat(obj["__date__"])
+    return obj
+
+
+def _dump_section(name: str, value: Any) -> str:
+    secret = _SECRET_FIELDS.get(name)
+    if secret and isinstance(value, dict):
+        value = {k: v for k, v in value.items() if k not in secret}
+    return json.dumps(value, default=_encode, ensure_ascii=False, sort_keys=True)
+
+
+class DraftStore:
+    """
+    Store de borradores compartido entre réplicas (SQLite en modo WAL).
+
+    Cada sección del borrador se guarda en su propia fila, y solo se escriben
+    las secciones que cambiaron desde la última escritura. Las escrituras se
+    agrupan durante `debounce_s` segundos y se vuelcan en una sola transacción.
+
+    Cada fila lleva un `version` que sube en cada escritura. La réplica
+    recuerda (hash, versión) de lo último que escribió o leyó, en una cache
+    LRU de DRAFT_CACHE_SIZE secciones: una sección igual a la recordada se
+    saltea solo si la fila sigue en esa versión (si otra réplica la cambió,
+    se vuelve a escribir).
+    """
+
+    def __init__(
+        self,
+        path: str = DRAFT_STORE_PATH,
+        debounce_s: float = DRAFT_DEBOUNCE_S,
+        cache_size: int = DRAFT_CACHE_SIZE,
+    ):
+        self.debounce_s = debounce_s
+        self.cache_size = cache_size
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS draft_sections (
+                draft_id   TEXT NOT NULL,
+                section    TEXT NOT NULL,
+                data       TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                version    INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (draft_id, section)
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(draft_sections)")}
+        if "version" not in columns:
+            # migración: stores creados antes de la columna version
+            self._conn.execute("ALTER TABLE draft_sections ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, str]] = {}
+        self._written: "OrderedDict[Tuple[str, str], Tuple[int, int]]" = OrderedDict()
+        self._timer: Optional[threading.Timer] = None
+        atexit.register(self.flush)
+
+    def _remember(self, draft_id: str, name: str, data: str, version: int) -> None:
+        key = (draft_id, name)
+        self._written[key] = (hash(data), version)
+        self._written.move_to_end(key)
+        while len(self._written) > self.cache_size:
+            self._written.popitem(last=False)
+
+    def _versions(self, draft_id: str) -> Dict[str, int]:
+        cur = self._conn.execute("SELECT section, version FROM draft_sections WHERE draft_id = ?", (draft_id,))
+        return dict(cur.fetchall())
+
+    def save(self, draft_id: str, state: Dict[str, Any]) -> None:
+        """Encola las secciones modificadas de `state` para escribirlas."""
+        with self._lock:
+            versions: Optional[Dict[str, int]] = None
+            for name in DRAFT_SECTIONS:
+                if name not in state:
+                    continue
+                data = _dump_section(name, state[name])
+                known = self._written.get((draft_id, name))
+                if known is not None and known[0] == hash(data):
+                    # igual a lo último visto: solo se saltea si nadie la cambió desde entonces
+                    if versions is None:
+                        versions = self._versions(draft_id)
+                    if versions.get(name) == known[1]:
+                        self._pending.get(draft_id, {}).pop(name, None)
+                        continue
+                self._pending.setdefault(draft_id, {})[name] = data
+
+            if not self._pending:
+                return
+            if self.debounce_s <= 0:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.debounce_s, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        """Escribe inmediatamente todos los cambios pendientes."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        now = time.time()
+        rows = [
+            (draft_id, name, data, now)
+            for draft_id, sections in self._pending.items()
+            for name, data in sections.items()
+        ]
+        with self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO draft_sections (draft_id, section, data, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (draft_id, section)
+                DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at,
+                              version = draft_sections.version + 1
+                """,
+                rows,
+            )
+            for draft_id, sections in self._pending.items():
+                versions = self._versions(draft_id)
+                for name, data in sections.items():
+                    self._remember(draft_id, name, data, versions[name])
+        self._pending.clear()
+
+    def load(self, draft_id: str) -> Optional[Dict[str, Any]]:
+        """Devuelve el borrador guardado (o None si no existe)."""
+        with self._lock:
+            self._flush_locked()
+            cur = self._conn.execute(
+                "SELECT section, data, version FROM draft_sections WHERE draft_id = ?", (draft_id,)
+            )
+            rows = cur.fetchall()
+            if not rows:
+                return None
+            draft: Dict[str, Any] = {}
+            for name, data, version in rows:
+                # lo leído pasa a ser la base para detectar cambios en esta réplica
+                self._remember(draft_id, name, data, version)
+                draft[name] = json.loads(data, object_hook=_decode)
+            return draft
+
+    def delete(self, draft_id: str) -> None:
+        """Borra el borrador (p. ej. una vez enviada la factura)."""
+        with self._lock:
+            self._pending.pop(draft_id, None)
+            for name in DRAFT_SECTIONS:
+                self._written.pop((draft_id, name), None)
+            with self._conn:
+                self._conn.execute("DELETE FROM draft_sections WHERE draft_id = ?", (draft_id,))
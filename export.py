@@ -0,0 +1,440 @@
+# export.py
+"""
+Exportación del archivo de facturas a tablas planas para contabilidad.
+
+Genera dos tablas: `facturas` (una fila por factura) e `items` (una fila por
+item, con sus importes calculados). Las facturas se leen en streaming y se
+escriben en chunks, así que la memoria no depende del tamaño del archivo.
+
+Formatos: csv (siempre) y parquet (requiere pyarrow).
+
+Uso por consola:
+    python export.py --out exports [--formato csv,parquet]
+                     [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD] [--cuit CUIT]
+                     [--incremental]
+
+Con --incremental solo se exportan las facturas que no salieron en las
+corridas incrementales anteriores (ver `.export_state.json` en la carpeta de
+salida). El nombre de una factura lleva el segundo en que se guardó y un
+sufijo aleatorio, así que el orden de nombre no es el orden de guardado
+dentro del mismo segundo (ni para escrituras lentas). Por eso la marca de
+agua es el sello de tiempo menos EXPORT_OVERLAP_S segundos, y las facturas
+de esa ventana ya exportadas se recuerdan por nombre para no repetirlas.
+Cada combinación de filtros (--desde/--hasta/--cuit) lleva su propia marca:
+una corrida filtrada no adelanta la de las demás.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from archive import DATA_DIR, INVOICE_PREFIX, iter_invoices
+from utils import invoice_key
+
+EXPORT_CHUNK = 1000
+
+# Ventana que se vuelve a recorrer en cada corrida incremental
+EXPORT_OVERLAP_S = float(os.environ.get("EXPORT_OVERLAP_S", "300"))
+
+STATE_FILE = ".export_state.json"
+
+STAMP_FORMAT = "%Y%m%d_%H%M%S"
+
+INVOICE_COLUMNS = [
+    ("invoice_key", "str"),
+    ("archivo", "str"),
+    ("created_at", "str"),
+    ("tipo_factura", "str"),
+    ("tipo_factura_codigo", "int"),
+    ("servicio_producto", "str"),
+    ("fecha_inicio", "str"),
+    ("fecha_fin", "str"),
+    ("fecha_vencimiento", "str"),
+    ("emisor_cuit", "str"),
+    ("emisor_razon_social", "str"),
+    ("emisor_condicion_iva", "str"),
+    ("receptor_cuit_dni", "str"),
+    ("receptor_razon_social", "str"),
+    ("receptor_condicion_iva", "str"),
+    ("condicion_venta", "str"),
+    ("moneda", "str"),
+    ("cotizacion", "float"),
+    ("total_neto", "float"),
+    ("total_iva_21", "float"),
+    ("total", "float"),
+    ("total_ars", "float"),
+]
+
+# Importes de `items_calculados` que se copian a cada fila de item
+AMOUNT_FIELDS = ("unit_net", "unit_iva", "unit_gross", "subtotal_net", "subtotal_iva", "subtotal_gross")
+
+ITEM_COLUMNS = [
+    ("invoice_key", "str"),
+    ("item_n", "int"),
+    ("codigo", "str"),
+    ("descripcion", "str"),
+    ("cantidad", "float"),
+    ("unidad_medida", "str"),
+    ("unidad_medida_codigo", "int"),
+    ("precio_modo", "str"),
+    ("precio_unitario", "float"),
+    ("descuento_bonificacion", "str"),
+] + [(f, "float") for f in AMOUNT_FIELDS]
+
+TABLES = {"facturas": INVOICE_COLUMNS, "items": ITEM_COLUMNS}
+
+
+# -----------------------------
+# ROWS
+# -----------------------------
+def invoice_rows(name: str, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Fila de cabecera y filas de items de una factura."""
+    key = invoice_key(payload)
+    emisor = payload.get("emisor") or {}
+    receptor = payload.get("receptor") or {}
+    fact = payload.get("datos_facturacion") or {}
+    tot = payload.get("totales") or {}
+
+    header = {
+        "invoice_key": key,
+        "archivo": name,
+        "created_at": (payload.get("meta") or {}).get("created_at"),
+        "tipo_factura": fact.get("tipo_factura") or tot.get("tipo_factura"),
+        "tipo_factura_codigo": fact.get("tipo_factura_codigo"),
+        "servicio_producto": fact.get("servicio_producto"),
+        "fecha_inicio": fact.get("fecha_inicio"),
+        "fecha_fin": fact.get("fecha_fin"),
+        "fecha_vencimiento": fact.get("fecha_vencimiento"),
+        "emisor_cuit": emisor.get("cuit"),
+        "emisor_razon_social": emisor.get("razon_social"),
+        "emisor_condicion_iva": emisor.get("condicion_iva"),
+        "receptor_cuit_dni": receptor.get("cuit_dni"),
+        "receptor_razon_social": receptor.get("razon_social"),
+        "receptor_condicion_iva": receptor.get("condicion_iva"),
+        "condicion_venta": receptor.get("condicion_venta"),
+        "moneda": tot.get("moneda") or "ARS",
+        "cotizacion": tot.get("cotizacion", 1.0),
+        "total_neto": tot.get("total_neto"),
+        "total_iva_21": tot.get("total_iva_21"),
+        "total": tot.get("total"),
+        "total_ars": tot.get("total_ars", tot.get("total")),
+    }
+
+    calc = tot.get("items_calculados") or []
+    items = []
+    for i, it in enumerate(payload.get("items") or []):
+        am = calc[i] if i < len(calc) and isinstance(calc[i], dict) else {}
+        items.append(
+            {
+                "invoice_key": key,
+                "item_n": i + 1,
+                "codigo": it.get("codigo"),
+                "descripcion": it.get("descripcion"),
+                "cantidad": it.get("cantidad"),
+                "unidad_medida": it.get("unidad_medida"),
+                "unidad_medida_codigo": it.get("unidad_medida_codigo"),
+                "precio_modo": it.get("precio_modo"),
+                "precio_unitario": it.get("precio_unitario"),
+                "descuento_bonificacion": it.get("descuento_bonificacion"),
+                **{k: am.get(k) for k in AMOUNT_FIELDS},
+            }
+        )
+    return header, items
+
+
+def make_filter(
+    desde: Optional[str] = None, hasta: Optional[str] = None, cuit: Optional[str] = None
+) -> Callable[[Dict[str, Any]], bool]:
+    """Filtro por fecha de creación (AAAA-MM-DD, inclusive) y CUIT de emisor o receptor."""
+
+    def accept(payload: Dict[str, Any]) -> bool:
+        created = str((payload.get("meta") or {}).get("created_at") or "")[:10]
+        if desde and created < desde:
+            return False
+        if hasta and created > hasta:
+            return False
+        if cuit:
+            cuits = ((payload.get("emisor") or {}).get("cuit"), (payload.get("receptor") or {}).get("cuit_dni"))
+            if cuit not in cuits:
+                return False
+        return True
+
+    return accept
+
+
+# -----------------------------
+# WRITERS
+# -----------------------------
+class CsvTableWriter:
+    def __init__(self, path: Path, columns: List[Tuple[str, str]]):
+        self.path = path
+        self._f = open(path, "w", newline="", encoding="utf-8")
+        self._w = csv.DictWriter(self._f, fieldnames=[c for c, _ in columns], extrasaction="ignore")
+        self._w.writeheader()
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self._w.writerows(rows)
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class ParquetTableWriter:
+    def __init__(self, path: Path, columns: List[Tuple[str, str]]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Para exportar a Parquet hay que instalar pyarrow.") from e
+
+        types = {"str": pa.string(), "int": pa.int64(), "float": pa.float64()}
+        self.path = path
+        self._pa = pa
+        self._columns = columns
+        self._schema = pa.schema([(c, types[t]) for c, t in columns])
+        self._w = pq.ParquetWriter(str(path), self._schema, compression="zstd")
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        arrays = {c: [_coerce(r.get(c), t) for r in rows] for c, t in self._columns}
+        self._w.write_table(self._pa.Table.from_pydict(arrays, schema=self._schema))
+
+    def close(self) -> None:
+        self._w.close()
+
+
+def _coerce(value: Any, kind: str) -> Any:
+    if value is None or value == "":
+        return None
+    try:
+        if kind == "float":
+            return float(value)
+        if kind == "int":
+            return int(value)
+    except (TypeError, ValueError):
+        return None
+    return str(value)
+
+
+WRITERS = {"csv": CsvTableWriter, "parquet": ParquetTableWriter}
+
+
+# -----------------------------
+# EXPORT
+# -----------------------------
+def _load_state(out_dir: Path) -> Dict[str, Any]:
+    try:
+        return json.loads((out_dir / STATE_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(out_dir: Path, state: Dict[str, Any]) -> None:
+    tmp = out_dir / (STATE_FILE + ".tmp")
+    tmp.write_text(json.dumps(state), encoding="utf-8")
+    os.replace(tmp, out_dir / STATE_FILE)
+
+
+def _name_stamp(name: str) -> Optional[datetime]:
+    """Sello de tiempo de `invoice_AAAAmmdd_HHMMSS_...json` (None si el nombre no lo tiene)."""
+    raw = name[len(INVOICE_PREFIX) : len(INVOICE_PREFIX) + 15]
+    try:
+        return datetime.strptime(raw, STAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def _filter_key(desde: Optional[str], hasta: Optional[str], cuit: Optional[str]) -> str:
+    return json.dumps([desde or "", hasta or "", cuit or ""])
+
+
+UNFILTERED = _filter_key(None, None, None)
+
+
+def _filter_state(state: Dict[str, Any], key: str) -> Dict[str, Any]:
+    if "filtros" in state:
+        return state["filtros"].get(key) or {}
+    # estado de versiones anteriores (una sola marca): vale solo para la exportación sin filtros
+    return state if key == UNFILTERED else {}
+
+
+class _ExportWindow:
+    """
+    Facturas de la ventana de solapamiento ya recorridas. Solo guarda las de
+    los últimos EXPORT_OVERLAP_S segundos (respecto del sello más nuevo
+    visto), así que la memoria no depende del tamaño del archivo.
+    """
+
+    def __init__(self, state: Dict[str, Any]):
+        self.names = set(state.get("vistos") or [])
+        stamps = [t for t in map(_name_stamp, self.names) if t is not None]
+        self.newest: Optional[datetime] = max(stamps) if stamps else None
+        self._limit = max(1024, 2 * len(self.names))
+        if "desde" in state:
+            self.after: Optional[str] = f"{INVOICE_PREFIX}{state['desde']}"
+        else:
+            # estado de versiones anteriores: el último nombre exportado
+            self.after = state.get("last_name")
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.names
+
+    def add(self, name: str) -> None:
+        stamp = _name_stamp(name)
+        if stamp is None:
+            return
+        if self.newest is None or stamp > self.newest:
+            self.newest = stamp
+        if stamp >= self.newest - timedelta(seconds=EXPORT_OVERLAP_S):
+            self.names.add(name)
+        if len(self.names) > self._limit:
+            self._prune()
+            self._limit = max(1024, 2 * len(self.names))
+
+    def _prune(self) -> None:
+        cutoff = self.newest - timedelta(seconds=EXPORT_OVERLAP_S)
+        self.names = {n for n in self.names if _name_stamp(n) >= cutoff}
+
+    def state(self, stamp: str) -> Dict[str, Any]:
+        """Estado para la próxima corrida ({} si todavía no se vio ninguna factura)."""
+        if self.newest is None:
+            return {}
+        self._prune()
+        desde = self.newest - timedelta(seconds=EXPORT_OVERLAP_S)
+        return {"desde": desde.strftime(STAMP_FORMAT), "vistos": sorted(self.names), "exported_at": stamp}
+
+
+def _discard(writers: Dict[Tuple[str, str], Any]) -> None:
+    """Cierra los writers y borra sus archivos: una exportación fallida no deja archivos a medias."""
+    for w in writers.values():
+        try:
+            w.close()
+        except Exception:
+            pass
+        try:
+            os.remove(w.path)
+        except OSError:
+            pass
+
+
+def export_archive(
+    out_dir: str,
+    formats: Iterable[str] = ("csv",),
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    cuit: Optional[str] = None,
+    incremental: bool = False,
+    folder: str = DATA_DIR,
+    chunk: int = EXPORT_CHUNK,
+    invoices: Optional[Iterator[Tuple[str, Dict[str, Any]]]] = None,
+) -> Dict[str, Any]:
+    """
+    Exporta las facturas a `out_dir` y devuelve un resumen con los archivos
+    generados y la cantidad de facturas/items exportados.
+    """
+    formats = [f.strip() for f in formats if f.strip()]
+    unknown = [f for f in formats if f not in WRITERS]
+    if unknown:
+        raise ValueError(f"Formato no soportado: {', '.join(unknown)}")
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    key = _filter_key(desde, hasta, cuit)
+    state = _load_state(out) if incremental else {}
+    # solo las corridas incrementales recuerdan nombres (y solo los de la ventana)
+    window = _ExportWindow(_filter_state(state, key)) if incremental else None
+    if invoices is None:
+        invoices = iter_invoices(folder, after=window.after if window else None)
+
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    writers: Dict[Tuple[str, str], Any] = {}
+    try:
+        for table, columns in TABLES.items():
+            for fmt in formats:
+                writers[(table, fmt)] = WRITERS[fmt](out / f"{table}_{stamp}.{fmt}", columns)
+    except Exception:
+        _discard(writers)
+        raise
+
+    accept = make_filter(desde, hasta, cuit)
+    headers: List[Dict[str, Any]] = []
+    items: List[Dict[str, Any]] = []
+    n_invoices = n_items = 0
+
+    def flush() -> None:
+        for (table, _), w in writers.items():
+            w.write(headers if table == "facturas" else items)
+        headers.clear()
+        items.clear()
+
+    try:
+        for name, payload in invoices:
+            if window is not None:
+                if name in window:
+                    continue
+                window.add(name)
+            if not accept(payload):
+                continue
+            header, item_rows = invoice_rows(name, payload)
+            headers.append(header)
+            items.extend(item_rows)
+            n_invoices += 1
+            n_items += len(item_rows)
+            if len(headers) >= chunk:
+                flush()
+        flush()
+    except BaseException:
+        _discard(writers)
+        raise
+    for w in writers.values():
+        w.close()
+
+    if window is not None:
+        new_state = window.state(stamp)
+        if new_state:
+            filtros = dict(state.get("filtros") or {})
+            if "filtros" not in state and state:
+                filtros[UNFILTERED] = state
+            filtros[key] = new_state
+            _save_state(out, {"filtros": filtros})
+
+    return {
+        "facturas": n_invoices,
+        "items": n_items,
+        "archivos": [str(w.path) for w in writers.values()],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Exporta facturas e items a CSV/Parquet.")
+    parser.add_argument("--out", default="exports")
+    parser.add_argument("--formato", default="csv", help="csv, parquet o csv,parquet")
+    parser.add_argument("--desde", help="AAAA-MM-DD")
+    parser.add_argument("--hasta", help="AAAA-MM-DD")
+    parser.add_argument("--cuit", help="CUIT del emisor o CUIT/DNI del receptor")
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--data", default=DATA_DIR)
+    args = parser.parse_args(argv)
+
+    summary = export_archive(
+        args.out,
+        formats=args.formato.split(","),
+        desde=args.desde,
+        hasta=args.hasta,
+        cuit=args.cuit,
+        incremental=args.incremental,
+        folder=args.data,
+    )
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+# fx.py
+"""
+Cotizaciones para facturar en moneda extranjera.
+
+`FX_URL` puede ser:
+  - una URL http(s) de un servicio que responda
+        GET <url>?moneda=USD  -> {"moneda": "USD", "cotizacion": 1050.5}
+  - la ruta de un JSON local `{"USD": 1050.5, "EUR": 1130.0}` (stand-in para
+    pruebas/desarrollo). Pasa por la misma cache que el servicio: un cambio
+    en el archivo se ve recién al vencer FX_CACHE_TTL_S (para editarlo con
+    la app en marcha, bajar ese valor, p. ej. FX_CACHE_TTL_S=0).
+
+La cotización es en pesos por unidad de moneda. Las consultas pasan por el
+TTLCache del cliente. La app usa un solo cliente por proceso, compartido por
+todas las sesiones y por las corridas de `recurring.run_due` que lanza (se
+le pasa como `fx`): mientras no venza, todas usan el mismo valor, y si
+varias lo piden a la vez se hace un solo request al proveedor. Una corrida
+por consola (`python recurring.py run`) crea su propio cliente.
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Optional
+
+from cache import TTLCache
+
+FX_URL = os.environ.get("FX_URL", "")
+FX_TIMEOUT_S = float(os.environ.get("FX_TIMEOUT_S", "5"))
+FX_CACHE_TTL_S = float(os.environ.get("FX_CACHE_TTL_S", "3600"))
+
+BASE_CURRENCY = "ARS"
+
+
+class FxError(Exception):
+    pass
+
+
+def _parse_rate(moneda: str, value: Any) -> float:
+    if isinstance(value, dict):
+        value = value.get("cotizacion", value.get("rate"))
+    try:
+        rate = float(value)
+    except (TypeError, ValueError):
+        raise FxError(f"Cotización inválida para {moneda}: {value!r}")
+    if rate <= 0:
+        raise FxError(f"Cotización inválida para {moneda}: {rate}")
+    return rate
+
+
+class FileFxSource:
+    def __init__(self, path: str):
+        self.path = path
+
+    def fetch(self, moneda: str) -> float:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise FxError(f"No se pudo leer el archivo de cotizaciones: {e}") from e
+        if moneda not in data:
+            raise FxError(f"No hay cotización para {moneda}.")
+        return _parse_rate(moneda, data[moneda])
+
+
+class HttpFxSource:
+    def __init__(self, url: str, timeout: float = FX_TIMEOUT_S):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self, moneda: str) -> float:
+        import requests
+
+        try:
+            r = requests.get(self.url, params={"moneda": moneda}, timeout=self.timeout)
+            r.raise_for_status()
+            body = r.json()
+        except (requests.RequestException, ValueError) as e:
+            raise FxError(f"No se pudo consultar la cotización de {moneda}: {e}") from e
+        return _parse_rate(moneda, body)
+
+
+class FxClient:
+    def __init__(self, source, cache: Optional[TTLCache] = None):
+        self.source = source
+        self.cache = cache or TTLCache(maxsize=64, ttl=FX_CACHE_TTL_S)
+
+    def rate(self, moneda: str) -> float:
+        """Pesos por unidad de `moneda` (1.0 para ARS). Lanza FxError si no se puede obtener."""
+        if moneda == BASE_CURRENCY:
+            return 1.0
+        return self.cache.get_or_load(moneda, lambda: self.source.fetch(moneda))
+
+
+def fx_from_url(url: str = FX_URL) -> Optional[FxClient]:
+    """Cliente para `url`, o None si no hay proveedor configurado."""
+    if not url:
+        return None
+    if url.startswith(("http://", "https://")):
+        return FxClient(HttpFxSource(url))
+    return FxClient(FileFxSource(url[len("file://") :] if url.startswith("file://") else url))
+
+
+def get_rate(moneda: str, client: Optional[FxClient]) -> float:
+    """Como `FxClient.rate`, pero con un mensaje claro si no hay proveedor configurado."""
+    if moneda == BASE_CURRENCY:
+        return 1.0
+    if client is None:
+        raise FxError("No hay proveedor de cotizaciones configurado (FX_URL).")
+    return client.rate(moneda)
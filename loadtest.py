@@ -0,0 +1,248 @@
+# loadtest.py
+"""
+Prueba de carga del flujo edición -> revisión -> confirmación.
+
+Simula N operadores en paralelo con el API de testing de Streamlit
+(`streamlit.testing.v1.AppTest`), en el mismo proceso, compartiendo caches
+y recursos como en un servidor real. El envío va contra un webhook mock
+local (no toca n8n) y todo lo que la app escribe queda en un directorio
+temporal.
+
+Para cada nivel de concurrencia registra latencia por rerun (p50/p95/máx),
+flujos completos por segundo, CPU del proceso y memoria (RSS), y al final
+imprime un reporte de capacidad.
+
+Uso:
+    python loadtest.py [--sesiones 1,2,4,8,16] [--flujos 3] [--demora-webhook 0.2] [--json reporte.json]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List
+
+HERE = Path(__file__).resolve().parent
+APP_PATH = str(HERE / "app.py")
+
+# los módulos de la app se importan desde el repo aunque se corra desde otro directorio
+sys.path.insert(0, str(HERE))
+
+# Datos de una factura válida
+FORM = {
+    "text_input": {
+        "em_rs": "Emisor Carga SA",
+        "em_cuit": "20123456786",
+        "rec_rs": "Receptor Carga",
+        "rec_cuit": "30111222",
+    },
+    "selectbox": {
+        "tipo_factura": "Factura C",
+        "em_iva": "Responsable Monotributo",
+        "rec_iva": "Consumidor Final",
+        "rec_cv": "Contado",
+        "sp": "Servicio",
+    },
+}
+
+
+# -----------------------------
+# MOCK WEBHOOK
+# -----------------------------
+def start_mock_webhook(delay_s: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("content-length") or 0))
+            time.sleep(delay_s)
+            body = json.dumps(
+                {"message": "Factura emitida (mock)", "CAE": "74123456789012", "CAEFchVto": "20261231", "Resultado": "A"}
+            ).encode("utf-8")
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# -----------------------------
+# METRICS
+# -----------------------------
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+# -----------------------------
+# SESSION
+# -----------------------------
+def _timed_run(at, latencies: List[float]) -> None:
+    t0 = time.perf_counter()
+    at.run()
+    latencies.append(time.perf_counter() - t0)
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+
+def _click(at, label: str, latencies: List[float]) -> None:
+    next(b for b in at.button if b.label == label).click()
+    _timed_run(at, latencies)
+
+
+def run_flow(latencies: List[float]) -> bool:
+    """Un operador completo: carga el formulario, revisa, confirma y envía."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    _timed_run(at, latencies)
+
+    for key, value in FORM["selectbox"].items():
+        at.selectbox(key=key).select(value)
+    for key, value in FORM["text_input"].items():
+        at.text_input(key=key).input(value)
+    next(t for t in at.text_input if str(t.key).endswith("_desc")).input("Servicio de prueba de carga")
+    next(n for n in at.number_input if str(n.key).endswith("_pu")).set_value(1500.0)
+    _timed_run(at, latencies)
+
+    _click(at, "Finalizar", latencies)
+    if at.session_state["step"] != "review":
+        return False
+    _click(at, "Confirmar Datos a Facturar", latencies)
+    _click(at, "Enviar Datos", latencies)
+    result = at.session_state["last_webhook_result"]
+    return bool(result and result.get("ok"))
+
+
+def run_level(sessions: int, flows_per_session: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    lock = threading.Lock()
+    outcome = {"ok": 0, "fallidos": 0}
+    # "Tipo: mensaje" -> cantidad de flujos que terminaron con esa excepción
+    errors: Dict[str, int] = {}
+
+    def operator(_: int) -> None:
+        for _ in range(flows_per_session):
+            mine: List[float] = []
+            error = None
+            try:
+                ok = run_flow(mine)
+            except Exception as e:
+                ok = False
+                error = f"{type(e).__name__}: {e}"
+            with lock:
+                latencies.extend(mine)
+                outcome["ok" if ok else "fallidos"] += 1
+                if error:
+                    errors[error] = errors.get(error, 0) + 1
+
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(operator, range(sessions)))
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - wall0
+
+    return {
+        "sesiones": sessions,
+        "flujos_ok": outcome["ok"],
+        "flujos_fallidos": outcome["fallidos"],
+        "reruns": len(latencies),
+        "rerun_p50_ms": percentile(latencies, 0.50) * 1000,
+        "rerun_p95_ms": percentile(latencies, 0.95) * 1000,
+        "rerun_max_ms": max(latencies, default=0.0) * 1000,
+        "rerun_media_ms": (statistics.mean(latencies) if latencies else 0.0) * 1000,
+        "flujos_por_s": outcome["ok"] / wall if wall else 0.0,
+        "cpu_pct": 100.0 * cpu / wall if wall else 0.0,
+        "rss_mb": rss_mb(),
+        "duracion_s": wall,
+        "errores": errors,
+    }
+
+
+def print_report(levels: List[Dict[str, Any]]) -> None:
+    print()
+    print("| sesiones | ok/fallidos | p50 ms | p95 ms | máx ms | flujos/s | CPU % | RSS MB |")
+    print("|---:|---:|---:|---:|---:|---:|---:|---:|")
+    for r in levels:
+        print(
+            f"| {r['sesiones']} | {r['flujos_ok']}/{r['flujos_fallidos']} | {r['rerun_p50_ms']:.0f} "
+            f"| {r['rerun_p95_ms']:.0f} | {r['rerun_max_ms']:.0f} | {r['flujos_por_s']:.2f} "
+            f"| {r['cpu_pct']:.0f} | {r['rss_mb']:.0f} |"
+        )
+
+    if any(r["errores"] for r in levels):
+        print()
+        print("Excepciones:")
+        for r in levels:
+            for error, count in sorted(r["errores"].items(), key=lambda e: -e[1]):
+                print(f"  {r['sesiones']} sesiones, {count} flujo(s): {error}")
+
+    # capacidad: mayor concurrencia sin fallos y con p95 dentro del objetivo
+    target_ms = float(os.environ.get("LOADTEST_P95_TARGET_MS", "1000"))
+    fits = [r for r in levels if r["flujos_fallidos"] == 0 and r["rerun_p95_ms"] <= target_ms]
+    print()
+    if fits:
+        best = max(fits, key=lambda r: r["sesiones"])
+        print(f"Capacidad estimada: {best['sesiones']} sesiones simultáneas con p95 <= {target_ms:.0f} ms por rerun.")
+    else:
+        print(f"Ningún nivel cumplió p95 <= {target_ms:.0f} ms sin fallos.")
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sesiones", default="1,2,4,8,16")
+    parser.add_argument("--flujos", type=int, default=3, help="flujos completos por sesión")
+    parser.add_argument("--demora-webhook", type=float, default=0.2, help="segundos de respuesta del mock")
+    parser.add_argument("--json", help="guardar el reporte en este archivo")
+    args = parser.parse_args(argv)
+
+    report_path = Path(args.json).resolve() if args.json else None
+    server = start_mock_webhook(args.demora_webhook)
+    workdir = tempfile.mkdtemp(prefix="loadtest_")
+    # la app guarda en rutas relativas (data/...): todo queda en el temporal
+    os.chdir(workdir)
+    os.environ["WEBHOOK_URL"] = f"http://127.0.0.1:{server.server_port}/webhook"
+    for var in ("DRAFT_STORE_PATH", "RECONCILIATION_DB_PATH", "ANALYTICS_DB_PATH", "TEMPLATES_DB_PATH"):
+        os.environ.pop(var, None)
+
+    levels = []
+    for n in (int(x) for x in args.sesiones.split(",") if x.strip()):
+        result = run_level(n, args.flujos)
+        levels.append(result)
+        print(f"{n} sesiones: p95 {result['rerun_p95_ms']:.0f} ms, {result['flujos_por_s']:.2f} flujos/s", flush=True)
+
+    server.shutdown()
+    print_report(levels)
+    print(f"\nArchivos generados en: {workdir}")
+    if report_path:
+        report_path.write_text(json.dumps(levels, indent=2), encoding="utf-8")
+    return 0 if all(r["flujos_fallidos"] == 0 for r in levels) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
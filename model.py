@@ -0,0 +1,119 @@
+# model.py
+"""
+Modelo tipado de items e importes.
+
+Los items viven en la sesión como objetos `Item` (con `__slots__`: sin dict
+por instancia) y así los usan la validación, el cálculo y el armado del
+payload. Recién se pasan a dict en los bordes: el payload que se guarda o
+se envía (`to_payload`), el borrador (`to_dict`) y `items_calculados`.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+from catalogs import UNIDAD_MEDIDA
+from utils import parse_decimal_optional
+
+
+def _float(value: Any, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class Item:
+    __slots__ = (
+        "uid",
+        "codigo",
+        "descripcion",
+        "cantidad",
+        "unidad_medida",
+        "precio_modo",
+        "precio_unitario",
+        "descuento_bonificacion",
+    )
+
+    def __init__(
+        self,
+        uid: Optional[str] = None,
+        codigo: str = "",
+        descripcion: str = "",
+        cantidad: float = 1.0,
+        unidad_medida: str = "Unidad",
+        precio_modo: str = "con_iva",  # "con_iva" | "sin_iva"
+        precio_unitario: float = 0.0,
+        descuento_bonificacion: str = "",  # tal como se ingresó (coma o punto)
+    ):
+        self.uid = uid or str(uuid4())
+        self.codigo = codigo
+        self.descripcion = descripcion
+        self.cantidad = cantidad
+        self.unidad_medida = unidad_medida
+        self.precio_modo = precio_modo
+        self.precio_unitario = precio_unitario
+        self.descuento_bonificacion = descuento_bonificacion
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "Item":
+        """Item a partir de un dict de borrador, plantilla o payload (ignora los `*_codigo`)."""
+        return cls(
+            uid=d.get("uid") or None,
+            codigo=str(d.get("codigo") or ""),
+            descripcion=str(d.get("descripcion") or ""),
+            cantidad=_float(d.get("cantidad", 1.0)),
+            unidad_medida=d.get("unidad_medida") or "Unidad",
+            precio_modo=d.get("precio_modo") or "con_iva",
+            precio_unitario=_float(d.get("precio_unitario", 0.0)),
+            descuento_bonificacion=str(d.get("descuento_bonificacion") or ""),
+        )
+
+    def descuento(self) -> float:
+        """Descuento como monto. Lanza ValueError si no es un número válido."""
+        d = parse_decimal_optional(self.descuento_bonificacion)
+        return 0.0 if d is None else float(d)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in Item.__slots__}
+
+    def to_payload(self) -> Dict[str, Any]:
+        """Item del payload: descuento normalizado (o None) y código AFIP de la unidad."""
+        d = self.to_dict()
+        raw = self.descuento_bonificacion.strip()
+        d["descuento_bonificacion"] = str(parse_decimal_optional(raw)) if raw else None
+        d["unidad_medida_codigo"] = UNIDAD_MEDIDA.code(self.unidad_medida)
+        return d
+
+    def __repr__(self) -> str:
+        return f"Item({self.to_dict()!r})"
+
+
+class Amounts:
+    """Importes calculados de un item (unitarios y subtotales: neto, IVA, total)."""
+
+    __slots__ = ("unit_net", "unit_iva", "unit_gross", "subtotal_net", "subtotal_iva", "subtotal_gross")
+
+    def __init__(
+        self,
+        unit_net: float,
+        unit_iva: float,
+        unit_gross: float,
+        subtotal_net: float,
+        subtotal_iva: float,
+        subtotal_gross: float,
+    ):
+        self.unit_net = unit_net
+        self.unit_iva = unit_iva
+        self.unit_gross = unit_gross
+        self.subtotal_net = subtotal_net
+        self.subtotal_iva = subtotal_iva
+        self.subtotal_gross = subtotal_gross
+
+    def to_dict(self) -> Dict[str, float]:
+        return {name: getattr(self, name) for name in Amounts.__slots__}
+
+
+def amounts_to_dicts(per_item: List[Optional[Amounts]]) -> List[Dict[str, float]]:
+    """`items_calculados` del payload: un dict por item (vacío si no se pudo calcular)."""
+    return [a.to_dict() if a is not None else {} for a in per_item]
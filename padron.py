@@ -0,0 +1,146 @@
+# padron.py
+"""
+Consulta de contribuyentes en un servicio de padrón, para completar razón
+social y condición frente al IVA a partir del CUIT.
+
+`PADRON_URL` puede ser:
+  - una URL http(s) de un servicio que responda
+        GET  <url>?cuit=20123456786        -> {"razon_social": ..., "condicion_iva": ...} | 404
+        POST <url>  {"cuits": [...]}        -> {"20123456786": {...} | null, ...}
+  - la ruta de un JSON local `{cuit: {...}}` (stand-in para pruebas/desarrollo).
+
+`condicion_iva` puede venir como label o como código AFIP. Los resultados
+(también los "no encontrado") quedan en un TTLCache compartido por todas
+las sesiones del proceso.
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from cache import TTLCache
+from catalogs import CONDICION_IVA
+from utils import is_valid_cuit
+
+PADRON_URL = os.environ.get("PADRON_URL", "")
+PADRON_TIMEOUT_S = float(os.environ.get("PADRON_TIMEOUT_S", "5"))
+PADRON_CACHE_TTL_S = float(os.environ.get("PADRON_CACHE_TTL_S", str(24 * 3600)))
+PADRON_CACHE_SIZE = int(os.environ.get("PADRON_CACHE_SIZE", "20000"))
+
+# Cuántos CUITs se piden por request en las consultas masivas
+PADRON_BATCH_SIZE = 200
+
+
+class PadronError(Exception):
+    pass
+
+
+def _normalize(cuit: str, record: Any) -> Optional[Dict[str, Any]]:
+    if not isinstance(record, dict):
+        return None
+    cond = record.get("condicion_iva")
+    if isinstance(cond, int) or (isinstance(cond, str) and cond.isdigit()):
+        cond = CONDICION_IVA.label_for_code(int(cond))
+    return {
+        "cuit": cuit,
+        "razon_social": str(record.get("razon_social") or "").strip(),
+        "condicion_iva": cond if cond in CONDICION_IVA else None,
+    }
+
+
+class FilePadronSource:
+    """
+    Padrón local: un JSON `{cuit: registro}` leído en la primera consulta.
+    Si falta o es inválido, la consulta lanza PadronError (y se reintenta
+    la lectura en la siguiente).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._data: Optional[Dict[str, Any]] = None
+
+    def _load(self) -> Dict[str, Any]:
+        if self._data is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                raise PadronError(f"No se pudo leer el archivo de padrón: {e}") from e
+            if not isinstance(data, dict):
+                raise PadronError("El archivo de padrón debe ser un JSON {cuit: datos}.")
+            self._data = data
+        return self._data
+
+    def fetch(self, cuits: List[str]) -> Dict[str, Any]:
+        data = self._load()
+        return {c: data.get(c) for c in cuits}
+
+
+class HttpPadronSource:
+    def __init__(self, url: str, timeout: float = PADRON_TIMEOUT_S):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self, cuits: List[str]) -> Dict[str, Any]:
+        import requests
+
+        try:
+            if len(cuits) == 1:
+                r = requests.get(self.url, params={"cuit": cuits[0]}, timeout=self.timeout)
+                if r.status_code == 404:
+                    return {cuits[0]: None}
+                r.raise_for_status()
+                return {cuits[0]: r.json()}
+            r = requests.post(self.url, json={"cuits": cuits}, timeout=self.timeout)
+            r.raise_for_status()
+            body = r.json()
+        except (requests.RequestException, ValueError) as e:
+            raise PadronError(f"No se pudo consultar el padrón: {e}") from e
+        return {c: body.get(c) for c in cuits}
+
+
+class PadronClient:
+    def __init__(self, source, cache: Optional[TTLCache] = None):
+        self.source = source
+        self.cache = cache or TTLCache(maxsize=PADRON_CACHE_SIZE, ttl=PADRON_CACHE_TTL_S)
+
+    def lookup(self, cuit: str) -> Optional[Dict[str, Any]]:
+        """Datos del contribuyente o None si no existe. Lanza PadronError si el servicio falla."""
+        return self.lookup_many([cuit]).get(cuit)
+
+    def lookup_many(self, cuits: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Consulta varios CUITs: primero el cache, y los que falten en requests
+        de hasta PADRON_BATCH_SIZE. Los CUITs con dígito verificador inválido
+        se resuelven como None sin consultar.
+        """
+        out: Dict[str, Optional[Dict[str, Any]]] = {}
+        missing: List[str] = []
+        for cuit in dict.fromkeys(cuits):
+            if not is_valid_cuit(cuit):
+                out[cuit] = None
+                continue
+            hit, value = self.cache.get(cuit)
+            if hit:
+                out[cuit] = value
+            else:
+                missing.append(cuit)
+
+        for i in range(0, len(missing), PADRON_BATCH_SIZE):
+            chunk = missing[i : i + PADRON_BATCH_SIZE]
+            fetched = self.source.fetch(chunk)
+            for cuit in chunk:
+                record = _normalize(cuit, fetched.get(cuit))
+                self.cache.set(cuit, record)
+                out[cuit] = record
+        return out
+
+
+def padron_from_url(url: str = PADRON_URL) -> Optional[PadronClient]:
+    """Cliente para `url`, o None si no hay padrón configurado."""
+    if not url:
+        return None
+    if url.startswith(("http://", "https://")):
+        return PadronClient(HttpPadronSource(url))
+    return PadronClient(FilePadronSource(url[len("file://") :] if url.startswith("file://") else url))
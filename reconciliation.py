@@ -0,0 +1,232 @@
+# reconciliation.py
+"""
+Índice de conciliación: vincula cada factura guardada con la respuesta de
+n8n/AFIP (CAE, vencimiento del CAE, número de comprobante y estado).
+
+Estados:
+  - saved:    guardada localmente, todavía sin respuesta del workflow
+  - sent:     el workflow respondió OK pero sin CAE
+  - approved: con CAE
+  - failed:   error de red, HTTP o comprobante rechazado
+
+Uso por consola:
+    python reconciliation.py pendientes   # enviadas sin CAE
+    python reconciliation.py fallidas
+    python reconciliation.py backfill     # indexa las facturas ya guardadas en data/
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from archive import DATA_DIR, iter_invoices
+from utils import connect_sqlite, invoice_key
+from webhook import load_spooled_body
+
+RECONCILIATION_DB_PATH = os.environ.get("RECONCILIATION_DB_PATH", "data/reconciliation.db")
+
+SAVED = "saved"
+SENT = "sent"
+APPROVED = "approved"
+FAILED = "failed"
+
+# Nombres de campo aceptados en la respuesta (normalizados: minúsculas, sin "_")
+_CAE_KEYS = ("cae",)
+_CAE_VTO_KEYS = ("caevencimiento", "caevto", "caefchvto", "vencimientocae", "fechavencimientocae")
+_NUMERO_KEYS = ("numero", "numerocomprobante", "nrocomprobante", "cbtenro", "cbtedesde", "vouchernumber")
+_RESULTADO_KEYS = ("resultado", "result")
+
+_KEY_RE = re.compile(r"[^a-z0-9]")
+
+
+def _norm(key: str) -> str:
+    return _KEY_RE.sub("", str(key).lower())
+
+
+def _find(body: Any, keys: Iterable[str], depth: int = 0) -> Any:
+    """Busca el primer valor no vacío de alguna de `keys` en un JSON anidado."""
+    if depth > 6:
+        return None
+    if isinstance(body, dict):
+        for k, v in body.items():
+            if _norm(k) in keys and v not in (None, "", []) and not isinstance(v, (dict, list)):
+                return v
+        children = body.values()
+    elif isinstance(body, list):
+        children = body
+    else:
+        return None
+    for child in children:
+        found = _find(child, keys, depth + 1)
+        if found is not None:
+            return found
+    return None
+
+
+def parse_webhook_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extrae CAE, vencimiento, número y estado de un resultado de `send_to_webhook`.
+    Las respuestas grandes que quedaron en disco se leen de ahí.
+    """
+    body = load_spooled_body(result.get("response"))
+    cae = _find(body, _CAE_KEYS)
+    resultado = str(_find(body, _RESULTADO_KEYS) or "").strip().upper()
+
+    if not result.get("ok") or resultado in ("R", "RECHAZADO", "ERROR"):
+        status = FAILED
+    elif cae:
+        status = APPROVED
+    else:
+        status = SENT
+
+    numero = _find(body, _NUMERO_KEYS)
+    cae_vto = _find(body, _CAE_VTO_KEYS)
+    return {
+        "status": status,
+        "status_code": result.get("status_code"),
+        "cae": str(cae) if cae else None,
+        "cae_vto": str(cae_vto) if cae_vto else None,
+        "numero": str(numero) if numero is not None else None,
+    }
+
+
+class ReconciliationIndex:
+    def __init__(self, path: str = RECONCILIATION_DB_PATH):
+        self._conn = connect_sqlite(path)
+        self._conn.row_factory = _dict_row
+        self._lock = threading.Lock()
+        with self._conn:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS invoices (
+                    invoice_key   TEXT PRIMARY KEY,
+                    path          TEXT,
+                    created_at    TEXT,
+                    emisor_cuit   TEXT,
+                    receptor_cuit TEXT,
+                    tipo_factura  TEXT,
+                    total         REAL,
+                    status        TEXT NOT NULL,
+                    status_code   INTEGER,
+                    cae           TEXT,
+                    cae_vto       TEXT,
+                    numero        TEXT,
+                    response      TEXT,
+                    updated_at    REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_invoices_status ON invoices (status, updated_at);
+                CREATE INDEX IF NOT EXISTS idx_invoices_cae ON invoices (cae);
+                """
+            )
+
+    def record_saved(self, payload: Dict[str, Any], path: Optional[str] = None) -> str:
+        """Registra una factura guardada. No pisa el estado si ya tenía respuesta."""
+        key = invoice_key(payload)
+        emisor = payload.get("emisor") or {}
+        receptor = payload.get("receptor") or {}
+        totales = payload.get("totales") or {}
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO invoices (invoice_key, path, created_at, emisor_cuit, receptor_cuit,
+                                      tipo_factura, total, status, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (invoice_key) DO UPDATE SET path = COALESCE(excluded.path, invoices.path)
+                """,
+                (
+                    key,
+                    path,
+                    (payload.get("meta") or {}).get("created_at"),
+                    emisor.get("cuit"),
+                    receptor.get("cuit_dni"),
+                    totales.get("tipo_factura"),
+                    totales.get("total"),
+                    SAVED,
+                    time.time(),
+                ),
+            )
+        return key
+
+    def record_result(self, payload: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+        """Guarda la respuesta del workflow para la factura y devuelve lo extraído."""
+        key = self.record_saved(payload)
+        parsed = parse_webhook_result(result)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                UPDATE invoices
+                SET status = ?, status_code = ?, cae = ?, cae_vto = ?, numero = ?,
+                    response = ?, updated_at = ?
+                WHERE invoice_key = ?
+                """,
+                (
+                    parsed["status"],
+                    parsed["status_code"],
+                    parsed["cae"],
+                    parsed["cae_vto"],
+                    parsed["numero"],
+                    json.dumps(result.get("response"), ensure_ascii=False, default=str),
+                    time.time(),
+                    key,
+                ),
+            )
+        return parsed
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._conn.execute("SELECT * FROM invoices WHERE invoice_key = ?", (key,)).fetchone()
+
+    def by_status(self, status: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        sql = "SELECT * FROM invoices WHERE status = ? ORDER BY updated_at"
+        params: tuple = (status,)
+        if limit:
+            sql += " LIMIT ?"
+            params += (limit,)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def sent_without_cae(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self.by_status(SENT, limit)
+
+    def failed(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self.by_status(FAILED, limit)
+
+    def backfill(self, folder: str = DATA_DIR) -> int:
+        """Indexa (como `saved`) las facturas del archivo que no estén en el índice."""
+        count = 0
+        for name, payload in iter_invoices(folder):
+            self.record_saved(payload, os.path.join(folder, name))
+            count += 1
+        return count
+
+
+def _dict_row(cursor, row) -> Dict[str, Any]:
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+
+def main(argv: List[str]) -> int:
+    cmd = argv[1] if len(argv) > 1 else ""
+    index = ReconciliationIndex()
+    if cmd == "pendientes":
+        rows = index.sent_without_cae()
+    elif cmd == "fallidas":
+        rows = index.failed()
+    elif cmd == "backfill":
+        print(f"{index.backfill()} facturas indexadas")
+        return 0
+    else:
+        print(__doc__)
+        return 2
+    for row in rows:
+        row.pop("response", None)
+        print(json.dumps(row, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
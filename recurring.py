@@ -0,0 +1,377 @@
+# recurring.py
+"""
+Facturas recurrentes: plantillas guardadas a partir de un payload confirmado
+y un scheduler que genera y envía en bloque las que vencen en una fecha.
+
+Una plantilla guarda emisor, receptor, datos de facturación e items, más el
+día del mes en que se emite. Al generarla, las fechas (inicio, fin y
+vencimiento) se corren la cantidad de meses que haya entre la fecha de
+inicio original y la fecha de ejecución.
+
+Uso por consola:
+    python recurring.py run [--fecha AAAA-MM-DD] [--dry-run] [--lotes]
+    python recurring.py list
+"""
+from __future__ import annotations
+
+import argparse
+import calendar
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from analytics import AnalyticsStore
+from archive import DATA_DIR
+from calc import build_totales
+from fx import BASE_CURRENCY, FxClient, FxError, fx_from_url, get_rate
+from model import Item
+from padron import PadronClient, PadronError, padron_from_url
+from reconciliation import ReconciliationIndex
+from utils import build_payload, connect_sqlite, date_to_str, save_json, validate_cuit_dni
+
+TEMPLATES_DB_PATH = os.environ.get("TEMPLATES_DB_PATH", "data/templates.db")
+
+FECHAS = ("fecha_inicio", "fecha_fin", "fecha_vencimiento")
+
+log = logging.getLogger(__name__)
+
+
+# -----------------------------
+# TEMPLATES
+# -----------------------------
+def _strip_codes(section: Dict[str, Any]) -> Dict[str, Any]:
+    # los códigos AFIP los vuelve a calcular build_payload
+    return {k: v for k, v in section.items() if not k.endswith("_codigo")}
+
+
+def template_from_payload(payload: Dict[str, Any], nombre: str, dia: int) -> Dict[str, Any]:
+    """Arma una plantilla a partir de un payload confirmado."""
+    emisor = _strip_codes(payload.get("emisor") or {})
+    # la delegación es por única vez: nunca se guarda la clave fiscal
+    emisor["requiere_delegacion"] = False
+    emisor["clave_fiscal"] = ""
+
+    items = []
+    for it in payload.get("items") or []:
+        it = _strip_codes(it)
+        it["descuento_bonificacion"] = it.get("descuento_bonificacion") or ""
+        items.append(it)
+
+    return {
+        "nombre": nombre,
+        "dia": int(dia),
+        "emisor": emisor,
+        "receptor": _strip_codes(payload.get("receptor") or {}),
+        "facturacion": _strip_codes(payload.get("datos_facturacion") or {}),
+        "items": items,
+    }
+
+
+def _parse_fecha(value: str) -> date:
+    return datetime.strptime(value, "%d/%m/%Y").date()
+
+
+def add_months(d: date, months: int) -> date:
+    """Suma meses; si el día no existe en el mes destino, usa el último día."""
+    total = d.year * 12 + (d.month - 1) + months
+    year, month = divmod(total, 12)
+    month += 1
+    return date(year, month, min(d.day, calendar.monthrange(year, month)[1]))
+
+
+def expand_template(
+    template_id: str, template: Dict[str, Any], run_date: date, fx: Optional[FxClient] = None
+) -> Dict[str, Any]:
+    """
+    Payload listo para enviar de la plantilla, con las fechas corridas al mes
+    de `run_date` y la cotización del día si es en moneda extranjera.
+    """
+    fact = dict(template["facturacion"])
+    moneda = fact.get("moneda") or BASE_CURRENCY
+    base = _parse_fecha(fact["fecha_inicio"])
+    months = (run_date.year - base.year) * 12 + (run_date.month - base.month)
+    for k in FECHAS:
+        fact[k] = date_to_str(add_months(_parse_fecha(fact[k]), months))
+
+    items = [Item.from_dict(dict(it, uid=None)) for it in template["items"]]
+    payload = build_payload(
+        {
+            "emisor": template["emisor"],
+            "receptor": template["receptor"],
+            "facturacion": fact,
+            "items": items,
+        }
+    )
+    payload["meta"]["source"] = "plantilla"
+    payload["meta"]["template_id"] = template_id
+    payload["totales"] = build_totales(items, fact.get("tipo_factura"), moneda=moneda, cotizacion=get_rate(moneda, fx))
+    return payload
+
+
+class TemplateStore:
+    def __init__(self, path: str = TEMPLATES_DB_PATH):
+        self._conn = connect_sqlite(path)
+        self._lock = threading.Lock()
+        with self._conn:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS templates (
+                    template_id TEXT PRIMARY KEY,
+                    nombre      TEXT NOT NULL,
+                    dia         INTEGER NOT NULL,
+                    activo      INTEGER NOT NULL DEFAULT 1,
+                    data        TEXT NOT NULL,
+                    last_run    TEXT,
+                    created_at  REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_templates_dia ON templates (activo, dia);
+                """
+            )
+
+    def save(self, template: Dict[str, Any]) -> str:
+        template_id = str(uuid4())
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO templates (template_id, nombre, dia, data, created_at) VALUES (?, ?, ?, ?, ?)",
+                (template_id, template["nombre"], template["dia"], json.dumps(template, ensure_ascii=False), time.time()),
+            )
+        return template_id
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT template_id, nombre, dia, activo, last_run FROM templates ORDER BY dia, nombre"
+            ).fetchall()
+        return [dict(zip(("template_id", "nombre", "dia", "activo", "last_run"), r)) for r in rows]
+
+    def due(self, run_date: date) -> List[tuple]:
+        """
+        `(template_id, plantilla)` de las plantillas activas a emitir en
+        `run_date` y todavía no emitidas. El último día del mes también
+        emite las plantillas de días que ese mes no tiene (29, 30, 31).
+        """
+        last_day = calendar.monthrange(run_date.year, run_date.month)[1]
+        dias = [run_date.day] if run_date.day < last_day else list(range(run_date.day, 32))
+        marks = ",".join("?" * len(dias))
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT template_id, data FROM templates
+                WHERE activo = 1 AND dia IN ({marks}) AND (last_run IS NULL OR last_run < ?)
+                """,
+                (*dias, run_date.isoformat()),
+            ).fetchall()
+        return [(tid, json.loads(data)) for tid, data in rows]
+
+    def mark_run(self, template_ids: List[str], run_date: date) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE templates SET last_run = ? WHERE template_id = ?",
+                [(run_date.isoformat(), tid) for tid in template_ids],
+            )
+
+    def set_active(self, template_id: str, activo: bool) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE templates SET activo = ? WHERE template_id = ?", (int(activo), template_id))
+
+
+# -----------------------------
+# SCHEDULER
+# -----------------------------
+def _rejected(payload: Dict[str, Any], motivo: str) -> Dict[str, Any]:
+    return {"template_id": (payload.get("meta") or {}).get("template_id"), "motivo": motivo}
+
+
+def check_cuits(
+    payloads: List[Dict[str, Any]], padron: Optional[PadronClient] = None
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Separa los payloads con CUIT/DNI inválido antes de mandarlos a n8n.
+    Si hay padrón configurado, también los CUITs que no figuran (una sola
+    consulta en lotes para todo el bloque). Si el padrón no responde, no se
+    descarta nada por ese motivo.
+
+    Devuelve `(válidos, rechazados)`, con rechazados `{"template_id", "motivo"}`.
+    """
+    valid: List[Dict[str, Any]] = []
+    rejected: List[Dict[str, Any]] = []
+    for p in payloads:
+        ok, msg = validate_cuit_dni(p["emisor"].get("cuit", ""))
+        if not ok:
+            rejected.append(_rejected(p, f"CUIT del emisor: {msg}"))
+            continue
+        ok, msg = validate_cuit_dni(p["receptor"].get("cuit_dni", ""), allow_dni=True)
+        if not ok:
+            rejected.append(_rejected(p, f"CUIT/DNI del receptor: {msg}"))
+            continue
+        valid.append(p)
+
+    padron = padron or padron_from_url()
+    if padron is None or not valid:
+        return valid, rejected
+
+    cuits = [p["emisor"]["cuit"] for p in valid]
+    cuits += [p["receptor"]["cuit_dni"] for p in valid if len(p["receptor"]["cuit_dni"]) == 11]
+    try:
+        found = padron.lookup_many(cuits)
+    except PadronError:
+        return valid, rejected
+
+    checked = []
+    for p in valid:
+        if not found.get(p["emisor"]["cuit"]):
+            rejected.append(_rejected(p, f"El CUIT del emisor {p['emisor']['cuit']} no figura en el padrón."))
+        elif not found.get(p["receptor"]["cuit_dni"], True):
+            rejected.append(_rejected(p, f"El CUIT del receptor {p['receptor']['cuit_dni']} no figura en el padrón."))
+        else:
+            checked.append(p)
+    return checked, rejected
+
+
+def _best_effort(what: str, fn: Callable[[], Any]) -> None:
+    """Registro auxiliar (índice, estadísticas): si falla se loguea, pero la corrida sigue y se envía igual."""
+    try:
+        fn()
+    except Exception:
+        log.warning("No se pudo %s", what, exc_info=True)
+
+
+def run_due(
+    run_date: date,
+    store: Optional[TemplateStore] = None,
+    index: Optional[ReconciliationIndex] = None,
+    analytics: Optional[AnalyticsStore] = None,
+    dry_run: bool = False,
+    batched: bool = False,
+    folder: str = DATA_DIR,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    fx: Optional[FxClient] = None,
+    padron: Optional[PadronClient] = None,
+) -> Dict[str, Any]:
+    """
+    Genera las facturas de las plantillas que vencen en `run_date`, las
+    guarda y las envía en paralelo (dispatcher, o lotes con `batched`).
+    `fx` y `padron` permiten reusar los clientes (y sus caches) de quien
+    llama; si no se pasan, se crean a partir de FX_URL / PADRON_URL.
+    Devuelve un resumen `{"plantillas", "generadas", "enviadas", "ok",
+    "fallidas", "rechazadas"}`; `rechazadas` lista las plantillas que no se
+    pudieron generar o no pasaron el control de CUIT, con el motivo.
+    """
+    store = store or TemplateStore()
+    due = store.due(run_date)
+    progress: Dict[str, Any] = {
+        "plantillas": len(due),
+        "generadas": 0,
+        "enviadas": 0,
+        "ok": 0,
+        "fallidas": 0,
+        "rechazadas": [],
+    }
+
+    # un solo cliente para toda la corrida: una consulta por moneda
+    fx = fx or fx_from_url()
+    payloads = []
+    for template_id, template in due:
+        try:
+            payloads.append(expand_template(template_id, template, run_date, fx))
+        except KeyError as e:
+            progress["rechazadas"].append({"template_id": template_id, "motivo": f"Falta el campo {e} en la plantilla."})
+        except (ValueError, FxError) as e:
+            progress["rechazadas"].append({"template_id": template_id, "motivo": str(e)})
+    payloads, rejected = check_cuits(payloads, padron)
+    progress["rechazadas"] += rejected
+    progress["fallidas"] += len(progress["rechazadas"])
+    progress["generadas"] = len(payloads)
+    if dry_run or not payloads:
+        return progress
+
+    index = index or ReconciliationIndex()
+    analytics = analytics or AnalyticsStore()
+    saved = []
+    for payload in payloads:
+        template_id = payload["meta"]["template_id"]
+        try:
+            path = save_json(payload, folder=folder)
+            # cada plantilla se marca apenas se guarda su factura: si la corrida se corta a
+            # mitad, la siguiente no vuelve a generar las ya guardadas
+            store.mark_run([template_id], run_date)
+        except Exception as e:
+            # sin marcar no se envía: la próxima corrida la vuelve a generar (sin duplicar el envío)
+            log.warning("No se pudo guardar la factura de la plantilla %s", template_id, exc_info=True)
+            progress["rechazadas"].append({"template_id": template_id, "motivo": f"No se pudo guardar: {e}"})
+            progress["fallidas"] += 1
+            continue
+        # guardada y marcada: a partir de acá se envía sí o sí
+        saved.append(payload)
+        _best_effort("registrar la factura en el índice", lambda: index.record_saved(payload, str(path)))
+        _best_effort("sumar la factura a las estadísticas", lambda: analytics.record_invoice(payload))
+    payloads = saved
+    progress["generadas"] = len(payloads)
+    if not payloads:
+        return progress
+
+    lock = threading.Lock()
+
+    def on_result(i: int, result: Dict[str, Any]) -> None:
+        _best_effort("registrar la respuesta en el índice", lambda: index.record_result(payloads[i], result))
+        with lock:
+            progress["enviadas"] += 1
+            progress["ok" if result.get("ok") else "fallidas"] += 1
+            if on_progress:
+                on_progress(dict(progress))
+
+    if batched:
+        from batching import WebhookBatcher
+
+        with WebhookBatcher() as batcher:
+            futures = [batcher.add(p) for p in payloads]
+            for i, fut in enumerate(futures):
+                fut.add_done_callback(lambda f, i=i: on_result(i, f.result()))
+    else:
+        from dispatcher import WebhookDispatcher
+
+        WebhookDispatcher().dispatch(payloads, on_result=on_result)
+
+    return progress
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Facturas recurrentes.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("run", help="genera y envía las plantillas que vencen en la fecha")
+    run.add_argument("--fecha", type=date.fromisoformat, default=date.today())
+    run.add_argument("--dry-run", action="store_true")
+    run.add_argument("--lotes", action="store_true", help="enviar en lotes (batching.py)")
+    sub.add_parser("list", help="lista las plantillas")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "list":
+        for t in TemplateStore().list():
+            print(json.dumps(t, ensure_ascii=False))
+        return 0
+
+    t0 = time.monotonic()
+    last_print = [0.0]
+
+    def report(p: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        if p["enviadas"] == p["generadas"] or now - last_print[0] >= 2:
+            last_print[0] = now
+            rate = p["enviadas"] / max(now - t0, 1e-6)
+            print(f"{p['enviadas']}/{p['generadas']} enviadas ({p['ok']} ok, {p['fallidas']} fallidas) - {rate:.1f}/s")
+
+    summary = run_due(args.fecha, dry_run=args.dry_run, batched=args.lotes, on_progress=report)
+    for r in summary["rechazadas"]:
+        print(f"plantilla {r['template_id']} rechazada: {r['motivo']}")
+    print(json.dumps(summary, ensure_ascii=False))
+    return 0 if summary["fallidas"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+# reverify.py
+"""
+Re-verificación del archivo de facturas: recalcula `totales` de cada factura
+guardada con las reglas actuales de calc.py (a partir de sus `items` y
+`tipo_factura`) y lista las que dan distinto de lo guardado.
+
+Sirve para medir el impacto de un cambio de reglas (redondeo, IVA, etc.)
+antes de aplicarlo: el reporte dice qué facturas, qué campo y por cuánto.
+
+El archivo se recorre en streaming (sueltas y bundles, en orden de nombre) y
+el parseo y recálculo se reparten en lotes entre un pool de procesos. Los
+lotes se consolidan en orden, así que después de cada uno se guarda un
+checkpoint (última factura procesada y tamaño del reporte): con
+`--reanudar` se continúa desde ahí sin duplicar líneas.
+
+Reporte (JSONL, una línea por factura con diferencias):
+    {"archivo", "invoice_key", "tipo_factura", "diferencias": [
+        {"campo", "item_n", "guardado", "recalculado", "diferencia"}, ...]}
+
+Uso por consola:
+    python reverify.py [--reporte exports/reverificacion.jsonl] [--tolerancia 0.005]
+                       [--procesos N] [--lote 500] [--reanudar] [--data data]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from archive import DATA_DIR, iter_invoice_bytes
+from calc import compute_totals
+from model import Amounts, Item
+from utils import invoice_key
+
+REVERIFY_REPORT = os.environ.get("REVERIFY_REPORT", "exports/reverificacion.jsonl")
+
+# Diferencia absoluta máxima (en la moneda de la factura) que no se reporta
+DEFAULT_TOLERANCE = 0.005
+
+# Facturas por lote enviado a un worker
+DEFAULT_CHUNK = 500
+
+# Totales guardados -> clave de `compute_totals`
+TOTAL_FIELDS = (("total_neto", "total_net"), ("total_iva_21", "total_iva"), ("total", "total_gross"))
+
+COUNTERS = ("revisadas", "con_diferencias", "ilegibles")
+
+
+# -----------------------------
+# WORKER
+# -----------------------------
+def _diff(
+    campo: str, item_n: Optional[int], stored: Any, recomputed: Optional[float], tol: float
+) -> Optional[Dict[str, Any]]:
+    if stored is None and recomputed is None:
+        return None
+    try:
+        delta = float(recomputed) - float(stored)
+    except (TypeError, ValueError):
+        delta = None
+    if delta is not None and abs(delta) <= tol:
+        return None
+    return {
+        "campo": campo,
+        "item_n": item_n,
+        "guardado": stored,
+        "recalculado": recomputed,
+        "diferencia": None if delta is None else round(delta, 6),
+    }
+
+
+def check_invoice(name: str, payload: Dict[str, Any], tol: float) -> Optional[Dict[str, Any]]:
+    """Línea de reporte de la factura, o None si lo recalculado coincide con lo guardado."""
+    tot = payload.get("totales") or {}
+    tipo_factura = (payload.get("datos_facturacion") or {}).get("tipo_factura") or tot.get("tipo_factura")
+    items = [Item.from_dict(it) for it in payload.get("items") or []]
+    per_item, totals, _ = compute_totals(items, tipo_factura)
+
+    diffs: List[Dict[str, Any]] = []
+    for stored_field, key in TOTAL_FIELDS:
+        d = _diff(stored_field, None, tot.get(stored_field), totals[key], tol)
+        if d:
+            diffs.append(d)
+
+    stored_items = tot.get("items_calculados") or []
+    for i, amounts in enumerate(per_item):
+        stored = stored_items[i] if i < len(stored_items) and isinstance(stored_items[i], dict) else {}
+        for field in Amounts.__slots__:
+            d = _diff(field, i + 1, stored.get(field), getattr(amounts, field) if amounts else None, tol)
+            if d:
+                diffs.append(d)
+    if len(stored_items) != len(per_item):
+        diffs.append(
+            {
+                "campo": "items_calculados",
+                "item_n": None,
+                "guardado": len(stored_items),
+                "recalculado": len(per_item),
+                "diferencia": None,
+            }
+        )
+
+    if not diffs:
+        return None
+    return {"archivo": name, "invoice_key": invoice_key(payload), "tipo_factura": tipo_factura, "diferencias": diffs}
+
+
+def check_chunk(chunk: List[Tuple[str, bytes]], tol: float) -> Tuple[bytes, Dict[str, int]]:
+    """Procesa un lote en un worker. Devuelve las líneas de reporte ya serializadas y los contadores."""
+    lines: List[str] = []
+    counts = dict.fromkeys(COUNTERS, 0)
+    for name, data in chunk:
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            counts["ilegibles"] += 1
+            continue
+        counts["revisadas"] += 1
+        row = check_invoice(name, payload, tol)
+        if row:
+            counts["con_diferencias"] += 1
+            lines.append(json.dumps(row, ensure_ascii=False) + "\n")
+    return "".join(lines).encode("utf-8"), counts
+
+
+# -----------------------------
+# CHECKPOINT
+# -----------------------------
+def checkpoint_path(report: str) -> str:
+    return report + ".checkpoint.json"
+
+
+def load_checkpoint(report: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(checkpoint_path(report), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_checkpoint(report: str, state: Dict[str, Any]) -> None:
+    path = checkpoint_path(report)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+# -----------------------------
+# JOB
+# -----------------------------
+def _chunks(source: Iterator[Tuple[str, bytes]], size: int) -> Iterator[List[Tuple[str, bytes]]]:
+    chunk: List[Tuple[str, bytes]] = []
+    for entry in source:
+        chunk.append(entry)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def reverify(
+    report: str = REVERIFY_REPORT,
+    folder: str = DATA_DIR,
+    tolerance: float = DEFAULT_TOLERANCE,
+    workers: Optional[int] = None,
+    chunk: int = DEFAULT_CHUNK,
+    resume: bool = False,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Recorre el archivo y escribe en `report` las facturas que no coinciden.
+    Devuelve el resumen (el mismo que queda en el checkpoint).
+    """
+    workers = workers or os.cpu_count() or 1
+    state = load_checkpoint(report) if resume and os.path.exists(report) else None
+    if state is None:
+        state = {"after": None, "report_bytes": 0, "tolerancia": tolerance, **dict.fromkeys(COUNTERS, 0)}
+    # al reanudar manda la tolerancia de la corrida original
+    tolerance = state["tolerancia"]
+    state["terminado"] = False
+
+    os.makedirs(os.path.dirname(report) or ".", exist_ok=True)
+    mode = "r+b" if state["after"] is not None else "wb"
+    with open(report, mode) as out:
+        # lo escrito después del último checkpoint se descarta (se vuelve a procesar)
+        out.seek(state["report_bytes"])
+        out.truncate()
+
+        # a lo sumo 2 lotes por worker en vuelo: memoria acotada aunque el archivo sea enorme
+        pending: "deque[Tuple[str, Future]]" = deque()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+
+            def consolidate(last_name: str, fut: Future) -> None:
+                data, counts = fut.result()
+                out.write(data)
+                out.flush()
+                for k in COUNTERS:
+                    state[k] += counts[k]
+                state["after"] = last_name
+                state["report_bytes"] = out.tell()
+                save_checkpoint(report, state)
+                if on_progress:
+                    on_progress(dict(state))
+
+            for part in _chunks(iter_invoice_bytes(folder, after=state["after"]), chunk):
+                pending.append((part[-1][0], pool.submit(check_chunk, part, tolerance)))
+                while len(pending) >= 2 * workers or (pending and pending[0][1].done()):
+                    consolidate(*pending.popleft())
+            while pending:
+                consolidate(*pending.popleft())
+
+    state["terminado"] = True
+    save_checkpoint(report, state)
+    return state
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Recalcula los totales del archivo y reporta diferencias.")
+    parser.add_argument("--reporte", default=REVERIFY_REPORT)
+    parser.add_argument("--data", default=DATA_DIR)
+    parser.add_argument("--tolerancia", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--procesos", type=int, default=None, help="workers (por defecto, uno por CPU)")
+    parser.add_argument("--lote", type=int, default=DEFAULT_CHUNK, help="facturas por lote")
+    parser.add_argument("--reanudar", action="store_true", help="continuar desde el último checkpoint")
+    args = parser.parse_args(argv)
+
+    t0 = time.monotonic()
+    last_print = [0.0]
+
+    def report(state: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        if now - last_print[0] >= 2:
+            last_print[0] = now
+            rate = state["revisadas"] / max(now - t0, 1e-6)
+            print(f"{state['revisadas']} revisadas, {state['con_diferencias']} con diferencias - {rate:.0f}/s", flush=True)
+
+    summary = reverify(args.reporte, args.data, args.tolerancia, args.procesos, args.lote, args.reanudar, report)
+    print(json.dumps(summary, ensure_ascii=False))
+    return 0 if summary["con_diferencias"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
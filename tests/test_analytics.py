@@ -0,0 +1,25 @@
+from analytics import AnalyticsStore
+
+
+def payload(inv_id, total=10.0):
+    return {
+        "meta": {"invoice_id": inv_id, "created_at": "2026-10-01T10:00:00"},
+        "totales": {"total_neto": total * 0.8, "total_iva_21": total * 0.2, "total": total},
+    }
+
+
+def test_rebuild_keeps_serving_old_totals_and_includes_concurrent_records(tmp_path):
+    store = AnalyticsStore(str(tmp_path / "analytics.db"))
+    store.record_invoice(payload("viejo"))
+
+    def invoices():
+        for i in range(5):
+            if i == 3:
+                # durante el rebuild el dashboard ve los agregados anteriores
+                assert store.monthly()[0]["count"] == 1
+                store.record_invoice(payload("nuevo"))
+            yield f"invoice_{i}.json", payload(str(i % 4))
+
+    assert store.rebuild(invoices(), chunk=2) == 4
+    assert store.monthly()[0]["count"] == 5
+    assert store.record_invoice(payload("nuevo")) is False
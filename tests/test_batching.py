@@ -0,0 +1,38 @@
+from batching import WebhookBatcher
+
+
+def payload(inv_id):
+    return {"meta": {"invoice_id": inv_id}}
+
+
+def test_duplicate_in_batch_is_rejected_and_sent_once():
+    sent = []
+
+    def post(entries, timeout=None):
+        sent.extend(inv_id for inv_id, _ in entries)
+        return {inv_id: {"ok": True, "status_code": 200, "response": {}} for inv_id, _ in entries}
+
+    with WebhookBatcher(post=post) as b:
+        first, dup = b.add(payload("a")), b.add(payload("a"))
+    assert first.result(timeout=2)["ok"]
+    assert not dup.result(timeout=2)["ok"]
+    assert sent == ["a"]
+
+
+def test_missing_result_does_not_hang_other_futures():
+    def post(entries, timeout=None):
+        return {"b": {"ok": True, "status_code": 200, "response": {}}}
+
+    with WebhookBatcher(post=post) as b:
+        fa, fb = b.add(payload("a")), b.add(payload("b"))
+    assert not fa.result(timeout=2)["ok"]
+    assert fb.result(timeout=2)["ok"]
+
+
+def test_post_exception_resolves_every_future():
+    def post(entries, timeout=None):
+        raise RuntimeError("caído")
+
+    with WebhookBatcher(post=post) as b:
+        futures = [b.add(payload(i)) for i in "abc"]
+    assert [f.result(timeout=2)["response"]["error"] for f in futures] == ["caído"] * 3
@@ -0,0 +1,97 @@
+import json
+import os
+import time
+import zipfile
+
+import archive
+import compaction
+from archive import bundle_path, iter_invoices, read_invoice
+from compaction import compact, manifest_path
+
+OLD = 1_000_000_000  # mtime bien anterior a cualquier retención
+
+
+def save(folder, name, mtime=OLD):
+    path = folder / name
+    path.write_text(json.dumps({"meta": {"invoice_id": name}}), encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+def names(folder):
+    return [name for name, _ in iter_invoices(str(folder))]
+
+
+def test_compact_moves_verified_originals_into_the_bundle(tmp_path):
+    for i in range(3):
+        save(tmp_path, f"invoice_20260901_12000{i}_aaaa.json")
+    save(tmp_path, "invoice_20261001_120000_bbbb.json", mtime=time.time())
+
+    assert compact(str(tmp_path), days=30) == {"202609": 3}
+    assert sorted(os.listdir(tmp_path)) == ["archive", "invoice_20261001_120000_bbbb.json"]
+
+    bundle = bundle_path(str(tmp_path), "202609")
+    with zipfile.ZipFile(bundle) as zf:
+        assert len(zf.namelist()) == 3
+    with open(manifest_path(bundle), encoding="utf-8") as f:
+        assert len(json.load(f)["files"]) == 3
+
+    assert len(names(tmp_path)) == 4
+    assert read_invoice("invoice_20260901_120001_aaaa.json", str(tmp_path))["meta"]["invoice_id"].endswith("aaaa.json")
+
+
+def test_originals_are_kept_when_the_published_bundle_does_not_match(tmp_path, monkeypatch):
+    save(tmp_path, "invoice_20260901_120000_aaaa.json")
+    real = compaction._sha256
+    calls = []
+
+    def sha256(data):
+        calls.append(1)
+        # la primera vez (al agregar) es la real; en la verificación del bundle publicado no coincide
+        return real(data) if len(calls) == 1 else "distinto"
+
+    monkeypatch.setattr(compaction, "_sha256", sha256)
+    assert compact(str(tmp_path), days=0) == {"202609": 0}
+    assert (tmp_path / "invoice_20260901_120000_aaaa.json").exists()
+    assert names(tmp_path) == ["invoice_20260901_120000_aaaa.json"]
+
+
+def test_interrupted_run_is_not_duplicated_in_the_bundle(tmp_path):
+    save(tmp_path, "invoice_20260901_120000_aaaa.json")
+    compact(str(tmp_path), days=0)
+    # original restaurado como si el borrado no hubiera llegado a ejecutarse
+    save(tmp_path, "invoice_20260901_120000_aaaa.json")
+
+    assert compact(str(tmp_path), days=0) == {"202609": 1}
+    with zipfile.ZipFile(bundle_path(str(tmp_path), "202609")) as zf:
+        assert zf.namelist() == ["invoice_20260901_120000_aaaa.json"]
+    assert not (tmp_path / "invoice_20260901_120000_aaaa.json").exists()
+
+
+def test_reader_sees_every_invoice_when_compaction_runs_mid_iteration(tmp_path):
+    expected = [f"invoice_20260901_12000{i}_aaaa.json" for i in range(5)]
+    for name in expected:
+        save(tmp_path, name)
+
+    it = iter_invoices(str(tmp_path))
+    first = next(it)[0]
+    compact(str(tmp_path), days=0)
+    assert [first] + [name for name, _ in it] == expected
+
+
+def test_reader_retries_when_bundles_change_while_listing(tmp_path, monkeypatch):
+    expected = [f"invoice_20260901_12000{i}_aaaa.json" for i in range(3)]
+    for name in expected:
+        save(tmp_path, name)
+
+    real = archive.iter_invoice_names
+    ran = []
+
+    def listing_after_compaction(folder, after=None):
+        # la compactación publica el bundle y borra los originales justo antes del listado
+        if not ran:
+            ran.append(1)
+            compact(str(tmp_path), days=0)
+        return real(folder, after)
+
+    monkeypatch.setattr(archive, "iter_invoice_names", listing_after_compaction)
+    assert names(tmp_path) == expected
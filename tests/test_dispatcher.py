@@ -0,0 +1,106 @@
+import time
+
+from dispatcher import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, WebhookDispatcher
+
+OK = {"ok": True, "status_code": 200, "response": {}}
+FAIL = {"ok": False, "status_code": 503, "response": {}}
+
+
+def make_breaker(**kw):
+    opts = dict(failure_ratio=0.5, slow_call_s=10.0, window=4, min_calls=4, open_s=0.05)
+    opts.update(kw)
+    return CircuitBreaker(**opts)
+
+
+def open_breaker(breaker):
+    for _ in range(4):
+        assert breaker.allow()
+        breaker.record(FAIL, 0.01)
+    assert breaker.state == OPEN
+
+
+def test_opens_when_failure_ratio_exceeded():
+    breaker = make_breaker()
+    for result in (OK, FAIL, FAIL, FAIL):
+        breaker.record(result, 0.01)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_stays_closed_below_ratio_and_on_4xx():
+    breaker = make_breaker()
+    for result in (OK, FAIL, OK, {"ok": False, "status_code": 400, "response": {}}):
+        breaker.record(result, 0.01)
+    assert breaker.state == CLOSED
+
+
+def test_slow_call_counts_as_failure():
+    breaker = make_breaker(slow_call_s=1.0)
+    for _ in range(4):
+        breaker.record(OK, 2.0)
+    assert breaker.state == OPEN
+
+
+def test_half_open_allows_single_probe_then_closes():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # una sola prueba en vuelo
+    breaker.record(OK, 0.01)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(FAIL, 0.01)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_results_while_open_are_ignored():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    opened_at = breaker._opened_at
+    breaker.record(FAIL, 0.01)
+    assert breaker._opened_at == opened_at
+    time.sleep(0.06)
+    assert breaker.allow()
+
+
+def test_exception_in_probe_does_not_wedge_breaker():
+    calls = []
+
+    def send(payload, timeout):
+        calls.append(payload)
+        if payload == "boom":
+            raise RuntimeError("conexión rota")
+        return OK
+
+    breaker = make_breaker()
+    open_breaker(breaker)
+    time.sleep(0.06)
+    dispatcher = WebhookDispatcher(send=send, max_concurrency=1, rate_per_s=1000, breaker=breaker)
+
+    result = dispatcher.dispatch(["boom"])[0]
+    assert result["ok"] is False and "conexión rota" in result["response"]["error"]
+    assert breaker.state == OPEN and not breaker._probe_in_flight
+
+    time.sleep(0.06)
+    assert dispatcher.dispatch(["bien"])[0] == OK
+    assert breaker.state == CLOSED
+
+
+def test_dispatch_returns_circuit_open_without_sending():
+    sent = []
+    breaker = make_breaker(open_s=60)
+    open_breaker(breaker)
+    dispatcher = WebhookDispatcher(send=lambda p, timeout: sent.append(p) or OK, rate_per_s=1000, breaker=breaker)
+    results = dispatcher.dispatch([1, 2, 3])
+    assert sent == []
+    assert all(r.get("circuit_open") for r in results)
@@ -0,0 +1,32 @@
+from draft_store import DraftStore
+
+
+def state(nombre):
+    return {"emisor": {"razon_social": nombre}, "step": "edit"}
+
+
+def test_rewrites_section_changed_by_another_replica(tmp_path):
+    path = str(tmp_path / "drafts.db")
+    a = DraftStore(path, debounce_s=0)
+    b = DraftStore(path, debounce_s=0)
+
+    a.save("d1", state("uno"))
+    b.save("d1", state("dos"))
+    # la sesión vuelve a la réplica A con el mismo valor que A escribió antes
+    a.save("d1", state("uno"))
+    assert b.load("d1")["emisor"]["razon_social"] == "uno"
+
+
+def test_cache_is_bounded(tmp_path):
+    store = DraftStore(str(tmp_path / "drafts.db"), debounce_s=0, cache_size=4)
+    for i in range(10):
+        store.save(f"d{i}", state("x"))
+    assert len(store._written) == 4
+    assert store.load("d0")["emisor"]["razon_social"] == "x"
+
+
+def test_delete(tmp_path):
+    store = DraftStore(str(tmp_path / "drafts.db"), debounce_s=0)
+    store.save("d1", state("x"))
+    store.delete("d1")
+    assert store.load("d1") is None
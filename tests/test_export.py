@@ -0,0 +1,67 @@
+import json
+import os
+
+import pytest
+
+from export import export_archive
+
+
+def save(folder, name):
+    (folder / name).write_text(json.dumps({"meta": {"invoice_id": name}}), encoding="utf-8")
+
+
+def test_incremental_picks_up_names_that_sort_before_the_last_export(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    save(data, "invoice_20261019_120000_ffff.json")
+    assert export_archive(str(tmp_path / "out"), incremental=True, folder=str(data))["facturas"] == 1
+
+    # guardada en el mismo segundo, pero con un sufijo que ordena antes
+    save(data, "invoice_20261019_120000_0000.json")
+    assert export_archive(str(tmp_path / "out"), incremental=True, folder=str(data))["facturas"] == 1
+    assert export_archive(str(tmp_path / "out"), incremental=True, folder=str(data))["facturas"] == 0
+
+
+def test_failed_writer_leaves_no_partial_files(tmp_path, monkeypatch):
+    import export
+
+    class Broken:
+        def __init__(self, path, columns):
+            raise RuntimeError("sin pyarrow")
+
+    monkeypatch.setitem(export.WRITERS, "parquet", Broken)
+    out = tmp_path / "out"
+    with pytest.raises(RuntimeError):
+        export_archive(str(out), formats=["csv", "parquet"], folder=str(tmp_path))
+    assert [n for n in os.listdir(out) if not n.startswith(".")] == []
+
+
+def save_for(folder, name, cuit):
+    payload = {"meta": {"invoice_id": name}, "emisor": {"cuit": cuit}}
+    (folder / name).write_text(json.dumps(payload), encoding="utf-8")
+
+
+def test_filtered_run_does_not_advance_the_unfiltered_watermark(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    save_for(data, "invoice_20261019_120000_aaaa.json", "111")
+    save_for(data, "invoice_20261019_120001_bbbb.json", "222")
+    out = str(tmp_path / "out")
+
+    assert export_archive(out, incremental=True, cuit="111", folder=str(data))["facturas"] == 1
+    assert export_archive(out, incremental=True, folder=str(data))["facturas"] == 2
+    assert export_archive(out, incremental=True, cuit="111", folder=str(data))["facturas"] == 0
+
+
+def test_incremental_state_only_keeps_the_overlap_window(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    # una factura por hora: solo la última cae dentro de la ventana
+    for h in range(24):
+        save(data, f"invoice_20261019_{h:02d}0000_aaaa.json")
+    out = tmp_path / "out"
+
+    assert export_archive(str(out), incremental=True, folder=str(data))["facturas"] == 24
+    state = json.loads((out / ".export_state.json").read_text(encoding="utf-8"))
+    (only,) = state["filtros"].values()
+    assert only["vistos"] == ["invoice_20261019_230000_aaaa.json"]
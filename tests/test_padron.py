@@ -0,0 +1,60 @@
+import json
+from itertools import islice
+
+import pytest
+
+import padron
+from padron import FilePadronSource, PadronClient, PadronError, padron_from_url
+from utils import is_valid_cuit
+
+
+def valid_cuits(n):
+    candidates = (f"20{i:08d}{d}" for i in range(10_000, 20_000) for d in range(10))
+    return list(islice(filter(is_valid_cuit, candidates), n))
+
+
+class CountingSource:
+    def __init__(self, known):
+        self.known = known
+        self.calls = []
+
+    def fetch(self, cuits):
+        self.calls.append(list(cuits))
+        return {c: self.known.get(c) for c in cuits}
+
+
+def test_lookup_many_uses_cache_and_batches(monkeypatch):
+    monkeypatch.setattr(padron, "PADRON_BATCH_SIZE", 3)
+    cuits = valid_cuits(7)
+    source = CountingSource({cuits[0]: {"razon_social": " ACME SA ", "condicion_iva": 1}})
+    client = PadronClient(source)
+
+    found = client.lookup_many(cuits + [cuits[0], "20123456787"])
+    assert [len(c) for c in source.calls] == [3, 3, 1]
+    assert found[cuits[0]]["razon_social"] == "ACME SA"
+    assert found[cuits[0]]["condicion_iva"] == "IVA Responsable Inscripto"
+    assert found[cuits[1]] is None  # no encontrado
+    assert found["20123456787"] is None  # dígito verificador inválido: no se consulta
+
+    # los resultados (también los "no encontrado") quedan en cache
+    assert client.lookup_many(cuits) == {c: found[c] for c in cuits}
+    assert len(source.calls) == 3
+
+
+def test_missing_file_raises_padron_error_on_lookup(tmp_path):
+    client = padron_from_url(str(tmp_path / "no-existe.json"))
+    with pytest.raises(PadronError):
+        client.lookup("20123456786")
+
+
+def test_invalid_file_raises_padron_error(tmp_path):
+    path = tmp_path / "padron.json"
+    path.write_text("[1, 2]", encoding="utf-8")
+    with pytest.raises(PadronError):
+        FilePadronSource(str(path)).fetch(["20123456786"])
+
+
+def test_file_source(tmp_path):
+    path = tmp_path / "padron.json"
+    path.write_text(json.dumps({"20123456786": {"razon_social": "Uno"}}), encoding="utf-8")
+    assert padron_from_url(f"file://{path}").lookup("20123456786")["razon_social"] == "Uno"
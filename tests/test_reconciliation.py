@@ -0,0 +1,22 @@
+import json
+
+from reconciliation import APPROVED, parse_webhook_result
+
+
+def test_cae_is_read_from_spooled_response(tmp_path):
+    path = tmp_path / "response.json"
+    path.write_text(json.dumps({"resultado": "A", "data": {"CAE": "7412", "CAE_vto": "20261030"}}), encoding="utf-8")
+    result = {"ok": True, "status_code": 200, "response": {"body_path": str(path), "bytes": 10}}
+
+    parsed = parse_webhook_result(result)
+    assert parsed["status"] == APPROVED
+    assert parsed["cae"] == "7412"
+    assert parsed["cae_vto"] == "20261030"
+
+
+def test_cae_is_read_from_spooled_event_stream(tmp_path):
+    path = tmp_path / "response.bin"
+    path.write_text('data: {"step": "afip"}\n\ndata: {"cae": "99"}\n', encoding="utf-8")
+    result = {"ok": True, "status_code": 200, "response": {"body_path": str(path), "bytes": 10}}
+    assert parse_webhook_result(result)["cae"] == "99"
+
@@ -0,0 +1,108 @@
+from datetime import date
+
+import pytest
+
+import recurring
+from recurring import TemplateStore, run_due
+from utils import is_valid_cuit
+
+RUN_DATE = date(2026, 10, 19)
+
+
+def valid_cuit(prefix="2012345678"):
+    return next(prefix + str(d) for d in range(10) if is_valid_cuit(prefix + str(d)))
+
+
+def template(nombre, cuit):
+    fecha = "19/09/2026"
+    return {
+        "nombre": nombre,
+        "dia": RUN_DATE.day,
+        "emisor": {"cuit": valid_cuit(), "razon_social": "Emisor", "condicion_iva": "Monotributo"},
+        "receptor": {"cuit_dni": cuit, "razon_social": nombre},
+        "facturacion": {"fecha_inicio": fecha, "fecha_fin": fecha, "fecha_vencimiento": fecha, "tipo_factura": "Factura C"},
+        "items": [{"descripcion": "Abono", "cantidad": 1, "precio_unitario": 100.0}],
+    }
+
+
+@pytest.fixture(autouse=True)
+def no_providers(monkeypatch):
+    monkeypatch.setattr(recurring, "padron_from_url", lambda: None)
+    monkeypatch.setattr(recurring, "fx_from_url", lambda: None)
+
+
+def test_rejected_templates_are_reported_with_reason(tmp_path):
+    store = TemplateStore(str(tmp_path / "templates.db"))
+    cuit = valid_cuit("2098765432")
+    bad_cuit = store.save(template("cuit malo", cuit[:10] + str((int(cuit[10]) + 1) % 10)))
+    broken = store.save({"nombre": "rota", "dia": RUN_DATE.day, "emisor": {}, "receptor": {}, "facturacion": {}, "items": []})
+    store.save(template("ok", "12345678"))
+
+    summary = run_due(RUN_DATE, store=store, dry_run=True)
+    assert summary["generadas"] == 1
+    assert {r["template_id"] for r in summary["rechazadas"]} == {bad_cuit, broken}
+    assert all(r["motivo"] for r in summary["rechazadas"])
+
+
+class FakeDispatcher:
+    sent = []
+
+    def dispatch(self, payloads, on_result=None):
+        for i, p in enumerate(payloads):
+            FakeDispatcher.sent.append(p["meta"]["template_id"])
+            on_result(i, {"ok": True, "status_code": 200, "response": {}})
+
+
+@pytest.fixture
+def dispatcher(monkeypatch):
+    import dispatcher as dispatcher_module
+
+    FakeDispatcher.sent = []
+    monkeypatch.setattr(dispatcher_module, "WebhookDispatcher", FakeDispatcher)
+    return FakeDispatcher
+
+
+def test_failing_bookkeeping_still_sends_every_saved_invoice(tmp_path, dispatcher):
+    store = TemplateStore(str(tmp_path / "templates.db"))
+    ids = {store.save(template("uno", "12345678")), store.save(template("dos", "23456789"))}
+
+    class LockedIndex:
+        def record_saved(self, payload, path):
+            raise RuntimeError("database is locked")
+
+        def record_result(self, payload, result):
+            raise RuntimeError("database is locked")
+
+    class LockedAnalytics:
+        def record_invoice(self, payload):
+            raise RuntimeError("database is locked")
+
+    summary = run_due(
+        RUN_DATE, store=store, index=LockedIndex(), analytics=LockedAnalytics(), folder=str(tmp_path / "data")
+    )
+    assert set(dispatcher.sent) == ids
+    assert summary["enviadas"] == summary["ok"] == 2
+    # guardadas, marcadas y enviadas: una nueva corrida no las duplica
+    assert store.due(RUN_DATE) == []
+
+
+def test_uses_the_clients_passed_by_the_caller(tmp_path):
+    store = TemplateStore(str(tmp_path / "templates.db"))
+    tpl = template("usd", "12345678")
+    tpl["facturacion"]["moneda"] = "USD"
+    store.save(tpl)
+    asked = []
+
+    class Fx:
+        def rate(self, moneda):
+            asked.append(moneda)
+            return 1000.0
+
+    class Padron:
+        def lookup_many(self, cuits):
+            asked.extend(cuits)
+            return {c: {"razon_social": "x"} for c in cuits}
+
+    summary = run_due(RUN_DATE, store=store, dry_run=True, fx=Fx(), padron=Padron())
+    assert summary["generadas"] == 1
+    assert asked == ["USD", valid_cuit()]
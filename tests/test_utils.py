@@ -0,0 +1,38 @@
+import pytest
+
+from utils import is_valid_cuit, validate_cuit_dni
+
+
+@pytest.mark.parametrize("cuit", ["20123456786", "20123456050"])
+def test_valid_cuit(cuit):
+    # 2012345605: la suma da resto 0, así que el verificador es 0 (no 11)
+    assert is_valid_cuit(cuit)
+
+
+def test_wrong_check_digit():
+    assert not is_valid_cuit("20123456787")
+
+
+def test_remainder_10_has_no_valid_check_digit():
+    # para el prefijo 2012345600 el verificador daría 10: AFIP no asigna ese número
+    assert not any(is_valid_cuit(f"2012345600{d}") for d in range(10))
+
+
+@pytest.mark.parametrize("value", ["", "2012345678", "201234567861", "2012345678a"])
+def test_malformed_cuit(value):
+    assert not is_valid_cuit(value)
+
+
+def test_validate_cuit_dni():
+    assert validate_cuit_dni("20123456786") == (True, "")
+    assert validate_cuit_dni("12345678", allow_dni=True) == (True, "")
+    assert validate_cuit_dni("1234567", allow_dni=True) == (True, "")
+
+    ok, msg = validate_cuit_dni("20123456787")
+    assert not ok and "dígito verificador" in msg
+    ok, msg = validate_cuit_dni("12345678")
+    assert not ok and "11 dígitos" in msg
+    ok, msg = validate_cuit_dni("123456", allow_dni=True)
+    assert not ok and "DNI" in msg
+    ok, _ = validate_cuit_dni("20-12345678-6")
+    assert not ok
@@ -0,0 +1,108 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import webhook
+from webhook import event_progress_pct, send_to_webhook
+
+pytest.importorskip("requests")
+
+PAYLOAD = {"meta": {"invoice_id": "inv-1"}}
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Servidor local: `server.reply(status, content_type, body, headers)` define la próxima respuesta."""
+    replies = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def _answer(self):
+            length = int(self.headers.get("content-length") or 0)
+            self.rfile.read(length)
+            status, content_type, body, headers = replies.pop(0)
+            self.send_response(status)
+            self.send_header("content-type", content_type)
+            self.send_header("content-length", str(len(body)))
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_POST = do_GET = _answer
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_port}/webhook"
+    httpd.reply = lambda status, content_type, body, headers=None: replies.append(
+        (status, content_type, body.encode("utf-8") if isinstance(body, str) else body, headers or {})
+    )
+    monkeypatch.setattr(webhook, "audit", lambda *a, **k: True)
+    monkeypatch.setattr(webhook, "WEBHOOK_POLL_INTERVAL_S", 0.01)
+    yield httpd
+    httpd.shutdown()
+
+
+def test_ndjson_without_charset(server):
+    lines = [{"message": "Facturación en curso", "progress": 0.5}, {"final": True, "cae": "123"}]
+    server.reply(200, "application/x-ndjson", "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in lines))
+    events = []
+
+    result = send_to_webhook(PAYLOAD, url=server.url, on_event=events.append)
+    assert result["ok"]
+    assert result["response"]["cae"] == "123"
+    assert events[0]["message"] == "Facturación en curso"
+
+
+def test_event_stream_without_charset_is_utf8(server):
+    body = 'data: {"message": "Facturación"}\n\ndata: {"type": "result", "cae": "9"}\n\n'
+    server.reply(200, "text/event-stream", body)
+    events = []
+
+    result = send_to_webhook(PAYLOAD, url=server.url, on_event=events.append)
+    assert result["response"]["cae"] == "9"
+    assert events == [{"message": "Facturación"}]
+
+
+def test_pending_without_status_url_is_not_ok(server):
+    server.reply(202, "application/json", json.dumps({"status": "running"}))
+
+    result = send_to_webhook(PAYLOAD, url=server.url)
+    assert not result["ok"]
+    assert "URL de estado" in result["response"]["error"]
+
+
+def test_pending_is_polled_until_done(server):
+    server.reply(202, "application/json", json.dumps({"status": "running"}), {"location": "/estado/1"})
+    server.reply(200, "application/json", json.dumps({"status": "running"}))
+    server.reply(200, "application/json", json.dumps({"status": "done", "cae": "77"}))
+
+    result = send_to_webhook(PAYLOAD, url=server.url)
+    assert result["ok"]
+    assert result["response"]["cae"] == "77"
+
+
+def test_unreadable_body_becomes_error_result(server, monkeypatch):
+    def broken(r, on_event):
+        raise TypeError("cuerpo inesperado")
+
+    monkeypatch.setattr(webhook, "_read_response", broken)
+    server.reply(200, "application/json", "{}")
+
+    result = send_to_webhook(PAYLOAD, url=server.url)
+    assert not result["ok"]
+    assert "TypeError" in result["response"]["error"]
+
+
+def test_progress_fraction_vs_percentage():
+    assert event_progress_pct({"progress": 0.5}) == 50
+    assert event_progress_pct({"progress": 1.0}) == 100
+    assert event_progress_pct({"progress": 1}) == 1
+    assert event_progress_pct({"progress": 45}) == 45
+    assert event_progress_pct({"percent": 1}) == 1
+    assert event_progress_pct({"progress": True}) is None
+    assert event_progress_pct({"step": "x"}) is None
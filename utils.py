@@ -1,14 +1,22 @@
 # utils.py
 from __future__ import annotations
 
+import hashlib
 import json
+import os
 import re
+import sqlite3
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal, InvalidOperation
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from uuid import uuid4
 
+from catalogs import CONDICION_IVA, CONDICION_VENTA, MONEDA, SERVICIO_PRODUCTO, TIPO_FACTURA
+
+if TYPE_CHECKING:
+    from model import Item
 
 DIGITS_RE = re.compile(r"\D+")
 
@@ -24,6 +32,39 @@ def is_digits_only(value: str) -> bool:
     return bool(value) and value.isdigit()
 
 
+CUIT_WEIGHTS = (5, 4, 3, 2, 7, 6, 5, 4, 3, 2)
+
+
+def is_valid_cuit(value: str) -> bool:
+    """CUIT/CUIL de 11 dígitos con dígito verificador (módulo 11) correcto."""
+    if not value or len(value) != 11 or not value.isdigit():
+        return False
+    check = 11 - sum(int(d) * w for d, w in zip(value[:10], CUIT_WEIGHTS)) % 11
+    if check == 11:
+        check = 0
+    # resto 10: AFIP no asigna ese número (cambia el prefijo a 23/33)
+    return check != 10 and check == int(value[10])
+
+
+def is_valid_dni(value: str) -> bool:
+    return bool(value) and value.isdigit() and len(value) in (7, 8)
+
+
+def validate_cuit_dni(value: str, allow_dni: bool = False) -> Tuple[bool, str]:
+    """Valida un CUIT (o un DNI si `allow_dni`). Devuelve (ok, mensaje) como validate_required."""
+    if not is_digits_only(value):
+        return False, "Debe contener solo números y no puede estar vacío."
+    if len(value) == 11:
+        if not is_valid_cuit(value):
+            return False, "CUIT inválido: el dígito verificador no coincide."
+        return True, ""
+    if allow_dni and is_valid_dni(value):
+        return True, ""
+    if allow_dni:
+        return False, "Debe ser un CUIT de 11 dígitos o un DNI de 7 u 8 dígitos."
+    return False, "El CUIT debe tener 11 dígitos."
+
+
 def parse_decimal_optional(value: str) -> Optional[Decimal]:
     """
     Parse decimal from string. Accepts comma or dot. Returns None if empty/blank.
@@ -43,60 +84,81 @@ def parse_decimal_optional(value: str) -> Optional[Decimal]:
         raise ValueError(f"Invalid decimal: {value}") from e
 
 
+def date_to_str(d: date) -> str:
+    return d.strftime("%d/%m/%Y")
+
+
+def make_json_safe(obj):
+    """
+    Convierte recursivamente objetos no serializables (date/datetime) a string.
+    """
+    if isinstance(obj, (date, datetime)):
+        return date_to_str(obj.date() if isinstance(obj, datetime) else obj)
+    if isinstance(obj, dict):
+        return {k: make_json_safe(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [make_json_safe(v) for v in obj]
+    if isinstance(obj, tuple):
+        return [make_json_safe(v) for v in obj]
+    return obj
+
+
 def now_filename(prefix: str = "invoice", ext: str = "json") -> str:
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    return f"{prefix}_{ts}.{ext}"
+    # sufijo aleatorio: varias facturas guardadas en el mismo segundo no se pisan
+    return f"{prefix}_{ts}_{uuid4().hex[:8]}.{ext}"
 
 
 def save_json(payload: Dict[str, Any], folder: str = "data") -> Path:
     Path(folder).mkdir(parents=True, exist_ok=True)
     path = Path(folder) / now_filename()
-    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    # escritura atómica: quien lea data/ (compactación, exportación) nunca ve un archivo a medias
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
     return path
 
 
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """
+    Abre una conexión SQLite en modo WAL, usable desde varios threads.
+    El acceso concurrente a la conexión lo serializa quien la usa.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
 def validate_required(value: str) -> Tuple[bool, str]:
     if not str(value or "").strip():
         return False, "Este campo es obligatorio."
     return True, ""
 
 
-def validate_items(items: List[Dict[str, Any]]) -> List[str]:
+def validate_items(items: List["Item"]) -> List[str]:
     errors: List[str] = []
     if not items:
         return ["Debes agregar al menos 1 item."]
 
     for i, it in enumerate(items, start=1):
-        desc = str(it.get("descripcion", "")).strip()
-        if not desc:
+        if not it.descripcion.strip():
             errors.append(f"Item {i}: 'Descripción' es obligatoria.")
 
-        qty = it.get("cantidad", None)
-        try:
-            qty_val = float(qty)
-            if qty_val <= 0:
-                errors.append(f"Item {i}: 'Cantidad' debe ser > 0.")
-        except Exception:
-            errors.append(f"Item {i}: 'Cantidad' debe ser numérica.")
+        if it.cantidad <= 0:
+            errors.append(f"Item {i}: 'Cantidad' debe ser > 0.")
 
-        pu = it.get("precio_unitario", None)
-        try:
-            pu_val = float(pu)
-            if pu_val <= 0:
-                errors.append(f"Item {i}: 'Precio Unitario' debe ser > 0.")
-        except Exception:
-            errors.append(f"Item {i}: 'Precio Unitario' debe ser numérico.")
+        if it.precio_unitario <= 0:
+            errors.append(f"Item {i}: 'Precio Unitario' debe ser > 0.")
 
         # descuento optional
-        desc_str = str(it.get("descuento_bonificacion", "")).strip()
-        if desc_str != "":
-            try:
-                _ = parse_decimal_optional(desc_str)
-            except ValueError:
-                errors.append(f"Item {i}: 'Descuento/Bonificación' no es un número válido.")
-
-        um = str(it.get("unidad_medida", "")).strip()
-        if not um:
+        try:
+            it.descuento()
+        except ValueError:
+            errors.append(f"Item {i}: 'Descuento/Bonificación' no es un número válido.")
+
+        if not str(it.unidad_medida or "").strip():
             errors.append(f"Item {i}: 'Unidad de medida' es obligatoria.")
 
     return errors
@@ -109,19 +171,21 @@ def build_payload(state: Dict[str, Any]) -> Dict[str, Any]:
     emisor = state["emisor"].copy()
     receptor = state["receptor"].copy()
     fact = state["facturacion"].copy()
-    items = [it.copy() for it in state["items"]]
+    # items (model.Item): descuento normalizado y código de unidad en to_payload
+    items = [it.to_payload() for it in state["items"]]
 
     # sanitize CUIT/DNI
     emisor["cuit"] = sanitize_digits(emisor.get("cuit", ""))
     receptor["cuit_dni"] = sanitize_digits(receptor.get("cuit_dni", ""))
 
-    # normalize discounts: keep as string if empty, else Decimal -> str
-    for it in items:
-        d = str(it.get("descuento_bonificacion", "")).strip()
-        if d == "":
-            it["descuento_bonificacion"] = None
-        else:
-            it["descuento_bonificacion"] = str(parse_decimal_optional(d))
+    # códigos AFIP junto a cada label, para que el workflow no tenga que mapearlos
+    emisor["condicion_iva_codigo"] = CONDICION_IVA.code(emisor.get("condicion_iva"))
+    receptor["condicion_iva_codigo"] = CONDICION_IVA.code(receptor.get("condicion_iva"))
+    receptor["condicion_venta_codigo"] = CONDICION_VENTA.code(receptor.get("condicion_venta"))
+    fact["tipo_factura_codigo"] = TIPO_FACTURA.code(fact.get("tipo_factura"))
+    fact["concepto_codigo"] = SERVICIO_PRODUCTO.code(fact.get("servicio_producto"))
+    fact["moneda"] = fact.get("moneda") or "ARS"
+    fact["moneda_codigo"] = MONEDA.code(fact["moneda"])
 
     payload = {
         "emisor": emisor,
@@ -129,8 +193,21 @@ def build_payload(state: Dict[str, Any]) -> Dict[str, Any]:
         "datos_facturacion": fact,
         "items": items,
         "meta": {
+            "invoice_id": str(uuid4()),
             "created_at": datetime.now().isoformat(timespec="seconds"),
             "source": "streamlit_ui",
         }
     }
     return payload
+
+
+def invoice_key(payload: Dict[str, Any]) -> str:
+    """
+    Identificador estable de una factura: `meta.invoice_id` si existe
+    (payloads nuevos) o un hash del contenido (payloads guardados antes).
+    """
+    invoice_id = (payload.get("meta") or {}).get("invoice_id")
+    if invoice_id:
+        return str(invoice_id)
+    canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return "sha256:" + hashlib.sha256(canonical.encode("utf-8")).hexdigest()
@@ -0,0 +1,372 @@
+# webhook.py
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urljoin, urlsplit
+from uuid import uuid4
+
+from audit import audit
+from utils import invoice_key, make_json_safe, now_filename
+
+WEBHOOK_URL = os.environ.get(
+    "WEBHOOK_URL", "https://n8n.optimizar-ia.com/webhook/06cf93de-06f0-42ac-b859-9424155fa9b7"
+)
+
+# Tiempo máximo (segundos) de espera de la respuesta de n8n
+WEBHOOK_TIMEOUT_S = float(os.environ.get("WEBHOOK_TIMEOUT_S", "300"))
+
+# Cada cuánto se consulta la URL de estado de un workflow "en proceso"
+WEBHOOK_POLL_INTERVAL_S = float(os.environ.get("WEBHOOK_POLL_INTERVAL_S", "2"))
+
+# Respuestas más grandes que esto se guardan en disco en vez de en memoria
+WEBHOOK_MAX_BODY_BYTES = int(os.environ.get("WEBHOOK_MAX_BODY_BYTES", str(1024 * 1024)))
+WEBHOOK_SPOOL_DIR = os.environ.get("WEBHOOK_SPOOL_DIR", "data/responses")
+
+
+def send_to_webhook(
+    payload: Dict[str, Any],
+    url: Optional[str] = None,
+    timeout: Optional[float] = None,
+    on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Envía la factura y devuelve `{"ok", "status_code", "response"}`.
+
+    Soporta workflows largos de n8n:
+      - respuestas en streaming (NDJSON / SSE): cada evento se pasa a
+        `on_event` a medida que llega, y el último es la respuesta final;
+      - "en proceso": 202 (o `{"status": "running", ...}`) con una URL de
+        estado (`Location` o `status_url`) que se consulta cada
+        WEBHOOK_POLL_INTERVAL_S hasta que termina o vence `timeout`;
+      - respuestas de más de WEBHOOK_MAX_BODY_BYTES se guardan en disco
+        en lugar de memoria (`response` = `{"body_path", "bytes", ...}`).
+    """
+    url = url or WEBHOOK_URL
+    timeout = timeout or WEBHOOK_TIMEOUT_S
+    t0 = time.monotonic()
+    result = _send(encode_payload(payload), url, timeout, t0 + timeout, on_event)
+    _audit_attempt(payload, url, result, t0)
+    return result
+
+
+def _send(
+    data: bytes,
+    url: str,
+    timeout: float,
+    deadline: float,
+    on_event: Optional[Callable[[Dict[str, Any]], None]],
+) -> Dict[str, Any]:
+    # import diferido: solo se paga al enviar, no en cada arranque/render
+    import requests
+
+    try:
+        r = requests.post(url, data=data, headers={"content-type": "application/json"}, timeout=timeout, stream=True)
+        body = _read_response(r, on_event)
+
+        status_url = None
+        while r.status_code == 202 or _is_pending(body):
+            status_url = _status_url(r, body, url) or status_url
+            if not status_url:
+                # sin URL de estado no hay forma de saber cómo termina: no es un éxito
+                return {
+                    "ok": False,
+                    "status_code": r.status_code,
+                    "response": {
+                        "error": "El workflow quedó en proceso y la respuesta no trae URL de estado.",
+                        "ultimo_estado": body,
+                    },
+                }
+            _emit(on_event, body if isinstance(body, dict) else {"message": "En proceso..."})
+            if time.monotonic() + WEBHOOK_POLL_INTERVAL_S > deadline:
+                return {
+                    "ok": False,
+                    "status_code": None,
+                    "response": {
+                        "error": "El workflow sigue en proceso: se agotó el tiempo de espera.",
+                        "status_url": status_url,
+                        "ultimo_estado": body,
+                    },
+                }
+            time.sleep(WEBHOOK_POLL_INTERVAL_S)
+            r = requests.get(status_url, timeout=max(1.0, deadline - time.monotonic()), stream=True)
+            body = _read_response(r, on_event)
+
+        return {"ok": r.ok, "status_code": r.status_code, "response": body}
+    except requests.RequestException as e:
+        return {"ok": False, "status_code": None, "response": {"error": str(e)}}
+    except Exception as e:
+        # cuerpo inesperado (o error leyéndolo): el envío termina con un resultado, nunca con una excepción
+        return {
+            "ok": False,
+            "status_code": None,
+            "response": {"error": f"No se pudo leer la respuesta del workflow: {type(e).__name__}: {e}"},
+        }
+
+
+def _audit_attempt(payload: Dict[str, Any], url: str, result: Dict[str, Any], t0: float) -> None:
+    body = result.get("response")
+    audit(
+        "webhook_intento",
+        invoice_key=invoice_key(payload),
+        url=urlsplit(url).netloc,
+        ok=result.get("ok"),
+        status_code=result.get("status_code"),
+        latency_ms=round((time.monotonic() - t0) * 1000, 1),
+        error=body.get("error") if isinstance(body, dict) else None,
+    )
+
+
+# -----------------------------
+# STREAMING
+# -----------------------------
+# Estados que n8n (o el workflow) usa para "todavía no terminó"
+PENDING_STATUSES = {"pending", "running", "in_progress", "processing", "en_proceso"}
+
+STREAM_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "text/event-stream")
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _emit(on_event: Optional[Callable[[Dict[str, Any]], None]], event: Dict[str, Any]) -> None:
+    if on_event is None:
+        return
+    try:
+        on_event(event)
+    except Exception:
+        # el progreso es informativo: un error mostrándolo no corta el envío
+        pass
+
+
+def _is_pending(body: Any) -> bool:
+    return isinstance(body, dict) and str(body.get("status", "")).lower() in PENDING_STATUSES
+
+
+def _status_url(r, body: Any, base_url: str) -> Optional[str]:
+    status_url = r.headers.get("location")
+    if not status_url and isinstance(body, dict):
+        status_url = body.get("status_url") or body.get("statusUrl")
+    return urljoin(base_url, status_url) if status_url else None
+
+
+def _read_response(r, on_event: Optional[Callable[[Dict[str, Any]], None]]) -> Any:
+    """Cuerpo de una respuesta pedida con `stream=True` (siempre la cierra)."""
+    with r:
+        content_type = (r.headers.get("content-type") or "").lower()
+        if content_type.startswith(STREAM_CONTENT_TYPES):
+            return _read_event_stream(r, on_event)
+        return _read_body(r, content_type)
+
+
+def _read_event_stream(r, on_event: Optional[Callable[[Dict[str, Any]], None]]) -> Any:
+    """
+    NDJSON (un objeto JSON por línea) o SSE (`data: {...}`). Cada evento va a
+    `on_event`; la respuesta es el evento con `"final": true` (o
+    `"type": "result"`), o el último recibido.
+
+    Las líneas se decodifican siempre como UTF-8: `iter_lines(decode_unicode=True)`
+    devuelve bytes si la respuesta no declara charset, y SSE sin charset
+    caería en ISO-8859-1.
+    """
+    last: Any = {}
+    for raw in r.iter_lines():
+        line = raw.decode("utf-8", errors="replace") if isinstance(raw, bytes) else raw
+        if not line or line.startswith((":", "event:", "id:", "retry:")):
+            continue
+        if line.startswith("data:"):
+            line = line[len("data:") :].strip()
+        try:
+            event = json.loads(line)
+        except ValueError:
+            event = {"message": line}
+        if not isinstance(event, dict):
+            event = {"message": str(event)}
+        if event.get("final") or event.get("type") in ("result", "final"):
+            return event
+        last = event
+        _emit(on_event, event)
+    return last
+
+
+def _read_body(r, content_type: str) -> Any:
+    """Lee el cuerpo en bloques; si supera WEBHOOK_MAX_BODY_BYTES lo vuelca a disco."""
+    buf = bytearray()
+    size = 0
+    path: Optional[Path] = None
+    f = None
+    try:
+        for chunk in r.iter_content(CHUNK_SIZE):
+            size += len(chunk)
+            if f is None and size > WEBHOOK_MAX_BODY_BYTES:
+                Path(WEBHOOK_SPOOL_DIR).mkdir(parents=True, exist_ok=True)
+                ext = "json" if "json" in content_type else "bin"
+                path = Path(WEBHOOK_SPOOL_DIR) / now_filename(prefix="response", ext=ext)
+                f = open(path, "wb")
+                f.write(buf)
+                buf = bytearray()
+            if f is not None:
+                f.write(chunk)
+            else:
+                buf += chunk
+    finally:
+        if f is not None:
+            f.close()
+
+    if path is not None:
+        return {
+            "message": "Respuesta grande: guardada en disco.",
+            "body_path": str(path),
+            "bytes": size,
+            "content_type": content_type,
+        }
+    if "application/json" in content_type:
+        try:
+            return json.loads(bytes(buf))
+        except ValueError:
+            pass
+    return {"raw_text": bytes(buf).decode(r.encoding or "utf-8", errors="replace")}
+
+
+def load_spooled_body(body: Any) -> Any:
+    """
+    Si `body` es una respuesta volcada a disco (`{"body_path", ...}`), la lee
+    y devuelve el JSON (o la lista de eventos, si es NDJSON/SSE). Si no se
+    puede leer o no es JSON, devuelve `body` tal cual.
+    """
+    if not (isinstance(body, dict) and body.get("body_path")):
+        return body
+    try:
+        data = Path(body["body_path"]).read_bytes()
+    except OSError:
+        return body
+    try:
+        return json.loads(data)
+    except ValueError:
+        pass
+    events = []
+    for line in data.splitlines():
+        line = line.strip()
+        if line.startswith(b"data:"):
+            line = line[5:].strip()
+        try:
+            events.append(json.loads(line))
+        except ValueError:
+            continue
+    return events or body
+
+
+def event_progress_pct(event: Dict[str, Any]) -> Optional[float]:
+    """
+    Avance de un evento en porcentaje (0-100), o None si no trae.
+    `percent`/`porcentaje` son porcentajes. En `progress`, un float entre 0 y 1
+    es una fracción (0.5 = 50%) y un entero es un porcentaje (1 = 1%).
+    """
+    value = event.get("percent", event.get("porcentaje"))
+    if value is None:
+        value = event.get("progress")
+        if isinstance(value, float) and 0.0 <= value <= 1.0:
+            value = value * 100
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return max(0.0, min(100.0, float(value)))
+
+
+# -----------------------------
+# BATCH
+# -----------------------------
+def encode_payload(payload: Dict[str, Any]) -> bytes:
+    """
+    JSON compacto del payload. Los payloads ya son JSON puro (fechas como
+    string, items como dict): `make_json_safe` solo se usa para los viejos
+    que todavía traen objetos (p. ej. `date`), y solo si el dump falla.
+    """
+    try:
+        text = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    except TypeError:
+        text = json.dumps(make_json_safe(payload), ensure_ascii=False, separators=(",", ":"))
+    return text.encode("utf-8")
+
+
+def _batch_error(result: Dict[str, Any], message: str) -> Dict[str, Any]:
+    return {
+        "ok": False,
+        "status_code": result.get("status_code"),
+        "response": {"error": message, "batch_response": result.get("response")},
+    }
+
+
+def post_batch(
+    entries: Sequence[Tuple[str, bytes]], url: Optional[str] = None, timeout: Optional[float] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Envía varias facturas ya serializadas (`(id, json_bytes)`) en un solo POST:
+
+        {"batch_id": "...", "count": N, "invoices": [{"id": "...", "payload": {...}}, ...]}
+
+    El workflow debe responder `{"results": [{"id": "...", "ok": true, ...}, ...]}`.
+    Devuelve un resultado por id, con la misma forma que `send_to_webhook`.
+    """
+    import requests
+
+    parts = [b'{"id":' + json.dumps(inv_id).encode("utf-8") + b',"payload":' + data + b"}" for inv_id, data in entries]
+    head = {"batch_id": str(uuid4()), "count": len(entries)}
+    body = json.dumps(head).encode("utf-8")[:-1] + b',"invoices":[' + b",".join(parts) + b"]}"
+
+    t0 = time.monotonic()
+    try:
+        r = requests.post(
+            url or WEBHOOK_URL,
+            data=body,
+            headers={"content-type": "application/json"},
+            timeout=timeout or WEBHOOK_TIMEOUT_S,
+        )
+        content_type = (r.headers.get("content-type") or "").lower()
+        resp = r.json() if "application/json" in content_type else {"raw_text": r.text}
+        batch_result = {"ok": r.ok, "status_code": r.status_code, "response": resp}
+    except (requests.RequestException, ValueError) as e:
+        batch_result = {"ok": False, "status_code": None, "response": {"error": str(e)}}
+
+    ids = [inv_id for inv_id, _ in entries]
+    audit(
+        "webhook_lote",
+        batch_id=head["batch_id"],
+        invoice_keys=ids,
+        url=urlsplit(url or WEBHOOK_URL).netloc,
+        ok=batch_result["ok"],
+        status_code=batch_result["status_code"],
+        latency_ms=round((time.monotonic() - t0) * 1000, 1),
+    )
+    if not batch_result["ok"]:
+        return {inv_id: dict(batch_result) for inv_id in ids}
+
+    by_id = {}
+    results = batch_result["response"].get("results") if isinstance(batch_result["response"], dict) else None
+    for item in results or []:
+        if isinstance(item, dict) and "id" in item:
+            by_id[str(item["id"])] = item
+
+    out: Dict[str, Dict[str, Any]] = {}
+    for inv_id in ids:
+        item = by_id.get(inv_id)
+        if item is None:
+            out[inv_id] = _batch_error(batch_result, "La respuesta del lote no incluye esta factura.")
+            continue
+        ok = bool(item.get("ok", True))
+        out[inv_id] = {
+            "ok": ok,
+            "status_code": item.get("status_code", batch_result["status_code"] if ok else None),
+            "response": item.get("response", item),
+        }
+    return out
+
+
+def send_batch_to_webhook(
+    payloads: List[Dict[str, Any]], url: Optional[str] = None, timeout: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """Envía `payloads` en un solo request y devuelve los resultados en el mismo orden."""
+    entries = [(invoice_key(p), encode_payload(p)) for p in payloads]
+    results = post_batch(entries, url=url, timeout=timeout)
+    return [results[inv_id] for inv_id, _ in entries]